@@ -1,23 +1,54 @@
-import torch
+import json
 import logging
+import time
 
-from flask import Flask, request
+from flask import Flask, g, request
 
+from pkg import metrics, server, timing, wire
+from pkg.checkpoint_writer import checkpoints
 from pkg.config import Config
-from pkg.l2s import Landmarks2ScreenCoords
+from pkg.registry import InvalidSessionId, session_id_from
+from pkg.server import app_config, l2coord, logger, sessions, start_training_job, training_jobs
+from pkg.stream import StreamSession
+
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
 
 logging.getLogger('werkzeug').disabled = True
 
-logging.basicConfig(level=logging.DEBUG)
-logger = logging.getLogger('app')
 
-device = 'cpu' if torch.cuda.device_count() == 0 else 'cuda'
+app = Flask('l2s', static_url_path='/', static_folder='static')
 
 
-l2coord = Landmarks2ScreenCoords(logger)
+def session_l2s():
+    # Leased until the request ends, so it isn't evicted while it's in use, see pkg/registry.py
+    session_id = session_id_from(request.headers, request.args, request.cookies)
+    l2s = sessions.acquire(session_id)
+    g.setdefault('leases', []).append(session_id)
+    return l2s
+
+
+@app.teardown_request
+def release_sessions(exc):
+    for session_id in g.pop('leases', ()):
+        sessions.release(session_id)
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    # The route template rather than the path, so /api/gaze/jobs/<job_id> is one series
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    metrics.observe_request(request.method, route, response.status_code, time.perf_counter() - g.request_start)
+    return response
+
 
-logger.info(f'Using device {device}')
-app = Flask('l2s', static_url_path='/', static_folder='static')
 @app.route('/', methods=['GET'])
 def index():
     return app.send_static_file('index.html')
@@ -30,17 +61,38 @@ def api_index():
 
 @app.route('/api/gaze/train/<int:epochs>', methods=['POST'])
 def train(epochs):
-    if l2coord.model is not None:
-        return l2coord.train(epochs, calibration_mode=False)
-    else:
-        return l2coord.losses
+    return start_training_job(session_l2s(), epochs, False, request.args)
 
 @app.route('/api/gaze/calibrate/<int:epochs>', methods=['POST'])
 def calibrate(epochs):
-    if l2coord.model is not None:
-        return l2coord.train(epochs, calibration_mode=True)
-    else:
-        return l2coord.losses
+    return start_training_job(session_l2s(), epochs, True, request.args)
+
+
+@app.route('/api/gaze/jobs', methods=['GET'])
+def training_job_list():
+    return {'jobs': [job.as_dict() for job in training_jobs.jobs()]}
+
+
+@app.route('/api/gaze/jobs/<job_id>', methods=['GET'])
+def training_job_status(job_id):
+    job = training_jobs.get(job_id)
+    if job is None:
+        return {'status': 'failed', 'error': f'No such job {job_id}'}, 404
+    return job.as_dict()
+
+
+@app.route('/api/gaze/jobs/<job_id>/<any(cancel, pause, resume):action>', methods=['POST'])
+def training_job_action(job_id, action):
+    job = training_jobs.get(job_id)
+    if job is None:
+        return {'status': 'failed', 'error': f'No such job {job_id}'}, 404
+    getattr(job, action)()
+    return job.as_dict()
+
+
+@app.route('/api/gaze/samples', methods=['GET'])
+def sample_count():
+    return server.sample_count(session_l2s(), request.args)
 
 
 @app.route('/api/gaze/pca', methods=['POST'])
@@ -55,28 +107,132 @@ def config():
 
 @app.route('/api/gaze/landmarks', methods=['POST'])
 def landmarks_():
-
-    landmarks_and_target = request.json
-
-    landmarks = landmarks_and_target["landmarks"]
-    target = landmarks_and_target["target"]
-
-    if target["target_x"] != "undefined":
-        target = [float(target["target_x"]), float(target["target_y"])]
-    else:
-        target = None
+    server_timing = getattr(app_config, 'server_timing_header', False)
+    with timing.timed_request(getattr(app_config, 'predict_timing_sample_rate', 0.), always=server_timing) as timer:
+        result = predict_landmarks()
+        with timing.stage('serialize'):
+            response = app.make_response(result)
+    if timer is not None and server_timing:
+        response.headers['Server-Timing'] = timer.server_timing()
+    return response
+
+
+def predict_landmarks():
+
+    if request.mimetype == wire.CONTENT_TYPE:
+        # Packed float32 landmarks, see pkg/wire.py
+        try:
+            with timing.stage('parse'):
+                frame = wire.read_frame(request.stream, request.content_length or 0)
+                landmarks, target = wire.decode_landmarks(frame)
+        except ValueError as e:
+            return {'status': 'failed', 'error': str(e)}, 400
+        with timing.stage('session'):
+            l2s = session_l2s()
+        return l2s.predict(landmarks, target)
+
+    with timing.stage('parse'):
+        landmarks_and_target = request.json
+
+    landmarks, target = wire.json_landmarks(landmarks_and_target)
 
     # Send to landmark model
     # print("---------------------------------------------------")
     # print(landmarks)
     # print("---------------------------------------------------")
-    return l2coord.predict(landmarks, target)
+    with timing.stage('session'):
+        l2s = session_l2s()
+    return l2s.predict(landmarks, target)
+
+
+if Sock is not None:
+    sock = Sock(app)
+
+    @sock.route('/api/gaze/stream')
+    def stream(ws):
+        # Frames go up and predictions come back on one long-lived connection, see pkg/stream.py
+        session_id = session_id_from(request.headers, request.args, request.cookies)
+        session = StreamSession(None, smoothing=getattr(app_config, 'stream_smoothing', 0.), logger=logger)
+        while True:
+            messages = [ws.receive()]
+            # Anything else that has queued up while we were busy makes the earlier frames stale
+            while (message := ws.receive(timeout=0)) is not None:
+                messages.append(message)
+            try:
+                # Leased for each batch of frames, so an idle connection doesn't keep it from being evicted
+                with sessions.lease(session_id) as l2s:
+                    session.l2s = l2s
+                    reply = session.handle(messages)
+            except ValueError as e:
+                ws.send(json.dumps({'status': 'failed', 'error': str(e)}))
+                continue
+            if reply is not None:
+                ws.send(json.dumps(reply))
+else:
+    logger.warning('flask-sock is not installed, /api/gaze/stream is disabled')
+
+
+@app.route('/api/gaze/metrics', methods=['GET'])
+def metrics_():
+    return metrics.registry.render(), 200, {'Content-Type': metrics.CONTENT_TYPE}
+
+
+@app.route('/api/gaze/timing', methods=['GET'])
+def timing_stats():
+    return server.timing_stats()
+
+
+@app.route('/api/gaze/serving', methods=['GET'])
+def serving_stats():
+    return session_l2s().serving_stats()
+
+
+@app.route('/api/gaze/workers', methods=['GET'])
+def worker_stats():
+    return server.worker_stats()
+
+
+@app.route('/api/gaze/checkpoints', methods=['GET'])
+def checkpoint_stats():
+    return checkpoints.stats()
+
+
+@app.route('/api/gaze/ready', methods=['GET'])
+def dataset_ready():
+    # Predictions are served while the dataset loads, so this is 200 either way
+    return session_l2s().dataset_load_stats()
+
+
+@app.route('/api/gaze/sample_log', methods=['GET'])
+def sample_log_stats():
+    return session_l2s().sample_log_stats()
+
+
+@app.route('/api/gaze/batcher', methods=['GET'])
+def batcher_stats():
+    return session_l2s().batcher_stats()
+
+
+@app.route('/api/gaze/sessions', methods=['GET'])
+def session_stats():
+    return sessions.stats()
+
+
+@app.errorhandler(InvalidSessionId)
+def invalid_session_id(e):
+    return {'status': 'failed', 'error': str(e)}, 400
+
+
+@app.errorhandler(wire.InvalidSample)
+def invalid_sample(e):
+    # Landmarks or a target of the wrong shape, however they were posted
+    return {'status': 'failed', 'error': str(e)}, 400
 
 
 @app.route('/api/gaze/save', methods=['POST', 'HEAD', 'GET'])
 def save_model():
     try:
-        l2coord.save()
+        session_l2s().save()
         return {'status': 'success'}
     except Exception as e:
         app.logger.info(f'POST /api/gaze/save: {e}')
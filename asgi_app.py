@@ -0,0 +1,273 @@
+"""
+Asyncio (ASGI) variant of app.py, built on Quart and served by hypercorn.
+
+It exposes the same routes.  Model forward passes, training job control, PCA and saving run
+on a thread pool, so the event loop only ever parses requests and writes responses.
+
+    python asgi_app.py [port]
+or
+    hypercorn asgi_app:app --bind 0.0.0.0:5000
+"""
+import asyncio
+import contextvars
+import functools
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from quart import Quart, g, request, websocket
+
+from pkg import metrics, server, timing, wire
+from pkg.checkpoint_writer import checkpoints
+from pkg.config import Config
+from pkg.registry import InvalidSessionId, session_id_from
+from pkg.server import app_config, l2coord, logger, sessions, start_training_job, training_jobs
+from pkg.stream import StreamSession
+
+# Sized so that enough concurrent predictions are in flight for the batcher to fill its batches
+executor = ThreadPoolExecutor(max_workers=getattr(app_config, 'asgi_executor_workers', 32),
+                              thread_name_prefix='l2s')
+
+app = Quart('l2s', static_url_path='/', static_folder='static')
+
+
+@app.before_request
+async def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+async def record_request_metrics(response):
+    # The route template rather than the path, so /api/gaze/jobs/<job_id> is one series
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    metrics.observe_request(request.method, route, response.status_code, time.perf_counter() - g.request_start)
+    return response
+
+
+async def run_blocking(fn, *args, **kwargs):
+    # In a copy of the current context, so that the request's stage timer (pkg/timing.py) follows it
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        executor, functools.partial(context.run, fn, *args, **kwargs))
+
+
+async def session_l2s():
+    # Leased until the request ends, so it isn't evicted while it's in use, see pkg/registry.py.
+    # Loading an evicted session reads it from disk, so do it off the event loop
+    session_id = session_id_from(request.headers, request.args, request.cookies)
+    l2s = await run_blocking(sessions.acquire, session_id)
+    g.setdefault('leases', []).append(session_id)
+    return l2s
+
+
+@app.teardown_request
+async def release_sessions(exc):
+    for session_id in g.pop('leases', ()):
+        sessions.release(session_id)
+
+
+@app.route('/', methods=['GET'])
+async def index():
+    return await app.send_static_file('index.html')
+
+
+@app.route('/api', methods=['GET', 'POST', 'HEAD'])
+async def api_index():
+    return '<HTML><HEAD></HEAD><BODY>This is the app API</BODY></HTML>'
+
+
+@app.route('/api/gaze/train/<int:epochs>', methods=['POST'])
+async def train(epochs):
+    # Querying the samples to train on reads the database with the SQLite backend
+    return await run_blocking(start_training_job, await session_l2s(), epochs, False, request.args)
+
+
+@app.route('/api/gaze/calibrate/<int:epochs>', methods=['POST'])
+async def calibrate(epochs):
+    return await run_blocking(start_training_job, await session_l2s(), epochs, True, request.args)
+
+
+@app.route('/api/gaze/jobs', methods=['GET'])
+async def training_job_list():
+    return {'jobs': [job.as_dict() for job in training_jobs.jobs()]}
+
+
+@app.route('/api/gaze/jobs/<job_id>', methods=['GET'])
+async def training_job_status(job_id):
+    job = training_jobs.get(job_id)
+    if job is None:
+        return {'status': 'failed', 'error': f'No such job {job_id}'}, 404
+    return job.as_dict()
+
+
+@app.route('/api/gaze/jobs/<job_id>/<any(cancel, pause, resume):action>', methods=['POST'])
+async def training_job_action(job_id, action):
+    job = training_jobs.get(job_id)
+    if job is None:
+        return {'status': 'failed', 'error': f'No such job {job_id}'}, 404
+    getattr(job, action)()
+    return job.as_dict()
+
+
+@app.route('/api/gaze/samples', methods=['GET'])
+async def sample_count():
+    return await run_blocking(server.sample_count, await session_l2s(), request.args)
+
+
+@app.route('/api/gaze/pca', methods=['POST'])
+async def pca():
+    return await run_blocking(l2coord.do_pca)
+
+
+@app.route('/api/gaze/config', methods=['POST'])
+async def config():
+    return {'config': Config().__dict__}
+
+
+@app.route('/api/gaze/landmarks', methods=['POST'])
+async def landmarks_():
+    server_timing = getattr(app_config, 'server_timing_header', False)
+    with timing.timed_request(getattr(app_config, 'predict_timing_sample_rate', 0.), always=server_timing) as timer:
+        result = await predict_landmarks()
+        with timing.stage('serialize'):
+            response = await app.make_response(result)
+    if timer is not None and server_timing:
+        response.headers['Server-Timing'] = timer.server_timing()
+    return response
+
+
+async def predict_landmarks():
+
+    if request.mimetype == wire.CONTENT_TYPE:
+        # Packed float32 landmarks, see pkg/wire.py
+        try:
+            with timing.stage('receive'):
+                body = await request.get_data()
+            with timing.stage('parse'):
+                landmarks, target = wire.decode_landmarks(bytearray(body))
+        except ValueError as e:
+            return {'status': 'failed', 'error': str(e)}, 400
+        with timing.stage('session'):
+            l2s = await session_l2s()
+        return await run_blocking(l2s.predict, landmarks, target)
+
+    with timing.stage('receive'):
+        await request.get_data()
+    with timing.stage('parse'):
+        landmarks_and_target = await request.get_json()
+
+    landmarks, target = wire.json_landmarks(landmarks_and_target)
+
+    with timing.stage('session'):
+        l2s = await session_l2s()
+    return await run_blocking(l2s.predict, landmarks, target)
+
+
+@app.websocket('/api/gaze/stream')
+async def stream():
+    session_id = session_id_from(websocket.headers, websocket.args, websocket.cookies)
+    session = StreamSession(None, smoothing=getattr(app_config, 'stream_smoothing', 0.), logger=logger)
+    received = asyncio.Queue()
+
+    async def receive_frames():
+        while True:
+            await received.put(await websocket.receive())
+
+    reader = asyncio.ensure_future(receive_frames())
+    try:
+        while True:
+            messages = [await received.get()]
+            # Anything else that has queued up while we were busy makes the earlier frames stale
+            while not received.empty():
+                messages.append(received.get_nowait())
+            try:
+                # Leased for each batch of frames, so an idle connection doesn't keep it from being evicted
+                session.l2s = await run_blocking(sessions.acquire, session_id)
+                try:
+                    reply = await run_blocking(session.handle, messages)
+                finally:
+                    sessions.release(session_id)
+            except ValueError as e:
+                await websocket.send(json.dumps({'status': 'failed', 'error': str(e)}))
+                continue
+            if reply is not None:
+                await websocket.send(json.dumps(reply))
+    finally:
+        reader.cancel()
+
+
+@app.route('/api/gaze/metrics', methods=['GET'])
+async def metrics_():
+    return metrics.registry.render(), 200, {'Content-Type': metrics.CONTENT_TYPE}
+
+
+@app.route('/api/gaze/timing', methods=['GET'])
+async def timing_stats():
+    return server.timing_stats()
+
+
+@app.route('/api/gaze/serving', methods=['GET'])
+async def serving_stats():
+    return (await session_l2s()).serving_stats()
+
+
+@app.route('/api/gaze/workers', methods=['GET'])
+async def worker_stats():
+    return server.worker_stats()
+
+
+@app.route('/api/gaze/checkpoints', methods=['GET'])
+async def checkpoint_stats():
+    return checkpoints.stats()
+
+
+@app.route('/api/gaze/ready', methods=['GET'])
+async def dataset_ready():
+    # Predictions are served while the dataset loads, so this is 200 either way
+    return (await session_l2s()).dataset_load_stats()
+
+
+@app.route('/api/gaze/sample_log', methods=['GET'])
+async def sample_log_stats():
+    return (await session_l2s()).sample_log_stats()
+
+
+@app.route('/api/gaze/batcher', methods=['GET'])
+async def batcher_stats():
+    return (await session_l2s()).batcher_stats()
+
+
+@app.route('/api/gaze/sessions', methods=['GET'])
+async def session_stats():
+    return sessions.stats()
+
+
+@app.errorhandler(InvalidSessionId)
+async def invalid_session_id(e):
+    return {'status': 'failed', 'error': str(e)}, 400
+
+
+@app.errorhandler(wire.InvalidSample)
+async def invalid_sample(e):
+    # Landmarks or a target of the wrong shape, however they were posted
+    return {'status': 'failed', 'error': str(e)}, 400
+
+
+@app.route('/api/gaze/save', methods=['POST', 'HEAD', 'GET'])
+async def save_model():
+    try:
+        await run_blocking((await session_l2s()).save)
+        return {'status': 'success'}
+    except Exception as e:
+        app.logger.info(f'POST /api/gaze/save: {e}')
+        return {'status': 'failed'}
+
+
+if __name__ == '__main__':
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config as HypercornConfig
+
+    hypercorn_config = HypercornConfig()
+    hypercorn_config.bind = [f'0.0.0.0:{sys.argv[1] if len(sys.argv) > 1 else 5000}']
+    asyncio.run(serve(app, hypercorn_config))
@@ -0,0 +1,189 @@
+"""
+Compare the cost of the model versions on the cpu: inference latency and throughput at several
+batch sizes, training step time and peak memory, at each of several torch thread counts.
+
+Each version runs in its own process, so that its peak memory is its own.  Models get random
+weights, from the config of cache/config.json with the version overridden.
+
+    python -m bench.forward_bench --json results.json
+    python -m bench.forward_bench --versions 300 400 --threads 1 4 16 --compare old.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+import torch
+
+VERSIONS = [300, 400, 500, 600]
+BATCH_SIZES = [1, 8, 64, 256]
+
+
+def model_class(version):
+    if version == 300:
+        from pkg.model_300 import GazePCA
+        return GazePCA
+    if version == 400:
+        from pkg.model_400 import GazeResNet
+        return GazeResNet
+    if version == 500:
+        from pkg.model_500 import GazeGCN
+        return GazeGCN
+    if version == 600:
+        from pkg.model_600 import GazeGAT
+        return GazeGAT
+    raise ValueError(f'Unsupported model version: {version}')
+
+
+def median_time(fn, repeats, min_seconds=.2):
+    """
+    Median time of fn(), over at least repeats calls and min_seconds.
+    """
+    fn()  # warm up
+    times = []
+    deadline = time.perf_counter() + min_seconds
+    while len(times) < repeats or time.perf_counter() < deadline:
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    return float(np.median(times))
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def bench_version(version, thread_counts, repeats):
+    """
+    Runs in the worker process for one version.
+    :return: A result row per thread count and batch size, and one per thread count for a training step
+    """
+    from pkg.config import Config
+
+    config = Config(version=version, device='cpu')
+    rss_before = peak_rss_mb()
+    model = model_class(version)(config, logger=logging.getLogger())
+    n_parameters = sum(p.numel() for p in model.parameters())
+    optimizer = torch.optim.Adam(filter(lambda p: p.requires_grad, model.parameters()), lr=config.lr)
+
+    common = {'version': version, 'model': model.__class__.__name__, 'parameters': n_parameters}
+    rows = []
+    for threads in thread_counts:
+        torch.set_num_threads(threads)
+
+        model.eval()
+        for batch_size in BATCH_SIZES:
+            x = torch.rand(batch_size, 478, 3)
+
+            def forward():
+                with torch.no_grad():
+                    model(x)
+
+            seconds = median_time(forward, repeats)
+            rows.append({**common, 'kind': 'inference', 'threads': threads, 'batch_size': batch_size,
+                         'latency_ms': seconds * 1e3, 'samples_per_sec': batch_size / seconds})
+
+        model.train()
+        x = torch.rand(config.batch_size, 478, 3)
+        y = torch.rand(config.batch_size, 2) * 2 - 1
+
+        def train_step():
+            loss = torch.norm(model(x) - y, dim=1).mean()
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+
+        seconds = median_time(train_step, max(repeats // 5, 3))
+        rows.append({**common, 'kind': 'train_step', 'threads': threads, 'batch_size': config.batch_size,
+                     'latency_ms': seconds * 1e3, 'samples_per_sec': config.batch_size / seconds})
+
+    peak = peak_rss_mb()
+    for row in rows:
+        row['peak_rss_mb'] = peak
+        row['peak_rss_growth_mb'] = peak - rss_before
+    return rows
+
+
+def run_worker(version, thread_counts, repeats):
+    """
+    Bench one version in a subprocess.
+    """
+    cmd = [sys.executable, '-m', 'bench.forward_bench', '--worker', str(version),
+           '--threads', *map(str, thread_counts), '--repeats', str(repeats)]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, text=True)
+    if proc.returncode != 0:
+        print(f'Version {version} failed (exit code {proc.returncode})', file=sys.stderr)
+        return []
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'torch': torch.__version__,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def _key(row):
+    return row['version'], row['kind'], row['threads'], row['batch_size']
+
+
+def print_rows(rows, baseline=None):
+    baseline = {_key(row): row for row in baseline or []}
+    for row in rows:
+        line = (f"v{row['version']} {row['kind']:10} threads {row['threads']:3}  batch {row['batch_size']:4}  "
+                f"{row['latency_ms']:9.3f} ms  {row['samples_per_sec']:10.1f} samples/s  "
+                f"peak {row['peak_rss_mb']:7.1f} MB")
+        old = baseline.get(_key(row))
+        if old is not None:
+            line += f"  ({old['latency_ms'] / row['latency_ms']:5.2f}x vs baseline)"
+        print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--versions', type=int, nargs='+', default=VERSIONS)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, torch.get_num_threads()],
+                        help='torch.set_num_threads values to sweep')
+    parser.add_argument('--repeats', type=int, default=50)
+    parser.add_argument('--json', help='Also write the results to this file')
+    parser.add_argument('--compare', help='Results file of an earlier run, to print speedups against')
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        logging.disable(logging.WARNING)
+        rows = bench_version(args.worker, args.threads, args.repeats)
+        print(json.dumps(rows))
+        sys.exit()
+
+    rows = []
+    for version in args.versions:
+        rows.extend(run_worker(version, args.threads, args.repeats))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    print_rows(rows, baseline)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'environment': environment(), 'results': rows}, f, indent=2)
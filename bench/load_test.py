@@ -0,0 +1,222 @@
+"""
+Load-test a running server with simulated clients, each posting a stream of landmark frames to
+/api/gaze/landmarks at a target frame rate, as the web client does.
+
+Frames are either synthetic (the canonical face from pkg/canonical_face.py, with a slowly drifting
+head pose and per-landmark jitter, looking at a target that moves around the screen) or replayed
+from a recorded dataset (a saved SimpleDataset, e.g. cache/checkpoints/l2s_v200_db.pth).
+
+    python app.py
+    python -m bench.load_test http://localhost:5000 --clients 8 --fps 30 --seconds 20
+    python -m bench.load_test http://localhost:5000 --replay cache/checkpoints/l2s_v200_db.pth --labels 1
+"""
+import argparse
+import collections
+import http.client
+import json
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+
+from bench.server_bench import percentile
+from pkg import wire
+from pkg.canonical_face import CANONICAL_LANDMARKS
+
+
+class SyntheticFace:
+    """
+    An endless stream of plausible frames: the canonical face, rotated, scaled and shifted by a
+    head pose that drifts from frame to frame, plus landmark jitter, and a gaze target that hops
+    between points on a 3x3 screen grid.
+    """
+
+    def __init__(self, seed: int, *, jitter=.001, frames_per_target=30):
+        self.rng = np.random.default_rng(seed)
+        self.face = np.asarray(CANONICAL_LANDMARKS, dtype=np.float32)
+        self.center = self.face[:, :2].mean(axis=0)
+        self.jitter = jitter
+        self.frames_per_target = frames_per_target
+        # Head pose: in-plane rotation (radians), scale, shift
+        self.angle = 0.
+        self.scale = 1.
+        self.shift = np.zeros(2, dtype=np.float32)
+        self.target = np.zeros(2, dtype=np.float32)
+        self.n = 0
+
+    def next(self):
+        """
+        :return: [478, 3] float32 landmarks and the [x, y] target they're looking at
+        """
+        rng = self.rng
+        if self.n % self.frames_per_target == 0:
+            self.target = rng.integers(-1, 2, size=2).astype(np.float32) * .8
+        self.n += 1
+        # A random walk, pulled back towards the rest pose
+        self.angle = .95 * self.angle + rng.normal(0, .005)
+        self.scale = 1 + .95 * (self.scale - 1) + rng.normal(0, .003)
+        self.shift = .95 * self.shift + rng.normal(0, .002, size=2).astype(np.float32)
+
+        c, s = np.cos(self.angle), np.sin(self.angle)
+        rotation = np.array([[c, -s], [s, c]], dtype=np.float32)
+        landmarks = self.face.copy()
+        landmarks[:, :2] = (landmarks[:, :2] - self.center) @ rotation.T * self.scale + self.center + self.shift
+        landmarks += rng.normal(0, self.jitter, size=landmarks.shape).astype(np.float32)
+        return landmarks, self.target
+
+
+class ReplayedSession:
+    """
+    The frames of a recorded dataset, in order, starting at an offset so clients don't all send the same frame.
+    """
+
+    def __init__(self, samples, offset: int):
+        self.samples = samples
+        self.n = offset
+
+    def next(self):
+        landmarks, target = self.samples[self.n % len(self.samples)]
+        self.n += 1
+        return landmarks, target
+
+
+def load_recording(path):
+    from pkg.simple_dataset import SimpleDataset
+
+    dataset = SimpleDataset(capacity=1)
+    dataset.load(path, expand_to_fit=True)
+    if len(dataset) == 0:
+        raise SystemExit(f'No samples in {path}')
+    return [(item.numpy().astype(np.float32), target.numpy().astype(np.float32))
+            for _, item, target in (dataset[i] for i in range(len(dataset)))]
+
+
+def encode(landmarks, target, fmt):
+    if fmt == 'binary':
+        return wire.encode_landmarks(landmarks, target), wire.CONTENT_TYPE
+    if target is None:
+        target = {'target_x': 'undefined', 'target_y': 'undefined'}
+    else:
+        target = {'target_x': float(target[0]), 'target_y': float(target[1])}
+    return json.dumps({'landmarks': landmarks.tolist(), 'target': target}).encode(), 'application/json'
+
+
+class ClientResult:
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = collections.Counter()
+        self.late = 0
+
+
+def _client(url, source, *, fps, labels, fmt, session_id, deadline, rng, result: ClientResult):
+    parts = urllib.parse.urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    headers = {'X-Session-Id': session_id} if session_id else {}
+    interval = 1 / fps if fps > 0 else 0.
+    next_frame = time.perf_counter()
+    while next_frame < deadline:
+        delay = next_frame - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        landmarks, target = source.next()
+        body, content_type = encode(landmarks, target if rng.random() < labels else None, fmt)
+        t = time.perf_counter()
+        try:
+            conn.request('POST', '/api/gaze/landmarks', body=body, headers={'Content-Type': content_type, **headers})
+            resp = conn.getresponse()
+            resp.read()
+            status = resp.status
+        except (OSError, http.client.HTTPException):
+            status = 'connection error'
+            conn.close()
+        result.statuses[status] += 1
+        if status == 200:
+            result.latencies.append(time.perf_counter() - t)
+        now = time.perf_counter()
+        if interval == 0:
+            next_frame = now
+            continue
+        # Like a camera, a client that falls behind drops the frames it missed rather than bursting to catch up
+        next_frame += interval
+        if next_frame < now:
+            missed = int((now - next_frame) / interval) + 1
+            result.late += missed
+            next_frame += missed * interval
+    conn.close()
+
+
+def load_test(url, *, clients=8, fps=30., seconds=10., labels=0., fmt='binary', recording=None, sessions=False):
+    """
+    :param fps: Frames per second per client, 0 to send as fast as the server answers
+    :param labels: Fraction of frames sent with their target, which the server adds to its datasets
+    :param recording: Replayed (landmarks, target) samples, or None for synthetic faces
+    :param sessions: Give each client its own session (X-Session-Id), rather than all sharing the default one
+    :return: dict of throughput, latency percentiles in ms and error counts
+    """
+    results = [ClientResult() for _ in range(clients)]
+    deadline = time.perf_counter() + seconds
+    threads = []
+    for i, result in enumerate(results):
+        source = SyntheticFace(i) if recording is None else ReplayedSession(recording, i * len(recording) // clients)
+        threads.append(threading.Thread(target=_client, args=(url, source), kwargs=dict(
+            fps=fps, labels=labels, fmt=fmt, session_id=f'load-test-{i}' if sessions else None,
+            deadline=deadline, rng=np.random.default_rng(1000 + i), result=result)))
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for r in results for latency in r.latencies)
+    statuses = collections.Counter()
+    for r in results:
+        statuses.update(r.statuses)
+    requests = sum(statuses.values())
+    errors = requests - statuses[200]
+    return {
+        'url': url,
+        'clients': clients,
+        'target_fps': fps,
+        'labels': labels,
+        'format': fmt,
+        'source': 'synthetic' if recording is None else 'replay',
+        'requests': requests,
+        'requests_per_sec': requests / elapsed,
+        'target_requests_per_sec': clients * fps,
+        'late_frames': sum(r.late for r in results),
+        'errors': errors,
+        'error_rate': errors / requests if requests else 0.,
+        'statuses': {str(status): n for status, n in statuses.items()},
+        'p50_ms': percentile(latencies, .5) * 1e3,
+        'p95_ms': percentile(latencies, .95) * 1e3,
+        'p99_ms': percentile(latencies, .99) * 1e3,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('url', help='Base url of the server')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--fps', type=float, default=30., help='Frames per second per client, 0 for no limit')
+    parser.add_argument('--seconds', type=float, default=10.)
+    parser.add_argument('--labels', type=float, default=0., help='Fraction of frames sent with a target')
+    parser.add_argument('--format', choices=['binary', 'json'], default='binary')
+    parser.add_argument('--replay', help='Replay a saved dataset instead of synthesizing faces')
+    parser.add_argument('--sessions', action='store_true', help='One session per client')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    result = load_test(args.url, clients=args.clients, fps=args.fps, seconds=args.seconds, labels=args.labels,
+                       fmt=args.format, recording=load_recording(args.replay) if args.replay else None,
+                       sessions=args.sessions)
+    target = f"{result['target_requests_per_sec']:.0f}" if args.fps > 0 else 'unlimited'
+    print(f"{result['requests_per_sec']:8.1f} req/s (target {target})  "
+          f"p50 {result['p50_ms']:7.2f} ms  p95 {result['p95_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms  "
+          f"errors {result['errors']} ({result['error_rate']:.2%})  late frames {result['late_frames']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
@@ -0,0 +1,83 @@
+"""
+Compare training throughput with the per-sample DataLoader over a SimpleDataset against
+vectorized batches (ShuffledBatches) over a TensorRingDataset, holding the same random samples.
+
+For each batch size, reports samples/sec for iterating the batches alone and for a full training
+epoch of the configured model (forward, loss, backward, optimizer step).
+
+    python -m bench.loader_bench [--samples 8192] [--json results.json]
+"""
+import argparse
+import json
+import logging
+import time
+
+import torch
+
+from pkg.config import Config
+from pkg.l2s import model_class
+from pkg.simple_dataset import SimpleDataset
+from pkg.tensor_dataset import TensorRingDataset, batch_loader
+
+BATCH_SIZES = [64, 256]
+
+
+def epoch_time(loader, step=None, epochs=3):
+    """
+    Median time of an epoch over loader, calling step(x, y) on every batch.
+    """
+    times = []
+    for _ in range(epochs):
+        t = time.perf_counter()
+        for idx, x, y in loader:
+            if step is not None:
+                step(x, y)
+        times.append(time.perf_counter() - t)
+    return sorted(times)[len(times) // 2]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples', type=int, default=8192)
+    parser.add_argument('--epochs', type=int, default=3)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    config = Config(device='cpu')
+    model = model_class(config.version)(config, logger=logging.getLogger())
+    model.train()
+    optimizer = torch.optim.Adam(filter(lambda p: p.requires_grad, model.parameters()), lr=config.lr)
+
+    def train_step(x, y):
+        loss = torch.norm(model(x) - y, dim=1).mean()
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+
+    datasets = {'dataloader': SimpleDataset(capacity=args.samples), 'vectorized': TensorRingDataset(capacity=args.samples)}
+    for _ in range(args.samples):
+        x, y = torch.rand(478, 3), torch.rand(2) * 2 - 1
+        for dataset in datasets.values():
+            dataset.add_item(x, y)
+
+    results = []
+    for batch_size in BATCH_SIZES:
+        for name, dataset in datasets.items():
+            loader = batch_loader(dataset, batch_size, shuffle=True)
+            load_seconds = epoch_time(loader, epochs=args.epochs)
+            train_seconds = epoch_time(loader, train_step, epochs=args.epochs)
+            result = {
+                'version': config.version,
+                'loader': name,
+                'batch_size': batch_size,
+                'samples': args.samples,
+                'load_samples_per_sec': args.samples / load_seconds,
+                'train_samples_per_sec': args.samples / train_seconds,
+            }
+            results.append(result)
+            print(f"v{config.version} batch {batch_size:4}  {name:10}  loading {result['load_samples_per_sec']:10.0f} "
+                  f"samples/s  training {result['train_samples_per_sec']:8.0f} samples/s")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,79 @@
+"""
+Check that the ONNX export of the configured model matches torch, and compare their latency.
+
+Exports the model (from its checkpoint, or with random weights if there isn't one) and, at each batch
+size from 1 to 256, reports the largest difference between the torch and onnxruntime outputs, and the
+median forward time of each.
+
+    python -m bench.onnx_bench [--json results.json]
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from pkg.l2s import Landmarks2ScreenCoords
+from pkg.onnx_backend import OnnxGazeModel, export_onnx
+
+BATCH_SIZES = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+
+def median_time(fn, x, repeats):
+    fn(x)  # warm up
+    times = []
+    for _ in range(repeats):
+        t = time.perf_counter()
+        fn(x)
+        times.append(time.perf_counter() - t)
+    return float(np.median(times))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeats', type=int, default=50)
+    parser.add_argument('--tolerance', type=float, default=1e-4)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    l2s = Landmarks2ScreenCoords(logging.getLogger())
+    model = l2s.model.eval().cpu()
+
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'model.onnx')
+        try:
+            export_onnx(model, path)
+        except Exception as err:
+            raise SystemExit(f'Could not export model version {l2s.config.version} to ONNX: {err}')
+        onnx = OnnxGazeModel(path, num_threads=getattr(l2s.config, 'onnx_num_threads', 0))
+
+        def torch_forward(x):
+            with torch.no_grad():
+                return model(x).reshape(-1, 2)
+
+        results = []
+        failed = False
+        for batch_size in BATCH_SIZES:
+            x = torch.rand(batch_size, 478, 3)
+            max_diff = (torch_forward(x) - onnx(x)).abs().max().item()
+            failed |= max_diff > args.tolerance
+            result = {
+                'version': l2s.config.version,
+                'batch_size': batch_size,
+                'max_abs_diff': max_diff,
+                'torch_ms': median_time(torch_forward, x, args.repeats) * 1e3,
+                'onnx_ms': median_time(onnx, x, args.repeats) * 1e3,
+            }
+            results.append(result)
+            print(f"batch {batch_size:4}  max diff {max_diff:.2e}  torch {result['torch_ms']:8.3f} ms  "
+                  f"onnxruntime {result['onnx_ms']:8.3f} ms  speedup {result['torch_ms'] / result['onnx_ms']:5.2f}x")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if failed:
+        raise SystemExit(f'ONNX output differs from torch by more than {args.tolerance}')
@@ -0,0 +1,100 @@
+"""
+Compare requests/sec and latency of running servers, e.g. the Flask app (app.py) against the
+asyncio one (asgi_app.py), by posting binary landmark frames from concurrent clients.
+
+    python app.py                      # port 5000
+    python asgi_app.py 5001
+    python -m bench.server_bench http://localhost:5000 http://localhost:5001 --clients 16 --seconds 10
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+
+from pkg import wire
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+def _client(url, frames, deadline, latencies, errors):
+    parts = urllib.parse.urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    i = 0
+    while time.perf_counter() < deadline:
+        frame = frames[i % len(frames)]
+        i += 1
+        t = time.perf_counter()
+        try:
+            conn.request('POST', '/api/gaze/landmarks', body=frame, headers={'Content-Type': wire.CONTENT_TYPE})
+            resp = conn.getresponse()
+            resp.read()
+            ok = resp.status == 200
+        except (OSError, http.client.HTTPException):
+            ok = False
+            conn.close()
+        if ok:
+            latencies.append(time.perf_counter() - t)
+        else:
+            errors.append(1)
+    conn.close()
+
+
+def bench(url, *, clients=16, seconds=10., frames=None):
+    """
+    Drive url with concurrent clients for a number of seconds.
+    :return: dict of requests/sec, error count and latency percentiles in ms
+    """
+    if frames is None:
+        rng = np.random.default_rng(0)
+        frames = [wire.encode_landmarks(rng.random((478, 3), dtype=np.float32)) for _ in range(64)]
+
+    latencies, errors = [], []
+    deadline = time.perf_counter() + seconds
+    threads = [threading.Thread(target=_client, args=(url, frames, deadline, latencies, errors))
+               for _ in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'url': url,
+        'clients': clients,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'requests_per_sec': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, .5) * 1e3,
+        'p95_ms': percentile(latencies, .95) * 1e3,
+        'p99_ms': percentile(latencies, .99) * 1e3,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('urls', nargs='+', help='Base url of each server to benchmark')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10.)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    results = []
+    for url in args.urls:
+        result = bench(url, clients=args.clients, seconds=args.seconds)
+        results.append(result)
+        print(f"{url:32} {result['requests_per_sec']:8.1f} req/s  p50 {result['p50_ms']:7.2f} ms  "
+              f"p99 {result['p99_ms']:7.2f} ms  errors {result['errors']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
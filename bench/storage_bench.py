@@ -0,0 +1,137 @@
+"""
+Check that training on a reduced-precision dataset (pkg/landmark_storage.py) matches training on
+float32, and how much memory each storage dtype saves.
+
+Synthetic frames (bench/load_test.py's drifting canonical face) get random targets, which move
+the irises by up to IRIS_TRAVEL/2 either way, as a gaze would: a signal of about a hundredth of
+the image width, on the scale of bfloat16's resolution.  The same samples go into a TensorRingDataset
+per storage dtype, and the configured model is trained on each from the same initial weights, with
+the same batch order, then scored on held-out float32 frames.  Training amplifies any difference
+in its inputs into a different run, so each is repeated with a few seeds, and the spread between
+them is what a difference between dtypes has to beat.  A ridge regression fitted to the stored
+landmarks, which is deterministic, shows the effect of the precision alone.
+
+    python -m bench.storage_bench [--samples 8192] [--epochs 20] [--seeds 3] [--json results.json]
+"""
+import argparse
+import json
+import logging
+
+import numpy as np
+import torch
+
+from bench.load_test import SyntheticFace
+from pkg.config import Config
+from pkg.l2s import model_class
+from pkg.landmark_storage import DEFAULT_INT16_RANGE, DTYPES, LandmarkStorage
+from pkg.tensor_dataset import TensorRingDataset, batch_loader
+
+# MediaPipe's iris landmarks, and how far they move (normalized image units) between the targets -1 and 1
+IRIS = slice(468, 478)
+IRIS_TRAVEL = .02
+
+
+def make_samples(n: int, seed: int):
+    """
+    :return: [n, 478, 3] landmarks and [n, 2] targets, the irises moved towards the target
+    """
+    face = SyntheticFace(seed, jitter=.0005)
+    rng = np.random.default_rng(seed)
+    landmarks = np.empty((n, 478, 3), dtype=np.float32)
+    targets = rng.uniform(-.8, .8, size=(n, 2)).astype(np.float32)
+    for i in range(n):
+        landmarks[i], _ = face.next()
+        landmarks[i, IRIS, :2] += targets[i] * IRIS_TRAVEL / 2
+    return torch.from_numpy(landmarks), torch.from_numpy(targets)
+
+
+def train_and_score(config, dataset, test_x, test_y, epochs: int, lr: float, seed=0):
+    """
+    :return: Mean distance to the targets over the test frames after training on dataset
+    """
+    torch.manual_seed(seed)
+    model = model_class(config.version)(config, logger=logging.getLogger())
+    optimizer = torch.optim.Adam(filter(lambda p: p.requires_grad, model.parameters()), lr=lr)
+    model.train()
+    for _ in range(epochs):
+        for idx, x, y in batch_loader(dataset, config.batch_size, shuffle=True):
+            loss = torch.norm(model(x) - y, dim=1).mean()
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+    model.eval()
+    with torch.no_grad():
+        return torch.norm(model(test_x).reshape(-1, 2) - test_y, dim=1).mean().item()
+
+
+def ridge_score(x: torch.Tensor, y: torch.Tensor, test_x, test_y, alpha=1e-6):
+    """
+    :return: Mean distance to the targets over the test frames of a ridge regression on all the coordinates
+    """
+    x, test_x = x.reshape(len(x), -1).double(), test_x.reshape(len(test_x), -1).double()
+    mean = x.mean(0)
+    x, test_x = x - mean, test_x - mean
+    w = torch.linalg.solve(x.T @ x + alpha * len(x) * torch.eye(x.shape[1], dtype=x.dtype), x.T @ (y.double() - y.mean(0)))
+    return torch.norm((test_x @ w + y.mean(0)).float() - test_y, dim=1).mean().item()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples', type=int, default=8192)
+    parser.add_argument('--test-samples', type=int, default=2048)
+    parser.add_argument('--epochs', type=int, default=20)
+    # Higher than the usual fine-tuning rate, so the models get somewhere in a few epochs
+    parser.add_argument('--lr', type=float, default=3e-4)
+    parser.add_argument('--seeds', type=int, default=3, help='Training runs per dtype')
+    parser.add_argument('--dtypes', default=','.join(DTYPES), help='Comma-separated storage dtypes to compare')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    config = Config(device='cpu')
+    x, y = make_samples(args.samples, seed=1)
+    test_x, test_y = make_samples(args.test_samples, seed=2)
+    print(f'v{config.version}, {args.samples} samples, {args.epochs} epochs; '
+          f'predicting the mean target scores {torch.norm(test_y - y.mean(0), dim=1).mean().item():.4f}')
+
+    results = []
+    baseline = None
+    for name in args.dtypes.split(','):
+        storage = LandmarkStorage(name, getattr(config, 'dataset_int16_range', DEFAULT_INT16_RANGE))
+        dataset = TensorRingDataset(capacity=args.samples, storage=storage)
+        for item, target in zip(x, y):
+            dataset.add_item(item, target)
+        error = (dataset.landmarks() - x).abs()
+        bytes_per_sample = dataset.memory_bytes() / len(dataset)
+        ridge_error = ridge_score(dataset.landmarks(), y, test_x, test_y)
+        test_errors = [train_and_score(config, dataset, test_x, test_y, args.epochs, args.lr, seed=seed)
+                       for seed in range(args.seeds)]
+        test_error, test_error_std = float(np.mean(test_errors)), float(np.std(test_errors))
+        if baseline is None:
+            baseline, ridge_baseline = test_error, ridge_error
+        result = {
+            'version': config.version,
+            'dtype': name,
+            'samples': args.samples,
+            'epochs': args.epochs,
+            'bytes_per_sample': bytes_per_sample,
+            'memory_bytes': dataset.memory_bytes(),
+            # What the configured dataset would hold when full (the fine-tuning dataset is a view of it)
+            'configured_memory_bytes': bytes_per_sample * config.dataset_capacity,
+            'landmark_error_max': error.max().item(),
+            'landmark_error_mean': error.mean().item(),
+            'ridge_test_error': ridge_error,
+            'ridge_test_error_delta': ridge_error - ridge_baseline,
+            'test_errors': test_errors,
+            'test_error': test_error,
+            'test_error_std': test_error_std,
+            'test_error_delta': test_error - baseline,
+        }
+        results.append(result)
+        print(f"{name:9} {bytes_per_sample:6.0f} B/sample  {result['configured_memory_bytes'] / 2 ** 20:7.1f} MiB "
+              f"configured  landmark error max {result['landmark_error_max']:.1e} "
+              f"mean {result['landmark_error_mean']:.1e}  ridge {ridge_error:.4f} ({ridge_error - ridge_baseline:+.4f})  "
+              f"model {test_error:.4f} ± {test_error_std:.4f} ({result['test_error_delta']:+.4f})")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
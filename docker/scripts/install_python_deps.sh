@@ -6,3 +6,6 @@ pip install scipy
 pip install scikit-learn
 pip install requests
 pip install matplotlib
+pip install flask-sock
+pip install quart hypercorn
+pip install onnx onnxruntime
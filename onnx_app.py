@@ -0,0 +1,85 @@
+"""
+Serving-only variant of app.py: answers /api/gaze/landmarks from the ONNX export of the configured model
+with onnxruntime (see pkg/onnx_backend.py), without torch or torch_geometric.  It doesn't train, so
+labelled frames are answered like any other, and not stored.
+
+    python -m pkg.onnx_backend    # once, where torch is installed, to export the checkpoint
+    python onnx_app.py [port]
+"""
+import logging
+import os
+import sys
+
+import numpy as np
+from flask import Flask, request
+
+from pkg import wire
+from pkg.config import Config
+from pkg.onnx_backend import load_onnx
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger('app')
+logging.getLogger('werkzeug').disabled = True
+
+app_config = Config()
+model = load_onnx(os.path.dirname(app_config.checkpoint), app_config.version,
+                  num_threads=getattr(app_config, 'onnx_num_threads', 0))
+logger.info(f'Serving {model.path}')
+
+app = Flask('l2s', static_url_path='/', static_folder='static')
+
+
+@app.route('/', methods=['GET'])
+def index():
+    return app.send_static_file('index.html')
+
+
+@app.route('/api', methods=['GET', 'POST', 'HEAD'])
+def api_index():
+    return '<HTML><HEAD></HEAD><BODY>This is the app API</BODY></HTML>'
+
+
+@app.route('/api/gaze/landmarks', methods=['POST'])
+def landmarks_():
+    if request.mimetype == wire.CONTENT_TYPE:
+        # Packed float32 landmarks, see pkg/wire.py
+        try:
+            landmarks, target = wire.decode_landmarks_array(
+                wire.read_frame(request.stream, request.content_length or 0))
+        except ValueError as e:
+            return {'status': 'failed', 'error': str(e)}, 400
+    else:
+        landmarks, target = wire.json_landmarks(request.json)
+        try:
+            landmarks = np.asarray(landmarks, dtype=np.float32)
+        except (TypeError, ValueError) as e:
+            raise wire.InvalidSample(f'Landmarks should be [x, y, z] numbers: {e}')
+    wire.check_sample(landmarks, target)
+
+    gaze = model.run(landmarks[np.newaxis])[0]
+    # As Landmarks2ScreenCoords.prediction_response(), without a dataset or training losses
+    return {
+        'data_index': 0,
+        'faces': 1,
+        'eyes': 2,
+        'gaze': {
+            'x': float(gaze[0]),
+            'y': float(gaze[1])
+        },
+        'landmarks': [],
+        'losses': []
+    }
+
+
+@app.route('/api/gaze/serving', methods=['GET'])
+def serving_stats():
+    return {'backend': 'onnx', 'model': model.path, 'version': app_config.version}
+
+
+@app.errorhandler(wire.InvalidSample)
+def invalid_sample(e):
+    return {'status': 'failed', 'error': str(e)}, 400
+
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,167 @@
+import collections
+import threading
+import time
+from typing import Callable, Deque, Dict, List, Optional
+
+import torch
+
+
+class _PendingPrediction:
+    __slots__ = ('landmarks', 'submitted', 'done', 'result', 'error')
+
+    def __init__(self, landmarks: torch.Tensor):
+        self.landmarks = landmarks
+        self.submitted = time.perf_counter()
+        self.done = threading.Event()
+        self.result: Optional[torch.Tensor] = None
+        self.error: Optional[BaseException] = None
+
+
+class BatcherStats:
+    """
+    Running statistics for a PredictBatcher: per-request latency (from submit to result)
+    over a sliding window of recent requests, and the distribution of batch sizes.
+    """
+
+    def __init__(self, window=4096):
+        self._lock = threading.Lock()
+        self._latencies_us: Deque[float] = collections.deque(maxlen=window)
+        self._queue_waits_us: Deque[float] = collections.deque(maxlen=window)
+        self._batch_sizes: Dict[int, int] = collections.Counter()
+        self.requests = 0
+        self.batches = 0
+        self.errors = 0
+
+    def record_batch(self, batch: List[_PendingPrediction], started: float, finished: float, failed: bool):
+        with self._lock:
+            self.batches += 1
+            self.requests += len(batch)
+            if failed:
+                self.errors += len(batch)
+            self._batch_sizes[len(batch)] += 1
+            for p in batch:
+                self._queue_waits_us.append((started - p.submitted) * 1e6)
+                self._latencies_us.append((finished - p.submitted) * 1e6)
+
+    @staticmethod
+    def _summary(values: List[float]) -> Dict[str, float]:
+        if not values:
+            return {'count': 0}
+        values = sorted(values)
+        n = len(values)
+
+        def percentile(p):
+            return values[min(n - 1, int(p * n))]
+
+        return {
+            'count': n,
+            'mean': sum(values) / n,
+            'p50': percentile(.5),
+            'p95': percentile(.95),
+            'p99': percentile(.99),
+            'max': values[-1],
+        }
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            latencies = list(self._latencies_us)
+            queue_waits = list(self._queue_waits_us)
+            batch_sizes = dict(sorted(self._batch_sizes.items()))
+            requests, batches, errors = self.requests, self.batches, self.errors
+
+        return {
+            'requests': requests,
+            'batches': batches,
+            'errors': errors,
+            'mean_batch_size': requests / batches if batches else 0.,
+            'batch_sizes': batch_sizes,
+            'latency_us': self._summary(latencies),
+            'queue_wait_us': self._summary(queue_waits),
+        }
+
+
+class PredictBatcher:
+    """
+    Collects concurrent single-frame prediction requests and runs them through the model
+    as one batch.
+
+    A batch is dispatched as soon as max_batch_size requests are waiting, or max_wait_us
+    microseconds after the first request of the batch arrived, whichever comes first.
+    forward() is called with a [B, 478, 3] tensor and must return a [B, 2] tensor.
+    """
+
+    def __init__(self, forward: Callable[[torch.Tensor], torch.Tensor], *, max_batch_size=32, max_wait_us=1000,
+                 logger=None):
+        self._forward = forward
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_us = max(0, int(max_wait_us))
+        self.logger = logger
+        self.stats = BatcherStats()
+
+        self._queue: Deque[_PendingPrediction] = collections.deque()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='predict-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, landmarks: torch.Tensor) -> torch.Tensor:
+        """
+        Queue a single [478, 3] landmarks tensor and block until its prediction is ready.
+        :return: The [2] gaze prediction for these landmarks.
+        """
+        pending = _PendingPrediction(landmarks)
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError('PredictBatcher has been stopped')
+            self._queue.append(pending)
+            self._cond.notify()
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _next_batch(self) -> List[_PendingPrediction]:
+        with self._cond:
+            while not self._queue and not self._stopped:
+                self._cond.wait()
+            if not self._queue:
+                return []
+
+            # Hold the batch open until it's full or the oldest request has waited long enough
+            deadline = self._queue[0].submitted + self.max_wait_us / 1e6
+            while len(self._queue) < self.max_batch_size and not self._stopped:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            n = min(len(self._queue), self.max_batch_size)
+            return [self._queue.popleft() for _ in range(n)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            started = time.perf_counter()
+            failed = False
+            try:
+                preds = self._forward(torch.stack([p.landmarks for p in batch]))
+                for p, pred in zip(batch, preds):
+                    p.result = pred
+            except Exception as e:
+                failed = True
+                if self.logger:
+                    self.logger.error(f'Batched prediction of {len(batch)} items failed: {e}')
+                for p in batch:
+                    p.error = e
+            finished = time.perf_counter()
+            for p in batch:
+                p.done.set()
+            self.stats.record_batch(batch, started, finished, failed)
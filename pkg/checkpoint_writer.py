@@ -0,0 +1,202 @@
+"""
+Background dataset checkpoints.
+
+Saving a dataset from the request that happened to fill its checkpoint interval stalls that
+request for the whole serialization.  Instead, add_sample() hands the dataset to a
+CheckpointWriter, whose thread takes a snapshot of it (see the datasets' snapshot()) and saves
+that, so the request only pays for queueing it.
+
+Requests to save the same file coalesce while they wait: the thread snapshots the dataset when
+it gets to it, so one write covers every request made before that.  Files are written to a
+temporary file and renamed over the old one, so a crash mid-write leaves the previous checkpoint.
+"""
+import atexit
+import collections
+import logging
+import os
+import struct
+import threading
+import time
+import zipfile
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+import torch
+
+from pkg import metrics
+
+
+def save_atomic(obj, filename: str, before_replace: Optional[Callable[[str], None]] = None):
+    """
+    torch.save obj to a temporary file next to filename, then rename it to filename.
+    :param before_replace: Called with the temporary file once it's written, before it's renamed
+    """
+    # Unique to the writer, as checkpoints and synchronous saves may write the same file at once
+    tmp = f'{filename}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        torch.save(obj, tmp)
+        if before_replace is not None:
+            before_replace(tmp)
+        os.replace(tmp, filename)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def patch_saved(filename: str, patches: Dict[str, List[Tuple[int, bytes]]]):
+    """
+    Overwrite parts of the tensor storages in a file written by torch.save, in place, and update their
+    CRCs so that it's still a valid zip file.
+    :param patches: (byte offset, bytes) pairs by the record of the storage they go in: 'data/0' for the
+    first storage torch.save pickled, 'data/1' for the second, and so on
+    """
+    with zipfile.ZipFile(filename) as z:
+        infos = z.infolist()
+        central_dir = z.start_dir
+    records = {info.filename.split('/', 1)[1]: info for info in infos}
+    with open(filename, 'r+b') as f:
+        # Where each record's CRC is in the central directory
+        central_crcs = {}
+        f.seek(central_dir)
+        for _ in infos:
+            entry_start = f.tell()
+            entry = f.read(46)
+            name_length, extra_length, comment_length = struct.unpack_from('<HHH', entry, 28)
+            central_crcs[f.read(name_length).decode()] = entry_start + 16
+            f.seek(extra_length + comment_length, os.SEEK_CUR)
+
+        for record, parts in patches.items():
+            info = records[record]
+            f.seek(info.header_offset)
+            name_length, extra_length = struct.unpack_from('<HH', f.read(30), 26)
+            start = info.header_offset + 30 + name_length + extra_length
+            for offset, data in parts:
+                if offset < 0 or offset + len(data) > info.file_size:
+                    raise ValueError(f'Patch of {len(data)} bytes at {offset} is outside {info.filename}')
+                f.seek(start + offset)
+                f.write(data)
+
+            crc = 0
+            f.seek(start)
+            left = info.file_size
+            while left:
+                chunk = f.read(min(left, 1 << 24))
+                crc = zlib.crc32(chunk, crc)
+                left -= len(chunk)
+            packed = struct.pack('<I', crc)
+            f.seek(central_crcs[info.filename])
+            f.write(packed)
+            if info.flag_bits & 0x08:
+                # torch.save leaves the local header's CRC 0 and writes it in a data descriptor after the record
+                f.seek(start + info.file_size)
+                f.seek(start + info.file_size + (4 if f.read(4) == b'PK\x07\x08' else 0))
+            else:
+                f.seek(info.header_offset + 14)
+            f.write(packed)
+
+
+class CheckpointWriter:
+
+    def __init__(self, logger=None):
+        self.logger = logger
+        self._cond = threading.Condition()
+        # filename -> (dataset, on_saved), in request order
+        self._pending: Dict[str, tuple] = collections.OrderedDict()
+        self._writing: Optional[str] = None
+        self._thread: Optional[threading.Thread] = None
+
+        self.requests = 0
+        self.coalesced = 0
+        self.writes = 0
+        self.errors = 0
+        self.last_seconds = 0.
+        self.max_seconds = 0.
+
+    def request(self, dataset, filename: str, on_saved: Optional[Callable] = None):
+        """
+        Save dataset to filename in the background.
+        :param dataset: A dataset with a snapshot() method
+        :param on_saved: Called with the snapshot once it's saved
+        """
+        with self._cond:
+            if self._thread is None:
+                # Started on first use rather than import, as inference workers are forked before any threads
+                self._thread = threading.Thread(target=self._run, name='checkpoint-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+            self.requests += 1
+            if filename in self._pending:
+                self.coalesced += 1
+                metrics.dataset_checkpoints_coalesced.inc()
+            self._pending[filename] = (dataset, on_saved)
+            metrics.dataset_checkpoint_backlog.set(len(self._pending))
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                filename, (dataset, on_saved) = self._pending.popitem(last=False)
+                self._writing = filename
+                metrics.dataset_checkpoint_backlog.set(len(self._pending))
+
+            start = time.perf_counter()
+            failed = False
+            try:
+                snapshot = dataset.snapshot()
+                snapshot.save(filename)
+                if on_saved is not None:
+                    on_saved(snapshot)
+            except Exception as err:
+                failed = True
+                if self.logger:
+                    self.logger.warning(f'Checkpoint of {filename} failed: {err}')
+            seconds = time.perf_counter() - start
+            metrics.dataset_checkpoint_seconds.observe(seconds)
+
+            with self._cond:
+                self._writing = None
+                if failed:
+                    self.errors += 1
+                else:
+                    self.writes += 1
+                self.last_seconds = seconds
+                self.max_seconds = max(self.max_seconds, seconds)
+                self._cond.notify_all()
+
+    def discard(self, filename: str):
+        """
+        Drop a waiting checkpoint of filename, and wait for one being written to finish, e.g. before
+        saving it synchronously (which would otherwise race with it).
+        """
+        with self._cond:
+            self._pending.pop(filename, None)
+            metrics.dataset_checkpoint_backlog.set(len(self._pending))
+            while self._writing == filename:
+                self._cond.wait()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every requested checkpoint has been written.
+        :return: False if that took longer than timeout
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and self._writing is None, timeout)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'requests': self.requests,
+                'coalesced': self.coalesced,
+                'writes': self.writes,
+                'errors': self.errors,
+                'backlog': len(self._pending),
+                'writing': self._writing,
+                'last_seconds': self.last_seconds,
+                'max_seconds': self.max_seconds,
+            }
+
+
+checkpoints = CheckpointWriter(logging.getLogger('app'))
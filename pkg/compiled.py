@@ -0,0 +1,74 @@
+"""
+TorchScript inference path.
+
+An eval-mode model is traced, checked against eager mode at a few batch sizes, and cached on disk,
+keyed on a hash of its weights plus the config, so that a restart with the same checkpoint reuses the
+compiled artifact rather than tracing again.
+"""
+import glob
+import hashlib
+import json
+import os
+
+import torch
+
+
+def weights_hash(model: torch.nn.Module, config) -> str:
+    """
+    :return: A hash of the config and of the model's parameters and buffers, including those left out of
+    its checkpoints (e.g. GazePCA's PCA projection, which is rebuilt from the PCA file)
+    """
+    tensors = dict(model.state_dict())
+    tensors.update(model.named_buffers())
+    h = hashlib.sha256()
+    h.update(json.dumps(config.__dict__, sort_keys=True, default=str).encode())
+    for name, t in tensors.items():
+        h.update(name.encode())
+        h.update(t.detach().cpu().contiguous().numpy().tobytes())
+    return h.hexdigest()[:16]
+
+
+def compile_model(model: torch.nn.Module, config, *, cache_dir: str, logger=None):
+    """
+    :param model: An eval-mode model
+    :param cache_dir: Where compiled models are kept, normally next to the checkpoint
+    :return: The traced model, or None if it couldn't be traced or doesn't match eager mode,
+    in which case the caller should carry on with the eager model.
+    """
+    path = os.path.join(cache_dir, f'l2s_v{config.version}_{weights_hash(model, config)}.ts')
+    try:
+        traced = torch.jit.load(path, map_location=config.device)
+        if logger:
+            logger.info(f'Loaded compiled model {path}')
+        return traced
+    except (FileNotFoundError, ValueError):
+        pass
+    except RuntimeError as err:
+        if logger:
+            logger.warning(f'Compiled model {path} is unusable, recompiling: {err}')
+
+    device = next(model.parameters()).device
+    try:
+        with torch.no_grad():
+            traced = torch.jit.freeze(torch.jit.trace(model, torch.rand(4, 478, 3, device=device), check_trace=False))
+            # Compare with eager mode at other batch sizes too, to catch shapes that tracing has baked in as constants
+            for batch_size in (1, 7):
+                x = torch.rand(batch_size, 478, 3, device=device)
+                if not torch.allclose(traced(x), model(x), atol=1e-5):
+                    raise RuntimeError(f'traced model differs from eager mode at batch size {batch_size}')
+    except Exception as err:
+        if logger:
+            logger.warning(f'Could not compile model version {config.version}, using eager mode: {err}')
+        return None
+
+    # Only the artifact for the current weights is worth keeping
+    for stale in glob.glob(os.path.join(cache_dir, f'l2s_v{config.version}_*.ts')):
+        os.remove(stale)
+    try:
+        torch.jit.save(traced, path)
+    except OSError as err:
+        if logger:
+            logger.warning(f'Could not save compiled model to {path}: {err}')
+    if logger:
+        logger.info(f'Compiled model version {config.version} to {path}')
+    return traced
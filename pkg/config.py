@@ -1,11 +1,13 @@
 import json
 
-import torch
-
 
 class Config:
 
-    def __init__(self):
+    def __init__(self, **overrides):
+        """
+        :param overrides: Values that replace those in cache/config.json, e.g. version=500 to
+        get the config of another model version (including its model_500 section)
+        """
         # load config from cache/config.json
 
 
@@ -13,10 +15,12 @@ class Config:
         try:
             with open('cache/config.json', 'r') as f:
                 config = json.load(f)
+                version = overrides.get('version', config["version"])
                 # Update the config with model-specific overrides if any
-                if f'model_{config["version"]}' in config:
-                    model_config = config[f'model_{config["version"]}']
+                if f'model_{version}' in config:
+                    model_config = config[f'model_{version}']
                     config.update(model_config)
+                config.update(overrides)
         except FileNotFoundError:
             print("No cache/config.json found, using default config.")
 
@@ -29,6 +33,9 @@ class Config:
             # Update the config with the loaded values
             self.__dict__.update(config)
         else:
+            # Imported here, as serving-only deployments read the config without torch, see onnx_app.py
+            import torch
+
             # Device to run models on
             self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
 
@@ -49,12 +56,34 @@ class Config:
 
             self.dataset_capacity = 8192
             # The capacity of the temp dataset should be  kept small so that fine-tuning can track changing poses/lighting etc.
+            # It's the latest samples of the dataset rather than a copy, so can't be larger than it.
             self.fine_tuning_dataset_capacity = 2048
+            # 'tensor' to keep datasets in preallocated tensors (pkg/tensor_dataset.py), 'list' for a list of samples,
+            # 'mmap' for tensors mapped from their dataset files, so saves only write what changed (pkg/mmap_dataset.py),
+            # 'sqlite' for a database of samples with their session, time and target, which can be queried (pkg/sqlite_dataset.py)
+            self.dataset_storage = 'tensor'
+            # With 'sqlite': the grid of target bins is dataset_target_bins x dataset_target_bins, and beyond the
+            # dataset capacity, samples older than max_age_hours, or the oldest of a session or bin over
+            # max_per_session or max_per_bin samples are dropped (None: no limit)
+            self.dataset_target_bins = 8
+            self.dataset_retention = {'max_age_hours': None, 'max_per_session': None, 'max_per_bin': None}
+            # How datasets keep landmarks: 'float32', or half the memory as 'float16', 'bfloat16' or 'int16'
+            # fixed point, which holds each axis within +- its dataset_int16_range (pkg/landmark_storage.py)
+            self.dataset_landmark_dtype = 'float32'
+            self.dataset_int16_range = [2., 2., .5]
             # Minimum size of dataset before training can begin
             self.dataset_min_size = 512
 
             # Save the dataset to disk each time this many data items are added
             self.dataset_checkpoint_frequency = 1024
+            # Save those checkpoints from a background thread rather than the request that adds the sample
+            self.dataset_checkpoint_background = True
+            # Log labelled samples to disk before adding them, so a crash doesn't lose those since the last checkpoint
+            self.sample_log = True
+            # How long the log waits for more samples before each fsync; 0 to fsync as soon as the last is done
+            self.sample_log_commit_delay_ms = 0.
+            # Load the dataset in the background at startup, serving predictions meanwhile (pkg/dataset_loader.py)
+            self.dataset_background_load = True
 
             # Save the model each time this many epochs are completed
             self.model_checkpoint_frequency = 5
@@ -78,6 +107,57 @@ class Config:
             # pca
             self.pca_num = 32
 
+            # Batch concurrent predictions: a batch runs when it's full, or when its first request has
+            # waited predict_batch_max_wait_us microseconds.  Off by default, as with a single client
+            # every request would wait that long for a batch that never fills
+            self.predict_batching = False
+            self.predict_batch_max_size = 32
+            self.predict_batch_max_wait_us = 1000
+
+            # Weight of the previous gaze in the /api/gaze/stream moving average (0: no smoothing)
+            self.stream_smoothing = 0.
+
+            # Number of training jobs of a model that may wait to start before new ones are rejected
+            self.training_queue_size = 1
+
+            # Publish the weights being trained to the serving copy of the model each time this many epochs complete
+            self.weights_publish_frequency = 1
+
+            # Size of the thread pool asgi_app.py runs model code on
+            self.asgi_executor_workers = 32
+
+            # Per-user models and datasets are kept under sessions_path.  When they take more than
+            # session_memory_budget_mb, the least recently used ones are saved there and unloaded.
+            self.sessions_path = 'cache/sessions'
+            self.session_memory_budget_mb = 1024
+
+            # 'eager', 'torchscript' to serve a traced model, 'onnx' to serve an ONNX export with onnxruntime,
+            # or 'int8' to serve a copy with dynamically quantized Linear layers (cpu only).
+            # Traced models and exports are cached next to the checkpoint, and rebuilt after each training run;
+            # epochs in between are served in eager mode.
+            self.inference_backend = 'eager'
+            # onnxruntime intra-op threads, 0 for its default
+            self.onnx_num_threads = 0
+
+            # Fraction of /api/gaze/landmarks requests whose stages are timed, see pkg/timing.py
+            self.predict_timing_sample_rate = 0.01
+            # Time every request and return its stages in a Server-Timing header
+            self.server_timing_header = False
+
+            # Run predictions in this many worker processes (cpu only), 0 to run them in the server process.
+            # The workers share one copy of the weights, and replace predict batching.
+            self.inference_workers = 0
+            # torch.set_num_threads() of each worker
+            self.inference_worker_threads = 1
+
+            # Reuse the last prediction for frames within this distance of the last frame inferred
+            # (normalized landmark units), 0 to always run the model
+            self.prediction_cache_tolerance = 0.
+            # 'linf' (largest coordinate difference) or 'l2'
+            self.prediction_cache_norm = 'linf'
+
+            self.__dict__.update(overrides)
+
         # Checkpoint to load l2s model from
         self.checkpoint = f'cache/checkpoints/l2s_v{self.version}.pth'
         self.dataset_path = f'cache/checkpoints/l2s_v{self.db_version}_db.pth'
@@ -0,0 +1,131 @@
+"""
+Background dataset loading.
+
+Unpickling a large dataset file takes seconds (65536 samples is over 350 MB of float32 landmarks),
+and predictions don't need the dataset, only training does.  A DatasetLoader loads a dataset on its
+own thread, so the server can answer requests meanwhile, and reports how far it has got as the
+bytes of the file read so far (see ProgressFile).  Whoever needs the samples waits for it with wait().
+"""
+import io
+import logging
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from pkg import metrics
+
+
+class ProgressFile(io.FileIO):
+    """
+    A file opened for reading that calls progress with the number of bytes read so far, for torch.load.
+    """
+
+    def __init__(self, filename: str, progress: Callable[[int], None]):
+        super().__init__(filename, 'rb')
+        self.progress = progress
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        b = super().read(size)
+        self._count(len(b) if b else 0)
+        return b
+
+    def readinto(self, b):
+        n = super().readinto(b)
+        self._count(n or 0)
+        return n
+
+    def _count(self, n: int):
+        self.bytes_read += n
+        self.progress(self.bytes_read)
+
+
+class DatasetLoader:
+    LOADING = 'loading'
+    READY = 'ready'
+    FAILED = 'failed'
+
+    def __init__(self, dataset, filename: str, *, expand_to_fit=True, on_loaded: Optional[Callable] = None,
+                 logger=None):
+        """
+        :param dataset: The dataset to load, with a load(filename, expand_to_fit, progress) method
+        :param on_loaded: Called on the loading thread once the dataset has loaded, or failed to (see failed),
+        before wait() returns
+        """
+        self.dataset = dataset
+        self.filename = filename
+        self.expand_to_fit = expand_to_fit
+        self.on_loaded = on_loaded
+        self.logger = logger
+
+        self.state = DatasetLoader.LOADING
+        self.error = None
+        self.bytes_read = 0
+        self.total_bytes = os.path.getsize(filename) if os.path.exists(filename) else 0
+        self.started = None
+        self.seconds = None
+        self._loaded = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """
+        Load the dataset on a new thread.
+        """
+        self._thread = threading.Thread(target=self.run, name='dataset-loader', daemon=True)
+        self._thread.start()
+
+    def run(self):
+        """
+        Load the dataset on this thread.  If it fails, the dataset is left as it is and wait() returns all the same.
+        """
+        self.started = time.perf_counter()
+        logger = self.logger or logging.getLogger('app')
+        try:
+            self.dataset.load(self.filename, expand_to_fit=self.expand_to_fit, progress=self._progress)
+            self.state = DatasetLoader.READY
+        except Exception as e:
+            self.state = DatasetLoader.FAILED
+            self.error = str(e)
+            logger.exception(f'Loading {self.filename} failed: {e}')
+        if self.on_loaded is not None:
+            # Either way, so whoever is holding samples back for the dataset stops
+            try:
+                self.on_loaded()
+            except Exception as e:
+                logger.exception(f'After loading {self.filename}: {e}')
+        self.seconds = time.perf_counter() - self.started
+        metrics.dataset_load_seconds.observe(self.seconds)
+        self._loaded.set()
+
+    def _progress(self, bytes_read: int):
+        self.bytes_read = bytes_read
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded.is_set()
+
+    @property
+    def failed(self) -> bool:
+        return self.state == DatasetLoader.FAILED
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until the dataset has loaded (or failed to).
+        :return: False if that took longer than timeout
+        """
+        return self._loaded.wait(timeout)
+
+    def stats(self):
+        return {
+            'state': self.state,
+            'filename': self.filename,
+            'bytes_read': self.bytes_read,
+            'total_bytes': self.total_bytes,
+            # Reads can go past the end of a file, or not get to it, so it's clamped and set to 1 once loaded
+            'progress': 1. if self.loaded else min(self.bytes_read / self.total_bytes, 1.) if self.total_bytes else 0.,
+            'seconds': self.seconds if self.loaded else
+            time.perf_counter() - self.started if self.started is not None else 0.,
+            'samples': len(self.dataset) if self.loaded else 0,
+            'error': self.error,
+        }
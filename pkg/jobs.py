@@ -0,0 +1,176 @@
+import collections
+import itertools
+import queue
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+
+class TrainingQueueFull(Exception):
+    pass
+
+
+class TrainingJob:
+    """
+    A training (or calibration) run, executed by a TrainingJobManager.
+    The training loop calls checkpoint() between batches, which is where pause and cancel take effect,
+    and report() at the end of each epoch.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    PAUSED = 'paused'
+    COMPLETED = 'completed'
+    CANCELLED = 'cancelled'
+    FAILED = 'failed'
+
+    ACTIVE_STATES = (QUEUED, RUNNING, PAUSED)
+
+    def __init__(self, l2s, epochs: int, calibration_mode: bool, dataset=None):
+        self.job_id = uuid.uuid4().hex[:12]
+        # Both dropped once the job is done, so that finished jobs don't keep evicted sessions in memory
+        self.l2s = l2s
+        # Samples to train on instead of l2s's datasets
+        self.dataset = dataset
+        self.samples = len(dataset) if dataset is not None else None
+        self.epochs = epochs
+        self.calibration_mode = calibration_mode
+        self.state = TrainingJob.QUEUED
+        self.epoch = 0
+        self.losses = None
+        self.samples_per_sec = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+        self._cancel_requested = threading.Event()
+        self._resumed = threading.Event()
+        self._resumed.set()
+
+    @property
+    def active(self):
+        return self.state in TrainingJob.ACTIVE_STATES
+
+    @property
+    def cancelled(self):
+        return self._cancel_requested.is_set()
+
+    def checkpoint(self) -> bool:
+        """
+        Block while the job is paused.
+        :return: False if the job has been cancelled and training should stop.
+        """
+        if not self._resumed.is_set():
+            self.state = TrainingJob.PAUSED
+            self._resumed.wait()
+            self.state = TrainingJob.RUNNING
+        return not self.cancelled
+
+    def report(self, epoch: int, epochs: int, losses: Dict[str, float], samples_per_sec: float):
+        self.epoch = epoch
+        self.epochs = epochs
+        self.losses = losses
+        self.samples_per_sec = samples_per_sec
+
+    def cancel(self):
+        self._cancel_requested.set()
+        self._resumed.set()
+        if self.state == TrainingJob.QUEUED:
+            self.state = TrainingJob.CANCELLED
+            self.finished = time.time()
+            self.l2s = self.dataset = None
+
+    def pause(self):
+        if self.active:
+            self._resumed.clear()
+
+    def resume(self):
+        self._resumed.set()
+
+    def as_dict(self):
+        return {
+            'job_id': self.job_id,
+            'state': self.state,
+            'mode': 'calibrate' if self.calibration_mode else 'train',
+            'samples': self.samples,
+            'epoch': self.epoch,
+            'epochs': self.epochs,
+            'losses': self.losses,
+            'samples_per_sec': self.samples_per_sec,
+            'error': self.error,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+
+class TrainingJobManager:
+    """
+    Runs training jobs one at a time on a dedicated worker thread, so that runs never interleave on the
+    same model and optimizer.  Up to queue_size jobs per model can wait to start, whether or not one of
+    its jobs is running; further submissions for that model are rejected with TrainingQueueFull.  A model
+    with no jobs waiting or running can always submit one.
+    """
+
+    def __init__(self, *, queue_size=1, history=32, logger=None):
+        self.logger = logger
+        self.queue_size = queue_size
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, TrainingJob] = collections.OrderedDict()
+        self._history = history
+        self._thread = threading.Thread(target=self._run, name='training-jobs', daemon=True)
+        self._thread.start()
+
+    def submit(self, l2s, epochs: int, calibration_mode: bool, dataset=None) -> TrainingJob:
+        """
+        :param l2s: The Landmarks2ScreenCoords to train
+        :param dataset: Samples to train on instead of its datasets, see Landmarks2ScreenCoords.sample_query()
+        """
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if job.l2s is l2s]
+            waiting = sum(1 for job in jobs if job.state == TrainingJob.QUEUED)
+            running = any(job.state in (TrainingJob.RUNNING, TrainingJob.PAUSED) for job in jobs)
+            if (waiting or running) and waiting >= self.queue_size:
+                raise TrainingQueueFull(f'{waiting} training job(s) already queued')
+
+            job = TrainingJob(l2s, epochs, calibration_mode, dataset)
+            self._jobs[job.job_id] = job
+            self._prune()
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[TrainingJob]:
+        return self._jobs.get(job_id)
+
+    def jobs(self):
+        return list(self._jobs.values())
+
+    def has_active(self, l2s) -> bool:
+        return any(job.active and job.l2s is l2s for job in self.jobs())
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if not job.active]
+        for job_id in itertools.islice(finished, max(0, len(self._jobs) - self._history)):
+            del self._jobs[job_id]
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            # cancel() drops it
+            l2s, dataset = job.l2s, job.dataset
+            if job.state == TrainingJob.CANCELLED or l2s is None:
+                continue
+            job.state = TrainingJob.RUNNING
+            job.started = time.time()
+            try:
+                job.losses = l2s.train(job.epochs, calibration_mode=job.calibration_mode, job=job, dataset=dataset)
+                job.state = TrainingJob.CANCELLED if job.cancelled else TrainingJob.COMPLETED
+            except Exception as e:
+                job.state = TrainingJob.FAILED
+                job.error = str(e)
+                if self.logger:
+                    self.logger.exception(f'Training job {job.job_id} failed: {e}')
+            job.finished = time.time()
+            job.l2s = job.dataset = None
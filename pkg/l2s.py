@@ -1,5 +1,10 @@
+import copy
+import itertools
 import logging
 import math
+import os
+import threading
+import time
 from math import gamma
 
 import numpy as np
@@ -8,11 +13,21 @@ import torch.utils.data
 from torch.optim.lr_scheduler import StepLR
 from tqdm import tqdm
 
+from pkg import metrics, timing, wire
+from pkg.batcher import PredictBatcher
+from pkg.checkpoint_writer import checkpoints
+from pkg.compiled import compile_model
 from pkg.config import Config
+from pkg.dataset_loader import DatasetLoader
 from pkg.model_300 import GazePCA
 from pkg.model_600 import GazeGAT
-from pkg.simple_dataset import SimpleDataset
+from pkg.tensor_dataset import RecentView, batch_loader, new_dataset
 from pkg.model_400 import GazeResNet
+from pkg.onnx_backend import onnx_model
+from pkg.prediction_cache import PredictionCache
+from pkg.quantized import accuracy_delta, model_bytes, quantize_model
+from pkg.sample_log import SampleLog
+from pkg.sqlite_dataset import SqliteDataset
 from pkg.model_500 import  GazeGCN
 """
 export interface LandmarkFeatures {
@@ -27,27 +42,44 @@ export interface LandmarkFeatures {
 """
 
 
+def model_class(version):
+    if version == 300:
+        return GazePCA
+    elif version == 400:
+        return GazeResNet
+    elif version == 500:
+        return GazeGCN
+    elif version == 600:
+        return GazeGAT
+    raise ValueError(f"Unsupported model version: {version}")
+
+
 class Landmarks2ScreenCoords:
 
-    def __init__(self, logger):
+    def __init__(self, logger, session_dir=None, worker_pool=None):
+        """
+        :param logger:
+        :param session_dir: For a per-user instance, the directory its model, datasets and optimizer
+        state are kept in.  The model starts from the global checkpoint if there's none there yet.
+        None to use the global checkpoint and dataset.
+        :param worker_pool: Optional WorkerPool (pkg/workers.py) to run predictions in
+        """
+        self.session_dir = session_dir
         try:
             self.config = Config()
             self.logger = logger
+            base_checkpoint = self.config.checkpoint
+            if session_dir is not None:
+                os.makedirs(session_dir, exist_ok=True)
+                self.config.checkpoint = os.path.join(session_dir, os.path.basename(self.config.checkpoint))
+                self.config.dataset_path = os.path.join(session_dir, os.path.basename(self.config.dataset_path))
             self.mode = 'eval'
             self.device = self.config.device
             self.target = np.ndarray((2,))  # x, y coords, -1..1, origin center of the screen
-            if self.config.version == 300:
-                model = GazePCA
-            elif self.config.version == 400:
-                model = GazeResNet
-            elif self.config.version == 500:
-                model = GazeGCN
-            elif self.config.version == 600:
-                model = GazeGAT
-            else:
-                raise ValueError(f"Unsupported model version: {self.config.version}")
+            model = model_class(self.config.version)
 
-            self.model = model(self.config, logger=logger, filename=self.config.checkpoint).to(self.device)
+            checkpoint = self.config.checkpoint if os.path.exists(self.config.checkpoint) else base_checkpoint
+            self.model = model(self.config, logger=logger, filename=checkpoint).to(self.device)
 
             self.optimizer = torch.optim.Adam(
                 filter(lambda p: p.requires_grad, self.model.parameters()),
@@ -59,25 +91,277 @@ class Landmarks2ScreenCoords:
             print(f"Couldn't initialize model: {e}")
             self.model = None
 
-        self.dataset = SimpleDataset(capacity=self.config.dataset_capacity, logger=logger)
-        self.dataset.load(self.config.dataset_path, expand_to_fit=False)
+        self.dataset = new_dataset(self.config, self.config.dataset_capacity, logger=logger)
+        if isinstance(self.dataset, SqliteDataset):
+            # Recorded with each sample, for query()
+            self.dataset.session = os.path.basename(session_dir) if session_dir is not None else ''
+
+        # Predictions run on a frozen, eval-mode copy of the model, which training replaces
+        # wholesale with publish_weights().  So serving never sees train-mode BatchNorm or
+        # half-applied optimizer steps, and needs no lock.
+        self.serving_model = None
+        self.serving_backend = None
+        self.serving_bytes = 0
+        self.weights_version = 0
+        # How the int8 serving model compares with the float one, see pkg/quantized.py
+        self.quantization_report = None
+        # Predictions run in the pool's worker processes, on a shared-memory copy of the snapshot
+        self.worker_pool = None
+        self.worker_key = None
+        if worker_pool is not None and self.model is not None and str(self.device) == 'cpu':
+            self.worker_pool = worker_pool
+            self.worker_key = worker_pool.register()
+
+        # Labelled samples are logged as they're added, and the ones the last dataset checkpoint
+        # missed are added again once it has loaded, see pkg/sample_log.py
+        self._sample_lock = threading.Lock()
+        self.sample_log = None
+        if getattr(self.config, 'sample_log', True):
+            self.sample_log = SampleLog(os.path.splitext(self.config.dataset_path)[0] + '.wal',
+                                        session=os.path.basename(session_dir) if session_dir is not None else '',
+                                        commit_delay_ms=getattr(self.config, 'sample_log_commit_delay_ms', 0.),
+                                        logger=logger)
+
+        # The dataset loads in the background while predictions are served, see pkg/dataset_loader.py.
+        # Samples labelled meanwhile wait here, as the log numbers them by the dataset's added count.
+        self._pending_samples = []
+        # Labelled after the dataset failed to load
+        self._dropped_samples = 0
+        self.dataset_loader = DatasetLoader(self.dataset, self.config.dataset_path, expand_to_fit=False,
+                                            on_loaded=self._dataset_loaded, logger=logger)
+        if getattr(self.config, 'dataset_background_load', True):
+            self.dataset_loader.start()
+        else:
+            self.dataset_loader.run()
+
+        if self.model is not None:
+            self.publish_weights(compile=True)
 
-        self.fine_tuning_dataset = SimpleDataset(capacity=self.config.fine_tuning_dataset_capacity, logger=logger)
+        # The latest samples of the dataset, rather than a copy of them
+        self.fine_tuning_dataset = RecentView(self.dataset, self.config.fine_tuning_dataset_capacity)
+        if self.fine_tuning_dataset.capacity > self.dataset.capacity:
+            logging.getLogger('app').warning(f'fine_tuning_dataset_capacity {self.fine_tuning_dataset.capacity} '
+                                             f'is more than dataset_capacity {self.dataset.capacity}, which limits it')
 
         self.losses = {"h_loss": 1., "v_loss": 1., "loss": math.sqrt(2)}
+        # See _count_optimizer_bytes()
+        self._optimizer_bytes = 0
+
+        # Pick up where a suspended session left off
+        if session_dir is not None:
+            if os.path.exists(self.fine_tuning_dataset_path):
+                # Saved before the fine-tuning dataset was a view of the dataset, which holds the same samples
+                os.remove(self.fine_tuning_dataset_path)
+            self._load_training_state()
+
+        # Frames that barely differ from the last one inferred get its prediction, see pkg/prediction_cache.py
+        self.prediction_cache = None
+        if getattr(self.config, 'prediction_cache_tolerance', 0.) > 0:
+            self.prediction_cache = PredictionCache(self.config.prediction_cache_tolerance,
+                                                    norm=getattr(self.config, 'prediction_cache_norm', 'linf'))
+
+        # Concurrent predict() calls are collected into batches for a single forward pass.
+        # Not with a worker pool, where they run side by side in the workers instead.
+        self.batcher = None
+        if self.model is not None and self.worker_pool is None and getattr(self.config, 'predict_batching', False):
+            self.batcher = PredictBatcher(
+                self._forward,
+                max_batch_size=getattr(self.config, 'predict_batch_max_size', 32),
+                max_wait_us=getattr(self.config, 'predict_batch_max_wait_us', 1000),
+                logger=logger)
+
+    def publish_weights(self, compile=False):
+        """
+        Make a snapshot of the model being trained the one that serves predictions.
+        :param compile: Serve a TorchScript or ONNX Runtime version of the snapshot, if the inference_backend
+        config asks for one.  Left False while weights change every epoch, where tracing isn't worth it.
+        An int8 snapshot is cheap enough to make every time, but is only checked against the float model
+        on the dataset when compile is True.
+        """
+        snapshot = copy.deepcopy(self.model)
+        snapshot.eval()
+        snapshot.requires_grad_(False)
+        if self.worker_pool is not None:
+            # Workers run the float model in eager mode, whatever the inference_backend
+            self.worker_pool.publish(self.worker_key, snapshot, self.config, self.weights_version + 1)
+        backend = 'eager'
+        requested_backend = getattr(self.config, 'inference_backend', 'eager')
+        if requested_backend == 'int8':
+            quantized = quantize_model(snapshot, self.config, logger=self.logger)
+            if quantized is not None:
+                # Once the dataset has loaded, when _dataset_loaded() publishes again
+                if compile and self.dataset_ready:
+                    self.quantization_report = accuracy_delta(snapshot, quantized, self.dataset)
+                    if self.logger:
+                        self.logger.info(f'int8 model version {self.config.version}: {self.quantization_report}')
+                snapshot = quantized
+                backend = requested_backend
+        if compile and requested_backend in ('torchscript', 'onnx'):
+            cache_dir = os.path.dirname(self.config.checkpoint)
+            if requested_backend == 'torchscript':
+                compiled = compile_model(snapshot, self.config, cache_dir=cache_dir, logger=self.logger)
+            else:
+                compiled = onnx_model(snapshot, self.config, cache_dir=cache_dir, logger=self.logger)
+            if compiled is not None:
+                snapshot = compiled
+                backend = requested_backend
+        # A single reference assignment, so a concurrent _forward() uses either the old model or the new one
+        self.serving_model = snapshot
+        self.serving_backend = backend
+        self.serving_bytes = model_bytes(snapshot) if backend == 'int8' else self._model_bytes()
+        self.weights_version += 1
+
+    def _dataset_loaded(self):
+        """
+        Called by the dataset loader once the dataset has loaded, or failed to: add the samples the log
+        has and the dataset doesn't, then those labelled while it loaded.
+        """
+        logger = logging.getLogger('app')
+        ticket = None
+        with self._sample_lock:
+            try:
+                if self.dataset_failed:
+                    # Neither the log nor these samples can go into a dataset that isn't there, see add_sample()
+                    if self._pending_samples:
+                        logger.warning(f'Dropped {len(self._pending_samples)} samples labelled while '
+                                       f'{self.config.dataset_path} was loading')
+                    self._dropped_samples += len(self._pending_samples)
+                    return
+                if self.sample_log is not None:
+                    replayed = 0
+                    for sample in self.sample_log.replay(self.dataset.added):
+                        # One by one, so a record the dataset won't take doesn't cost the ones after it
+                        try:
+                            self.dataset.add_item(sample.landmarks, sample.target)
+                        except Exception as e:
+                            logger.warning(f'Skipped sample {sample.seq} of {self.sample_log.path}: {e}')
+                            continue
+                        # Keep the count in step with the log, should a checkpoint have gone missing
+                        self.dataset.added = sample.seq
+                        replayed += 1
+                    if replayed:
+                        logger.info(f'Replayed {replayed} samples from {self.sample_log.path}')
+                for landmarks, target in self._pending_samples:
+                    self.dataset.add_item(landmarks, target)
+                    if self.sample_log is not None:
+                        ticket = self.sample_log.append(self.dataset.added, landmarks, target, wait=False)
+            finally:
+                # Samples go straight to the dataset (or nowhere) from now on, whatever went wrong above
+                self._pending_samples = None
+        if ticket is not None:
+            self.sample_log.wait(ticket)
+        if self.serving_model is not None and self.serving_backend == 'int8':
+            # For the quantization report, which needs the dataset
+            self.publish_weights(compile=True)
+
+    @property
+    def dataset_ready(self):
+        """
+        True once the dataset has loaded, and samples are added to it as they arrive.
+        """
+        return self._pending_samples is None and not self.dataset_failed
 
+    @property
+    def dataset_failed(self):
+        """
+        True if the dataset file couldn't be loaded.  It's left alone then, for someone to look at: samples
+        aren't added, training fails, and neither checkpoints nor suspend() write over the file.
+        """
+        return self.dataset_loader.failed
 
+    @property
+    def fine_tuning_dataset_path(self):
+        return os.path.join(self.session_dir, 'l2s_fine_tuning_db.pth')
+
+    @property
+    def training_state_path(self):
+        return os.path.join(self.session_dir, 'l2s_training_state.pth')
+
+    def _load_training_state(self):
+        try:
+            state = torch.load(self.training_state_path, weights_only=True)
+        except FileNotFoundError:
+            return
+        self.losses = state['losses']
+        if self.model is not None:
+            self.optimizer.load_state_dict(state['optimizer'])
+            self.scheduler.load_state_dict(state['scheduler'])
+            self._count_optimizer_bytes()
+
+    def suspend(self):
+        """
+        Save everything a per-user instance needs to carry on later to its session directory,
+        and stop its threads.  The instance shouldn't be used afterwards.
+        """
+        if self.batcher is not None:
+            self.batcher.stop()
+        # Otherwise the dataset saved below could be the empty one it's loading into
+        self.dataset_loader.wait()
+        if self.worker_pool is not None:
+            self.worker_pool.drop(self.worker_key)
+        self.save()
+        checkpoints.discard(self.config.dataset_path)
+        if not self.dataset_failed:
+            self.dataset.save(self.config.dataset_path)
+            if self.sample_log is not None:
+                self.sample_log.truncate(self.dataset.added)
+        if self.sample_log is not None:
+            self.sample_log.close()
+        if self.session_dir is not None:
+            torch.save({
+                'losses': self.losses,
+                'optimizer': self.optimizer.state_dict() if self.model is not None else None,
+                'scheduler': self.scheduler.state_dict() if self.model is not None else None,
+            }, self.training_state_path)
+
+    def memory_bytes(self):
+        """
+        Estimated memory held by this instance: both copies of the model, optimizer state and the datasets.
+        """
+        n = self.dataset.memory_bytes() + self.fine_tuning_dataset.memory_bytes()
+        if self.model is not None:
+            n += self._model_bytes() + self.serving_bytes + self._optimizer_bytes
+        return n
+
+    def _count_optimizer_bytes(self):
+        # Counted on the thread that steps the optimizer, whose first step() adds its state, rather than by
+        # memory_bytes() on whichever request asks
+        self._optimizer_bytes = sum(v.nelement() * v.element_size()
+                                    for state in self.optimizer.state.values()
+                                    for v in state.values() if isinstance(v, torch.Tensor))
+
+    def _model_bytes(self):
+        return sum(t.nelement() * t.element_size()
+                   for t in itertools.chain(self.model.parameters(), self.model.buffers()))
 
     def save(self):
         if self.model:
-            self.model.save(self.config.checkpoint)
+            with metrics.model_save_seconds.time():
+                self.model.save(self.config.checkpoint)
 
-    def train(self, epochs, calibration_mode=False):
+    def train(self, epochs, calibration_mode=False, job=None, dataset=None):
+        """
+        Train the model.
+        :param epochs: Number of epochs, or <= 0 to choose from the dataset size
+        :param calibration_mode: Train on the fine-tuning dataset instead of the full dataset
+        :param job: Optional TrainingJob, which is told of progress and can pause or cancel training
+        :param dataset: Train on these samples instead, e.g. from sample_query()
+        """
         if self.model:
+            # Training waits for the dataset to load (the job can be cancelled meanwhile)
+            if not self.dataset_loader.loaded:
+                logging.getLogger('app').info(f'Training waits for {self.config.dataset_path} to load')
+                while not self.dataset_loader.wait(.1):
+                    if job is not None and job.cancelled:
+                        return self.losses
+            if self.dataset_failed:
+                raise RuntimeError(f'{self.config.dataset_path} failed to load: {self.dataset_loader.error}')
 
             self.model.set_calibration_mode(calibration_mode)
 
-            if calibration_mode:
+            if dataset is not None:
+                print(f"Training with {len(dataset)} queried samples")
+            elif calibration_mode:
                 dataset =  self.fine_tuning_dataset
                 print(f"Fine-tuning with dataset size: {len(dataset)}")
             else:
@@ -87,7 +371,7 @@ class Landmarks2ScreenCoords:
             if len(dataset) >= self.config.dataset_min_size:
                 self.model.train()
 
-                loader = torch.utils.data.DataLoader(dataset=dataset, batch_size=self.config.batch_size, shuffle=True)
+                loader = batch_loader(dataset, self.config.batch_size, shuffle=True)
 
 
                 if epochs <= 0:
@@ -97,8 +381,14 @@ class Landmarks2ScreenCoords:
                     for epoch in range(epochs):
                         losses = {"h_loss": 0., "v_loss": 0., "loss": 0.}
                         n_batches = 0
+                        n_samples = 0
+                        epoch_start = time.perf_counter()
 
                         for n_batches, (idx, x, y) in enumerate(loader):
+                            # Blocks while the job is paused
+                            if job is not None and not job.checkpoint():
+                                break
+                            n_samples += x.shape[0]
                             x = x.to(self.device)
                             y = y.to(self.device)
 
@@ -119,6 +409,9 @@ class Landmarks2ScreenCoords:
                             self.optimizer.step()
 
 
+                        if job is not None and job.cancelled:
+                            break
+
                         # Compute average losses for the epoch
                         losses["loss"] /= n_batches + 1
                         losses["h_loss"] /= n_batches + 1
@@ -128,12 +421,28 @@ class Landmarks2ScreenCoords:
                         # Update the progress bar at the end of the epoch
                         pbar.set_postfix(h_loss=self.losses["h_loss"], v_loss=self.losses["v_loss"], loss=self.losses["loss"])
                         pbar.update(1)
+                        epoch_seconds = time.perf_counter() - epoch_start
+                        mode = 'calibration' if calibration_mode else 'training'
+                        metrics.training_epochs.labels(mode).inc()
+                        metrics.training_samples.labels(mode).inc(n_samples)
+                        metrics.training_samples_per_second.labels(mode).set(n_samples / epoch_seconds)
+                        metrics.training_epoch_seconds.labels(mode).observe(epoch_seconds)
+                        if job is not None:
+                            job.report(epoch + 1, epochs, losses, n_samples / epoch_seconds)
 
                         self.scheduler.step()
+                        self._count_optimizer_bytes()
                         # logging.getLogger('app').info(f'Epoch {epoch + 1}: lr {self.scheduler.get_last_lr()}  h_loss: {self.losses["h_loss"]: .4f} v_loss: {self.losses["v_loss"]: .4f}')
 
+                        if (epoch + 1) % getattr(self.config, 'weights_publish_frequency', 1) == 0:
+                            self.publish_weights()
+
                         if (epoch % self.config.model_checkpoint_frequency) == 0:
                             self.save()
+
+                # Publish whatever the last (possibly partial) epoch left
+                self.publish_weights(compile=True)
+                self._count_optimizer_bytes()
             self.model.eval()
 
         return self.losses
@@ -155,32 +464,80 @@ class Landmarks2ScreenCoords:
         # Convert the landmarks into a tensor.  This tensor is what's saved in the dataset
         # as well as being passed to the model.
 
-        assert isinstance(landmarks, list)
-        landmarks = torch.Tensor(landmarks).to(torch.float32)
+        # Landmarks arrive as nested lists from JSON posts, or as a float32 tensor from binary posts
+        if isinstance(landmarks, list):
+            with timing.stage('tensor'):
+                try:
+                    landmarks = torch.Tensor(landmarks).to(torch.float32)
+                except (TypeError, ValueError) as e:
+                    raise wire.InvalidSample(f'Landmarks should be [x, y, z] numbers: {e}')
+        assert isinstance(landmarks, torch.Tensor) and landmarks.dtype == torch.float32
+        wire.check_sample(landmarks, label)
         # If we're gathering training data, add the landmarks (x) and label (y)
         # In the training dataset.
         if label is not None:
-            label_as_tensor = torch.Tensor(label).to(torch.float32)
+            with timing.stage('add_sample'):
+                self.add_sample(landmarks, label)
+
+        # Predict the gaze coordinates
+        with timing.stage('forward'):
+            gaze_location = self.infer(landmarks)
+
+        # print(label, features, gaze_location)
+        with timing.stage('response'):
+            return self.prediction_response(gaze_location)
+
+    def add_sample(self, landmarks: torch.Tensor, label):
+        """
+        Add a labelled frame to the dataset, and so to the fine-tuning dataset, its latest samples.
+        :param landmarks: [478, 3] landmarks tensor
+        :param label: [x, y] target screen coordinates
+        :raises InvalidSample: (pkg/wire.py) if either has the wrong shape
+        """
+        label_as_tensor = torch.Tensor(label).to(torch.float32)
+        # Before the sample is logged, so a bad one can't stop the log replaying
+        wire.check_sample(landmarks, label_as_tensor)
+        ticket = None
+        with self._sample_lock:
+            if self._pending_samples is not None:
+                # Added once the dataset has loaded, see _dataset_loaded()
+                self._pending_samples.append((landmarks, label_as_tensor))
+                return
+            if self.dataset_failed:
+                if not self._dropped_samples:
+                    logging.getLogger('app').warning(
+                        f'Dropping labelled samples: {self.config.dataset_path} failed to load')
+                self._dropped_samples += 1
+                return
             self.dataset.add_item(landmarks, label_as_tensor)
-            self.fine_tuning_dataset.add_item(landmarks, label_as_tensor)
-            # Save dataset periodically
-            if (self.dataset.idx % self.config.dataset_checkpoint_frequency) == 0:
-                self.dataset.save(self.config.dataset_path)
+            # Only once the dataset has taken it, so every record is a sample the dataset holds
+            if self.sample_log is not None:
+                ticket = self.sample_log.append(self.dataset.added, landmarks, label_as_tensor, wait=False)
+        if ticket is not None:
+            # Outside the lock, so concurrent samples share an fsync
+            with timing.stage('sample_log'):
+                self.sample_log.wait(ticket)
+
+        # Save dataset periodically
+        if (self.dataset.idx % self.config.dataset_checkpoint_frequency) == 0:
+            if getattr(self.config, 'dataset_checkpoint_background', True):
+                # See pkg/checkpoint_writer.py
+                checkpoints.request(self.dataset, self.config.dataset_path, on_saved=self._dataset_saved)
+            else:
+                added = self.dataset.added
+                with timing.stage('dataset_save'):
+                    self.dataset.save(self.config.dataset_path)
+                if self.sample_log is not None:
+                    self.sample_log.truncate(added)
                 logging.getLogger('app').info(
                     f"Saved dataset to {self.config.dataset_path}. Dataset size {len(self.dataset)}")
 
-        # Predict the gaze coordinates
-
-        if self.model is not None:
-            with torch.no_grad():
-                self.model.eval()
-                pred = self.model(torch.unsqueeze(landmarks, 0).to(self.device))
+    def _dataset_saved(self, snapshot):
+        # The checkpoint holds the logged samples up to its added count
+        if self.sample_log is not None:
+            self.sample_log.truncate(snapshot.added)
 
-                pred = torch.squeeze(pred)
-                gaze_location = pred.cpu().detach().numpy()
-        else:
-            gaze_location = [0,0]
-        # print(label, features, gaze_location)
+    def prediction_response(self, gaze_location):
         return {
             'data_index': self.dataset.idx,
             'faces': 1,
@@ -193,6 +550,111 @@ class Landmarks2ScreenCoords:
             'losses': self.losses
         }
 
+    def _forward(self, x: torch.Tensor) -> torch.Tensor:
+        """
+        Run the model on a batch of landmarks.
+        :param x: [B, 478, 3] landmarks
+        :return: [B, 2] gaze coordinates, on the cpu
+        """
+        if self.worker_pool is not None:
+            start = time.perf_counter()
+            pred = self.worker_pool.forward(self.worker_key, x)
+            metrics.forward_seconds.labels('workers').observe(time.perf_counter() - start)
+            metrics.forward_batch_size.observe(x.shape[0])
+            return pred
+        model = self.serving_model
+        start = time.perf_counter()
+        with torch.no_grad():
+            pred = model(x.to(self.device))
+            # Models squeeze their output, so a batch of one comes back as [2]
+            pred = pred.reshape(-1, 2).cpu()
+        metrics.forward_seconds.labels(self.serving_backend).observe(time.perf_counter() - start)
+        metrics.forward_batch_size.observe(x.shape[0])
+        return pred
+
+    def infer(self, landmarks: torch.Tensor):
+        """
+        Predict the gaze coordinates for a single [478, 3] landmarks tensor.
+        """
+        if self.model is None:
+            return [0, 0]
+        if self.prediction_cache is not None:
+            # Read before inferring, so a publish during the forward pass can't be cached under the new version
+            weights_version = self.weights_version
+            gaze = self.prediction_cache.get(landmarks, weights_version)
+            if gaze is not None:
+                return gaze
+        if self.batcher is not None:
+            gaze = self.batcher.submit(landmarks).numpy()
+        else:
+            gaze = self._forward(torch.unsqueeze(landmarks, 0))[0].numpy()
+        if self.prediction_cache is not None:
+            self.prediction_cache.put(landmarks, weights_version, gaze)
+        return gaze
+
+    def serving_stats(self):
+        return {
+            'backend': 'workers' if self.worker_pool is not None else self.serving_backend,
+            'weights_version': self.weights_version,
+            'memory_bytes': self.serving_bytes,
+            'quantization': self.quantization_report,
+            'prediction_cache': self.prediction_cache.stats() if self.prediction_cache else {'enabled': False},
+        }
+
+    def sample_query(self, args):
+        """
+        The samples a request asks to train on, with SqliteDataset.query() arguments:
+        sample_session, since and until (time.time() seconds, or seconds before now if negative),
+        and region (x0,y0,x1,y1 target screen coordinates).
+        :param args: Request arguments
+        :return: A SampleQuery, or None if args has none of those arguments
+        :raises ValueError: If they can't be parsed, or the dataset can't be queried
+        """
+        names = ('sample_session', 'since', 'until', 'region')
+        if not any(name in args for name in names):
+            return None
+        if not isinstance(self.dataset, SqliteDataset):
+            raise ValueError("Querying samples needs dataset_storage 'sqlite'")
+        if not self.dataset_loader.loaded:
+            raise ValueError(f'{self.config.dataset_path} is still loading')
+        if self.dataset_failed:
+            raise ValueError(f'{self.config.dataset_path} failed to load')
+        now = time.time()
+        times = {}
+        for name in ('since', 'until'):
+            if name in args:
+                t = float(args[name])
+                times[name] = now + t if t < 0 else t
+        region = None
+        if 'region' in args:
+            region = [float(v) for v in args['region'].split(',')]
+            if len(region) != 4:
+                raise ValueError(f"region should be x0,y0,x1,y1, not {args['region']!r}")
+        return self.dataset.query(session=args.get('sample_session'), region=region, **times)
+
+    def dataset_load_stats(self):
+        return {
+            'ready': self.dataset_ready,
+            'pending_samples': len(self._pending_samples or ()),
+            'dropped_samples': self._dropped_samples,
+            **self.dataset_loader.stats()
+        }
+
+    def sample_log_stats(self):
+        if self.sample_log is None:
+            return {'enabled': False}
+        return self.sample_log.stats()
+
+    def batcher_stats(self):
+        if self.batcher is None:
+            return {'enabled': False}
+        return {
+            'enabled': True,
+            'max_batch_size': self.batcher.max_batch_size,
+            'max_wait_us': self.batcher.max_wait_us,
+            **self.batcher.stats.as_dict()
+        }
+
     def do_pca(self):
         """
         Do PCA on the dataset and save the model.
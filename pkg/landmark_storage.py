@@ -0,0 +1,94 @@
+"""
+Reduced-precision landmark storage for the training datasets.
+
+Landmarks are normalized image coordinates (x, y in [0, 1], z a small relative depth), so float32
+spends most of its bits on precision nobody can see.  Datasets can keep them as float16, bfloat16,
+or int16 fixed point with a scale per axis instead, and upcast them to float32 as batches are
+fetched.  Targets stay float32: they're 2 numbers a sample.
+
+    dtype      landmark bytes/sample   resolution of x, y in [0.5, 1)
+    float32    5736                    6e-8
+    float16    2868                    5e-4
+    bfloat16   2868                    4e-3
+    int16      2868                    range / 32767, 6e-5 for the default range of ±2
+"""
+from typing import Optional, Sequence
+
+import torch
+
+DTYPES = {
+    'float32': torch.float32,
+    'float16': torch.float16,
+    'bfloat16': torch.bfloat16,
+    'int16': torch.int16,
+}
+
+# Largest absolute value of x, y and z int16 storage can hold; values beyond are clamped.
+# x and y leave room for faces partly out of frame.
+DEFAULT_INT16_RANGE = (2., 2., .5)
+
+_INT16_MAX = 32767
+
+
+class LandmarkStorage:
+
+    def __init__(self, dtype='float32', int16_range: Sequence[float] = DEFAULT_INT16_RANGE):
+        """
+        :param dtype: 'float32', 'float16', 'bfloat16' or 'int16'
+        :param int16_range: For int16, the largest absolute value of each axis
+        """
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported landmark storage dtype {dtype!r}, expected one of {', '.join(DTYPES)}")
+        self.name = dtype
+        self.dtype = DTYPES[dtype]
+        # At float32 precision, as the mmap dataset header keeps them
+        self.int16_range = tuple(torch.tensor(int16_range, dtype=torch.float32).tolist()) if dtype == 'int16' else None
+        self.scale = torch.tensor(self.int16_range) / _INT16_MAX if dtype == 'int16' else None
+
+    @property
+    def itemsize(self) -> int:
+        return torch.empty((), dtype=self.dtype).element_size()
+
+    def encode(self, landmarks: torch.Tensor) -> torch.Tensor:
+        """
+        :param landmarks: [..., 3] landmarks
+        :return: The same in the storage dtype
+        """
+        if self.scale is None:
+            return landmarks.to(self.dtype)
+        return torch.round(landmarks / self.scale).clamp_(-_INT16_MAX, _INT16_MAX).to(torch.int16)
+
+    def decode(self, stored: torch.Tensor) -> torch.Tensor:
+        """
+        :return: float32 landmarks (stored itself if it's float32 already)
+        """
+        if self.scale is None:
+            return stored.to(torch.float32)
+        return stored.to(torch.float32) * self.scale
+
+    def state(self) -> dict:
+        """
+        :return: What from_state() needs to read landmarks stored this way, to save alongside them
+        """
+        return {'dtype': self.name, 'int16_range': self.int16_range}
+
+    @classmethod
+    def from_state(cls, state: Optional[dict]) -> 'LandmarkStorage':
+        """
+        :param state: From state(), or None for files saved before there was a choice (float32)
+        """
+        if state is None:
+            return cls()
+        return cls(state['dtype'], state['int16_range'] or DEFAULT_INT16_RANGE)
+
+    def __eq__(self, other):
+        return isinstance(other, LandmarkStorage) and self.state() == other.state()
+
+    def __repr__(self):
+        return f'LandmarkStorage({self.name!r})' if self.scale is None else \
+            f'LandmarkStorage({self.name!r}, int16_range={self.int16_range})'
+
+
+def landmark_storage(config) -> LandmarkStorage:
+    return LandmarkStorage(getattr(config, 'dataset_landmark_dtype', 'float32'),
+                           getattr(config, 'dataset_int16_range', DEFAULT_INT16_RANGE))
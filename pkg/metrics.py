@@ -0,0 +1,264 @@
+"""
+Counters, gauges and histograms, rendered in the Prometheus text format by /api/gaze/metrics.
+
+Updating a metric costs a dict lookup, a bisect and an add under a lock, so they're cheap enough
+to leave on.  Values that are only interesting when scraped (dataset sizes) are filled in by
+collectors, which the registry calls just before rendering.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds, from a fast forward pass up to a slow checkpoint
+DEFAULT_BUCKETS = (.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10.)
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *labelvalues):
+        """
+        The child metric for these label values, in labelnames order.
+        """
+        key = tuple(str(v) for v in labelvalues)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f'{self.name} has labels {self.labelnames}, got {key}')
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def clear(self):
+        with self._lock:
+            self._children = {}
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for labelvalues, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, labelvalues))
+        return lines
+
+
+class _Value:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.
+
+    def inc(self, amount=1.):
+        with self._lock:
+            self.value += amount
+
+    def set(self, value):
+        self.value = float(value)
+
+    def render(self, name, labelnames, labelvalues):
+        return [f'{name}{_format_labels(labelnames, labelvalues)} {_format_value(self.value)}']
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1.):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+class _HistogramValue:
+
+    def __init__(self, buckets: Sequence[float]):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def render(self, name, labelnames, labelvalues):
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(list(self.buckets) + [float('inf')], counts):
+            cumulative += count
+            le = _format_labels(labelnames, labelvalues, f'le="{_format_value(bound)}"')
+            lines.append(f'{name}_bucket{le} {cumulative}')
+        labels = _format_labels(labelnames, labelvalues)
+        lines.append(f'{name}_sum{labels} {_format_value(total)}')
+        lines.append(f'{name}_count{labels} {cumulative}')
+        return lines
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]):
+        """
+        :param collector: Called before each render(), to update gauges that are only needed when scraped
+        """
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    'l2s_http_requests_total', 'HTTP requests, by route and status', ('method', 'route', 'status')))
+http_request_seconds = registry.register(Histogram(
+    'l2s_http_request_seconds', 'HTTP request latency, by route', ('method', 'route')))
+
+forward_seconds = registry.register(Histogram(
+    'l2s_forward_seconds', 'Serving model forward pass time, by inference backend', ('backend',)))
+forward_batch_size = registry.register(Histogram(
+    'l2s_forward_batch_size', 'Frames per serving model forward pass', (),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)))
+
+prediction_cache = registry.register(Counter(
+    'l2s_prediction_cache_total', 'Prediction cache lookups, by result', ('result',)))
+
+dataset_size = registry.register(Gauge(
+    'l2s_dataset_size', 'Samples held, by session and dataset', ('session', 'dataset')))
+dataset_fill_ratio = registry.register(Gauge(
+    'l2s_dataset_fill_ratio', 'Samples held as a fraction of capacity, by session and dataset',
+    ('session', 'dataset')))
+dataset_bytes = registry.register(Gauge(
+    'l2s_dataset_bytes', 'Memory held by the samples, by session and dataset', ('session', 'dataset')))
+
+dataset_save_seconds = registry.register(Histogram(
+    'l2s_dataset_save_seconds', 'Time to save a dataset'))
+dataset_load_seconds = registry.register(Histogram(
+    'l2s_dataset_load_seconds', 'Time to load a dataset at startup',
+    buckets=(.01, .05, .1, .25, .5, 1., 2.5, 5., 10., 30., 60., 120.)))
+model_save_seconds = registry.register(Histogram(
+    'l2s_model_save_seconds', 'Time to save a model checkpoint'))
+dataset_checkpoint_seconds = registry.register(Histogram(
+    'l2s_dataset_checkpoint_seconds', 'Time to snapshot and save a dataset in the background'))
+dataset_checkpoint_backlog = registry.register(Gauge(
+    'l2s_dataset_checkpoint_backlog', 'Dataset checkpoints waiting to be written'))
+dataset_checkpoints_coalesced = registry.register(Counter(
+    'l2s_dataset_checkpoints_coalesced_total', 'Dataset checkpoint requests merged into one already waiting'))
+sample_log_fsync_seconds = registry.register(Histogram(
+    'l2s_sample_log_fsync_seconds', 'Time to fsync the labelled sample logs'))
+sample_log_commit_records = registry.register(Histogram(
+    'l2s_sample_log_commit_records', 'Labelled samples made durable per sample log fsync', (),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)))
+
+training_epochs = registry.register(Counter(
+    'l2s_training_epochs_total', 'Training epochs completed, by mode', ('mode',)))
+training_samples = registry.register(Counter(
+    'l2s_training_samples_total', 'Samples trained on, by mode', ('mode',)))
+training_samples_per_second = registry.register(Gauge(
+    'l2s_training_samples_per_second', 'Training throughput over the last epoch, by mode', ('mode',)))
+training_epoch_seconds = registry.register(Histogram(
+    'l2s_training_epoch_seconds', 'Training epoch duration, by mode', ('mode',),
+    buckets=(.01, .05, .1, .25, .5, 1., 2.5, 5., 10., 30., 60., 120.)))
+
+
+def dataset_collector(sessions):
+    """
+    :param sessions: A SessionRegistry
+    :return: A collector that sets the dataset gauges for the sessions currently loaded
+    """
+    def collect():
+        dataset_size.clear()
+        dataset_fill_ratio.clear()
+        dataset_bytes.clear()
+        for session_id, l2s in sessions.items():
+            for name, dataset in (('main', l2s.dataset), ('fine_tuning', l2s.fine_tuning_dataset)):
+                dataset_size.labels(session_id, name).set(len(dataset))
+                dataset_fill_ratio.labels(session_id, name).set(len(dataset) / dataset.capacity)
+                dataset_bytes.labels(session_id, name).set(dataset.memory_bytes())
+    return collect
+
+
+def observe_request(method: str, route: str, status: int, seconds: float):
+    http_requests.labels(method, route, status).inc()
+    http_request_seconds.labels(method, route).observe(seconds)
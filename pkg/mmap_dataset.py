@@ -0,0 +1,252 @@
+"""
+Memory-mapped dataset file format.
+
+A fixed 64-byte header (capacity, idx, full, items ever added, sample shapes and landmark storage)
+followed by a [capacity, 478, 3] landmarks array, in the storage dtype (see pkg/landmark_storage.py),
+and a [capacity, 2] float32 targets array, as raw little-endian records.  MmapDataset maps
+the file and works on it in place: added samples are written straight into the mapping, a save
+only writes back the header and the pages that changed, and a load just maps the file.
+
+Datasets saved by SimpleDataset or TensorRingDataset (.pth) are converted the first time they're
+loaded, or with
+
+    python -m pkg.mmap_dataset cache/checkpoints/l2s_v200_db.pth [out.mmap]
+"""
+import os
+import struct
+import sys
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+import torch
+
+from pkg import metrics
+from pkg.landmark_storage import LandmarkStorage
+from pkg.tensor_dataset import TensorRingDataset
+
+MAGIC = b'L2SD'
+VERSION = 1
+HEADER_SIZE = 64
+# magic, version, landmark storage, capacity, idx, full, landmarks per sample, coords per landmark, target size,
+# added, int16 range of x, y and z
+_header = struct.Struct('<4sHHQQBxxxIIIQfff')
+
+_storage_dtypes = {0: 'float32', 1: 'float16', 2: 'bfloat16', 3: 'int16'}
+_storage_codes = {v: k for k, v in _storage_dtypes.items()}
+# numpy has no bfloat16, so those are mapped as int16 and viewed as bfloat16
+_numpy_dtypes = {torch.float32: np.float32, torch.float16: np.float16, torch.bfloat16: np.int16, torch.int16: np.int16}
+
+
+def mmap_path(filename: str) -> str:
+    """
+    :return: The mapped file used for a dataset path, e.g. l2s_v200_db.mmap for l2s_v200_db.pth
+    """
+    return os.path.splitext(filename)[0] + '.mmap'
+
+
+def _read_header(path: str):
+    with open(path, 'rb') as f:
+        magic, version, storage, capacity, idx, full, n_landmarks, n_coords, target_size, added, *int16_range = \
+            _header.unpack(f.read(_header.size))
+    if magic != MAGIC or version != VERSION:
+        raise RuntimeError(f'{path} is not a version {VERSION} dataset file')
+    return LandmarkStorage(_storage_dtypes[storage], int16_range), capacity, idx, bool(full), (n_landmarks, n_coords), (target_size,), added
+
+
+def _view(mm: np.memmap, dtype: torch.dtype, shape) -> torch.Tensor:
+    t = torch.from_numpy(mm.view(_numpy_dtypes[dtype]).reshape(shape))
+    return t if t.dtype == dtype else t.view(dtype)
+
+
+class MmapDataset(TensorRingDataset):
+    """
+    A TensorRingDataset whose storage is a memory-mapped file (see module docstring), bound by load().
+    Until then it lives in memory like a TensorRingDataset.
+    """
+
+    def __init__(self, *, capacity=2048, logger=None, storage: Optional[LandmarkStorage] = None,
+                 item_shape: Tuple[int, ...] = (478, 3), target_shape: Tuple[int, ...] = (2,)):
+        super().__init__(capacity=capacity, logger=logger, storage=storage)
+        self.item_shape = tuple(item_shape)
+        self.target_shape = tuple(target_shape)
+        self.path = None
+        self._mmap = None
+
+    def _map(self, path: str, create: bool):
+        """
+        Map path (creating it with the current capacity, empty, if create), and use it as storage.
+        """
+        if create:
+            storage, capacity = self.storage, self.capacity
+            item_shape, target_shape = self.item_shape, self.target_shape
+        else:
+            storage, capacity, idx, full, item_shape, target_shape, added = _read_header(path)
+        landmarks_size = capacity * int(np.prod(item_shape)) * storage.itemsize
+        targets_size = capacity * int(np.prod(target_shape)) * 4
+        size = HEADER_SIZE + landmarks_size + targets_size
+        if not create and os.path.getsize(path) < size:
+            # np.memmap would extend it
+            raise RuntimeError(f'{path} is truncated: {os.path.getsize(path)} bytes of {size}')
+        mm = np.memmap(path, dtype=np.uint8, mode='w+' if create else 'r+', shape=(size,))
+        if not create:
+            self.capacity, self.idx, self.full, self.added = capacity, idx, full, added
+        self._mmap = mm
+        self.path = path
+        self.storage = storage
+        self.item_shape, self.target_shape = item_shape, target_shape
+        self._landmarks = _view(mm[HEADER_SIZE:HEADER_SIZE + landmarks_size], storage.dtype,
+                                (self.capacity, *item_shape))
+        self._targets = _view(mm[HEADER_SIZE + landmarks_size:], torch.float32, (self.capacity, *target_shape))
+        if create:
+            self._write_header()
+
+    def _write_header(self, idx=None, full=None, added=None):
+        """
+        :param idx, full, added: Defaults to the current ones
+        """
+        idx = self.idx if idx is None else idx
+        full = self.full if full is None else full
+        added = self.added if added is None else added
+        self._mmap[:_header.size] = np.frombuffer(_header.pack(
+            MAGIC, VERSION, _storage_codes[self.storage.name], self.capacity, idx, int(full),
+            *self.item_shape, *self.target_shape, added, *(self.storage.int16_range or (0., 0., 0.))), dtype=np.uint8)
+
+    def _allocate(self, item: torch.Tensor, target: torch.Tensor):
+        self.item_shape, self.target_shape = tuple(item.shape), tuple(target.shape)
+        super()._allocate(item, target)
+
+    def snapshot(self):
+        """
+        Once mapped, a save only writes back the header and flushes, which is safe while items are being
+        added, so the snapshot is just the header (see MappedSnapshot).
+        """
+        if self._mmap is not None:
+            return MappedSnapshot(self)
+        # Not loaded yet, so whatever it holds is a plain copy away
+        copy = MmapDataset(capacity=self.capacity, logger=self.logger, storage=self.storage,
+                           item_shape=self.item_shape, target_shape=self.target_shape)
+        with self._lock:
+            if self._landmarks is not None:
+                copy._landmarks, copy._targets = self._landmarks.clone(), self._targets.clone()
+            copy.idx, copy.full, copy.added = self.idx, self.full, self.added
+        return copy
+
+    def save(self, filename):
+        """
+        If filename is the file this dataset is mapped from (or the .pth path it was loaded with),
+        just write back the header and the samples changed since the last save.
+        Otherwise write a whole new mapped file there.
+        """
+        path = filename if filename.endswith('.mmap') else mmap_path(filename)
+        with metrics.dataset_save_seconds.time():
+            if self._mmap is not None and os.path.abspath(path) == os.path.abspath(self.path):
+                MappedSnapshot(self).save(filename)
+                return
+            write_mmap(path, self.landmarks(), self.targets(), capacity=self.capacity, idx=self.idx, full=self.full,
+                       added=self.added, storage=self.storage)
+
+    def load(self, filename, expand_to_fit=True, progress: Optional[Callable[[int], None]] = None):
+        """
+        Map the dataset file for filename (see mmap_path()), converting filename to it first if it's a
+        .pth file that hasn't been converted yet.  If the file's capacity or landmark storage doesn't suit
+        this dataset, a copy with the right ones replaces it, filled as TensorRingDataset.load() would.
+        :param filename: The file to load the dataset from.
+        :param expand_to_fit: If True, expand the dataset to fit the loaded data, otherwise fill up to the current capacity.
+        :param progress: Called with the bytes of filename read so far, if it's converted
+        :raises: If either file can't be read (then neither is written to, nor is this dataset bound to them)
+        """
+        path = filename if filename.endswith('.mmap') else mmap_path(filename)
+        if not os.path.exists(path) and os.path.exists(filename) and filename != path:
+            convert(filename, path, logger=self.logger, storage=self.storage, progress=progress)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self._map(path, create=True)
+            if self.logger:
+                self.logger.info(f'Created dataset file {path} with capacity {self.capacity}')
+            return
+
+        storage, capacity = _read_header(path)[:2]
+        if storage == self.storage and (capacity == self.capacity or (expand_to_fit and capacity > self.capacity)):
+            self._map(path, create=False)
+        else:
+            # Load what fits into memory, then write it back with this dataset's capacity and storage
+            in_memory = TensorRingDataset(capacity=self.capacity, logger=self.logger)
+            in_memory.load_tensors(*_read_tensors(path), expand_to_fit=expand_to_fit)
+            write_mmap(path, in_memory.landmarks(), in_memory.targets(), capacity=in_memory.capacity,
+                       idx=in_memory.idx, full=in_memory.full, added=_read_header(path)[6], storage=self.storage)
+            self._map(path, create=False)
+        print(f'Loaded database: Capacity {self.capacity}, full: {self.full}, idx : {self.idx}, len() = {len(self)}')
+
+
+class MappedSnapshot:
+    """
+    idx, full and added of a mapped MmapDataset at one point, taken under its lock so they match the
+    slots written.  Saving it to the dataset's own file writes them to the header and flushes the
+    mapping: slots written since may be flushed too, but the header doesn't count them.
+    """
+
+    def __init__(self, dataset: MmapDataset):
+        self.dataset = dataset
+        with dataset._lock:
+            self.idx, self.full, self.added = dataset.idx, dataset.full, dataset.added
+
+    def save(self, filename):
+        path = filename if filename.endswith('.mmap') else mmap_path(filename)
+        if os.path.abspath(path) != os.path.abspath(self.dataset.path):
+            self.dataset.save(filename)
+            return
+        self.dataset._write_header(self.idx, self.full, self.added)
+        self.dataset._mmap.flush()
+
+
+def _read_tensors(path: str):
+    """
+    :return: landmarks and targets of the samples held, and the capacity, idx and full of a mapped file
+    """
+    dataset = MmapDataset()
+    dataset._map(path, create=False)
+    return dataset.landmarks().clone(), dataset.targets().clone(), dataset.capacity, dataset.idx, dataset.full
+
+
+def write_mmap(path: str, landmarks: torch.Tensor, targets: torch.Tensor, *, capacity: int, idx: int, full: bool,
+               added=0, storage: Optional[LandmarkStorage] = None):
+    """
+    Write a whole dataset file, via a temporary file so a crash can't leave a partial one.
+    :param landmarks: float landmarks, stored as storage says (float32 if None)
+    """
+    dataset = MmapDataset(capacity=capacity, storage=storage, item_shape=landmarks.shape[1:] or (478, 3),
+                          target_shape=targets.shape[1:] or (2,))
+    tmp = path + '.tmp'
+    dataset._map(tmp, create=True)
+    dataset._landmarks[:len(landmarks)] = dataset.storage.encode(landmarks)
+    dataset._targets[:len(targets)] = targets
+    dataset.idx, dataset.full, dataset.added = idx, full, added
+    dataset._write_header()
+    dataset._mmap.flush()
+    del dataset
+    os.replace(tmp, path)
+
+
+def convert(filename: str, path: str = None, logger=None, storage: Optional[LandmarkStorage] = None,
+            progress: Optional[Callable[[int], None]] = None):
+    """
+    Convert a dataset saved by SimpleDataset or TensorRingDataset to a mapped file.
+    :param path: Defaults to mmap_path(filename)
+    :param storage: Of the mapped file, float32 if None
+    :param progress: See TensorRingDataset.load()
+    """
+    path = path or mmap_path(filename)
+    # Grows to the capacity of the file
+    dataset = TensorRingDataset(capacity=1, logger=logger)
+    dataset.load(filename, expand_to_fit=True, progress=progress)
+    write_mmap(path, dataset.landmarks(), dataset.targets(), capacity=dataset.capacity, idx=dataset.idx,
+               full=dataset.full, added=dataset.added, storage=storage)
+    if logger:
+        logger.info(f'Converted {filename} ({len(dataset)} samples) to {path}')
+    return path
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (2, 3):
+        raise SystemExit(__doc__)
+    print(f'Wrote {convert(*sys.argv[1:])}')
@@ -19,6 +19,14 @@ class GazePCA(GazeModel):
         except Exception as e:
             raise RuntimeError(f"Error loading PCA model from {config.pca_path}: {e}")
 
+        # The PCA projection as tensors, so it runs in torch (and can be traced or exported) rather than sklearn.
+        # Not persistent: they're always rebuilt from the PCA model, so checkpoints are unchanged.
+        projection = torch.tensor(self.pca.components_, dtype=torch.float32).t()  # [478*3, n_components]
+        if self.pca.whiten:
+            projection = projection / torch.tensor(self.pca.explained_variance_, dtype=torch.float32).sqrt()
+        self.register_buffer('pca_mean', torch.tensor(self.pca.mean_, dtype=torch.float32), persistent=False)
+        self.register_buffer('pca_projection', projection.contiguous(), persistent=False)
+
         # Main MLP
         mlp_layers = [nn.Linear(self.pca.n_components_, config.hidden_channels), nn.ReLU()]
         for _ in range(config.num_mlp_layers):
@@ -60,8 +68,7 @@ class GazePCA(GazeModel):
         assert num_nodes == 478, f"Expected 478 nodes, got {num_nodes}"
         assert in_channels == 3, f"Expected 3 channels, got {in_channels}"
         x = x.view(batch_size, -1)  # [B, 478*3]
-        x_pca = self.pca.transform(x.cpu().numpy())  # [B, n_components]
-        x_pca = torch.tensor(x_pca, dtype=torch.float32, device=x.device)
+        x_pca = (x - self.pca_mean) @ self.pca_projection  # [B, n_components], same as self.pca.transform()
 
         # Main MLP feature extraction
         h = self.mlp(x_pca)  # [B, hidden_channels]
@@ -0,0 +1,124 @@
+"""
+ONNX Runtime inference backend.
+
+export_onnx() writes any GazeModel to ONNX, with a dynamic batch dimension.  OnnxGazeModel runs the
+exported file with onnxruntime on the cpu, and needs only numpy and onnxruntime, so a serving-only
+deployment can use it without torch or torch_geometric: load_onnx() finds the export onnx_model() keeps
+next to the checkpoint, and onnx_app.py serves it.  To export the configured checkpoint, run
+
+    python -m pkg.onnx_backend
+"""
+import glob
+import os
+import sys
+
+import numpy as np
+
+
+def export_onnx(model, path: str, opset_version=None):
+    """
+    :param model: An eval-mode GazeModel
+    :param path: The .onnx file to write
+    :param opset_version: None for the exporter's default
+    """
+    import torch
+
+    example = torch.rand(2, 478, 3, device=next(model.parameters()).device)
+    with torch.no_grad():
+        torch.onnx.export(model, (example,), path,
+                          input_names=['landmarks'], output_names=['gaze'],
+                          dynamic_axes={'landmarks': {0: 'batch'}, 'gaze': {0: 'batch'}},
+                          opset_version=opset_version)
+
+
+class OnnxGazeModel:
+    """
+    An exported model, run by onnxruntime.  Called like the torch model it was exported from:
+    [B, 478, 3] landmarks in (a tensor or a numpy array), [B, 2] gaze coordinates out (of the same type).
+    """
+
+    def __init__(self, path: str, num_threads=0):
+        """
+        :param num_threads: Intra-op threads, 0 for onnxruntime's default
+        """
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        self.path = path
+        self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+    def run(self, landmarks: np.ndarray) -> np.ndarray:
+        gaze, = self.session.run(None, {'landmarks': np.ascontiguousarray(landmarks, dtype=np.float32)})
+        return gaze.reshape(-1, 2)
+
+    def __call__(self, landmarks):
+        if isinstance(landmarks, np.ndarray):
+            return self.run(landmarks)
+        import torch
+        return torch.from_numpy(self.run(landmarks.detach().cpu().numpy()))
+
+
+def onnx_model(model, config, *, cache_dir: str, logger=None):
+    """
+    Export model to ONNX (unless it was exported before with the same weights and config) and load it.
+    :return: The OnnxGazeModel, or None if the model can't be exported or doesn't match eager mode,
+    in which case the caller should carry on with the eager model.
+    """
+    import torch
+    from pkg.compiled import weights_hash
+
+    # The hash covers the PCA projection too, which isn't in checkpoints but is in the export
+    path = os.path.join(cache_dir, f'l2s_v{config.version}_{weights_hash(model, config)}.onnx')
+    num_threads = getattr(config, 'onnx_num_threads', 0)
+    try:
+        if os.path.exists(path):
+            if logger:
+                logger.info(f'Loading ONNX model {path}')
+        else:
+            # Only the export for the current weights is worth keeping
+            for stale in glob.glob(os.path.join(cache_dir, f'l2s_v{config.version}_*.onnx*')):
+                os.remove(stale)
+            export_onnx(model, path)
+            if logger:
+                logger.info(f'Exported model version {config.version} to {path}')
+        onnx = OnnxGazeModel(path, num_threads=num_threads)
+
+        with torch.no_grad():
+            for batch_size in (1, 7):
+                x = torch.rand(batch_size, 478, 3)
+                if not torch.allclose(onnx(x), model(x.to(config.device)).reshape(-1, 2).cpu(), atol=1e-4):
+                    raise RuntimeError(f'ONNX model differs from eager mode at batch size {batch_size}')
+    except Exception as err:
+        if logger:
+            logger.warning(f'Could not use ONNX for model version {config.version}, using eager mode: {err}')
+        return None
+    return onnx
+
+
+def load_onnx(cache_dir: str, version: int, num_threads=0) -> OnnxGazeModel:
+    """
+    Load the export of model version that onnx_model() keeps in cache_dir, without torch or the model.
+    :raises FileNotFoundError: If there isn't one
+    """
+    # onnx_model() removes those for other weights, but keep to the newest should a removal have failed
+    paths = sorted(glob.glob(os.path.join(cache_dir, f'l2s_v{version}_*.onnx')), key=os.path.getmtime)
+    if not paths:
+        raise FileNotFoundError(f'No ONNX export of model version {version} in {cache_dir}, '
+                                f'see python -m pkg.onnx_backend')
+    return OnnxGazeModel(paths[-1], num_threads=num_threads)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 1:
+        raise SystemExit(__doc__)
+    import logging
+    from pkg.config import Config
+    from pkg.l2s import model_class
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger('app')
+    config = Config()
+    model = model_class(config.version)(config, logger=logger, filename=config.checkpoint).to(config.device).eval()
+    if onnx_model(model, config, cache_dir=os.path.dirname(config.checkpoint), logger=logger) is None:
+        raise SystemExit(1)
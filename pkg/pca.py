@@ -4,25 +4,13 @@ import torch
 
 from pkg.config import Config
 from pkg.simple_dataset import SimpleDataset
+from pkg.tensor_dataset import new_dataset
 from sklearn.decomposition import PCA
 
 
 def get_landmarks_matrix(dataset: SimpleDataset):
-    # Grab only the valid items (depending on self.full/self.idx)
-    num_samples = len(dataset)
-    # Assume each landmark entry is [468, 3] (or whatever your landmark shape is)
-    example_landmark = dataset._db[0][0]
-    num_landmarks, num_coords = example_landmark.shape
-
-    landmarks_array = np.zeros((num_samples, num_landmarks, num_coords), dtype=np.float32)
-
-    for i in range(num_samples):
-        landmarks, _ = dataset._db[i]
-        if isinstance(landmarks, torch.Tensor):
-            landmarks = landmarks.cpu().numpy()
-        landmarks_array[i] = landmarks  # shape: [468, 3]
-
-    return landmarks_array  # shape: [num_samples, 468, 3]
+    # Only the valid items (depending on full/idx), as [num_samples, 478, 3]
+    return dataset.landmarks().cpu().numpy().astype(np.float32)
 
 
 import matplotlib.pyplot as plt
@@ -62,7 +50,7 @@ def do_pca():
         raise ValueError("PCA path is not set in the configuration.")
 
     # Load dataset
-    dataset = SimpleDataset(capacity=config.dataset_capacity)
+    dataset = new_dataset(config, config.dataset_capacity)
     dataset.load(config.dataset_path)
     print(f"Loaded dataset with {len(dataset)} samples from {config.dataset_path}")
 
@@ -95,7 +83,7 @@ if __name__ == "__main__":
     except FileNotFoundError:
         print(f"No PCA model found at {config.pca_path}, creating a new one.")
 
-    dataset = SimpleDataset(capacity=config.dataset_capacity)
+    dataset = new_dataset(config, config.dataset_capacity)
     dataset.load(config.dataset_path)
     landmarks_matrix = get_landmarks_matrix(dataset)  # [num_samples, 478, 3]
     landmarks_flat = landmarks_matrix.reshape(landmarks_matrix.shape[0], -1)  # [num_samples, 1404]
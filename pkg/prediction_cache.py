@@ -0,0 +1,70 @@
+import threading
+from typing import Optional
+
+import numpy as np
+import torch
+
+from pkg import metrics
+
+
+class PredictionCache:
+    """
+    The last inferred frame of a session and its prediction.  A new frame within tolerance of it
+    (L-infinity or L2 distance over all landmark coordinates), under the same weights, gets the
+    same prediction without running the model.
+
+    Frames are always compared with the last frame that was actually inferred, not the last hit,
+    so a slow drift of the face still misses once it adds up to more than the tolerance.
+    """
+
+    def __init__(self, tolerance: float, norm='linf'):
+        """
+        :param tolerance: Largest distance for a hit, in normalized landmark units
+        :param norm: 'linf' or 'l2'
+        """
+        if norm not in ('linf', 'l2'):
+            raise ValueError(f"Unsupported prediction cache norm {norm!r}, expected 'linf' or 'l2'")
+        self.tolerance = tolerance
+        self.norm = norm
+        # (landmarks, weights version, gaze), replaced as a whole
+        self._last = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _distance(self, a: torch.Tensor, b: torch.Tensor) -> float:
+        diff = a - b
+        if self.norm == 'linf':
+            return diff.abs().max().item()
+        return torch.linalg.vector_norm(diff).item()
+
+    def get(self, landmarks: torch.Tensor, weights_version: int) -> Optional[np.ndarray]:
+        """
+        :return: The cached gaze for landmarks, or None on a miss
+        """
+        last = self._last
+        hit = (last is not None and last[1] == weights_version and last[0].shape == landmarks.shape
+               and self._distance(landmarks, last[0]) <= self.tolerance)
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        metrics.prediction_cache.labels('hit' if hit else 'miss').inc()
+        return last[2] if hit else None
+
+    def put(self, landmarks: torch.Tensor, weights_version: int, gaze: np.ndarray):
+        # A copy, as binary frames' landmarks share the request buffer
+        self._last = (landmarks.clone(), weights_version, gaze)
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        return {
+            'enabled': True,
+            'tolerance': self.tolerance,
+            'norm': self.norm,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.,
+        }
@@ -0,0 +1,74 @@
+"""
+Dynamic int8 quantization of the serving model.
+
+The Linear layers' weights are stored as int8 and their activations quantized on the fly, which
+makes the MLP-heavy models faster on the cpu and their serving copy about 4x smaller.  Only the
+serving copy is quantized; training carries on in float32.
+"""
+import io
+
+import torch
+import torch.nn as nn
+
+# Enough of the dataset for a stable accuracy comparison without slowing down publishing much
+REPORT_MAX_SAMPLES = 2048
+
+
+def quantize_model(model: nn.Module, config, logger=None):
+    """
+    :param model: An eval-mode model, which is left as it is
+    :return: A copy of the model with int8 Linear layers, or None if it can't be quantized,
+    in which case the caller should carry on with the float model.
+    """
+    if str(config.device) != 'cpu':
+        if logger:
+            logger.warning(f'int8 inference is only supported on the cpu, not {config.device}, using eager mode')
+        return None
+    try:
+        return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8, inplace=False)
+    except Exception as err:
+        if logger:
+            logger.warning(f'Could not quantize model version {config.version}, using eager mode: {err}')
+        return None
+
+
+def model_bytes(model: nn.Module) -> int:
+    """
+    Size of the model's weights.  Quantized layers keep theirs packed, out of parameters(),
+    so this measures the serialized state dict.
+    """
+    buf = io.BytesIO()
+    torch.save(model.state_dict(), buf)
+    return buf.tell()
+
+
+def accuracy_delta(float_model: nn.Module, quantized_model: nn.Module, dataset, batch_size=256):
+    """
+    Compare the quantized model with the float model on (the first REPORT_MAX_SAMPLES of) a dataset.
+    :return: Mean distance to the targets for each model, and how far apart their predictions are
+    """
+    n = min(len(dataset), REPORT_MAX_SAMPLES)
+    if n == 0:
+        return {'samples': 0}
+    float_dist = quantized_dist = diff_sum = 0.
+    diff_max = 0.
+    with torch.no_grad():
+        for start in range(0, n, batch_size):
+            items = [dataset[i] for i in range(start, min(start + batch_size, n))]
+            x = torch.stack([item[1] for item in items])
+            y = torch.stack([item[2] for item in items])
+            float_pred = float_model(x).reshape(-1, 2)
+            quantized_pred = quantized_model(x).reshape(-1, 2)
+            float_dist += torch.norm(float_pred - y, dim=1).sum().item()
+            quantized_dist += torch.norm(quantized_pred - y, dim=1).sum().item()
+            diff = torch.norm(quantized_pred - float_pred, dim=1)
+            diff_sum += diff.sum().item()
+            diff_max = max(diff_max, diff.max().item())
+    return {
+        'samples': n,
+        'float_loss': float_dist / n,
+        'int8_loss': quantized_dist / n,
+        'loss_delta': (quantized_dist - float_dist) / n,
+        'mean_prediction_diff': diff_sum / n,
+        'max_prediction_diff': diff_max,
+    }
@@ -0,0 +1,188 @@
+import collections
+import contextlib
+import os
+import re
+import threading
+from typing import Callable, Dict, Optional
+
+DEFAULT_SESSION = 'default'
+
+_session_id_pattern = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class InvalidSessionId(ValueError):
+    pass
+
+
+def session_id_from(headers, args, cookies) -> str:
+    """
+    Find the session id of a request: the X-Session-Id header, the 'session' query parameter
+    (browsers can't set headers on websockets) or the l2s_session cookie, in that order.
+    Requests without one belong to the default session.
+    :raises InvalidSessionId: if the session id isn't a short string of letters, digits, '_' and '-'
+    """
+    session_id = headers.get('X-Session-Id') or args.get('session') or cookies.get('l2s_session')
+    if not session_id:
+        return DEFAULT_SESSION
+    if not _session_id_pattern.match(session_id):
+        raise InvalidSessionId(f'Invalid session id {session_id!r}')
+    return session_id
+
+
+class SessionRegistry:
+    """
+    Per-user Landmarks2ScreenCoords instances (model, optimizer and datasets), created on demand.
+
+    When the estimated memory of the sessions held exceeds memory_budget bytes, the least recently
+    used idle sessions are suspended to their session directories and dropped.  The next request
+    for an evicted session reloads it from there.
+    The default session uses the global checkpoint and dataset, as a single-user server does, and is never evicted.
+
+    Requests hold a lease on the session they use (lease(), or acquire() and release()), and leased
+    sessions aren't evicted.  Sessions are created and suspended outside the registry's lock, so only
+    requests for that session wait meanwhile.
+    """
+
+    def __init__(self, factory: Callable[[Optional[str]], object], *, root='cache/sessions', memory_budget=1 << 30,
+                 is_busy: Callable[[object], bool] = lambda l2s: False, logger=None):
+        """
+        :param factory: Creates a Landmarks2ScreenCoords, given its session directory (None for the default session)
+        :param root: Directory holding one sub-directory per session
+        :param memory_budget: Bytes
+        :param is_busy: Sessions for which this returns True (e.g. because they have training jobs) aren't evicted
+        """
+        self.factory = factory
+        self.root = root
+        self.memory_budget = memory_budget
+        self.is_busy = is_busy
+        self.logger = logger
+
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, object] = collections.OrderedDict()
+        self._memory: Dict[str, int] = {}
+        # Requests using each session
+        self._leases: Dict[str, int] = collections.Counter()
+        # Sessions being created or suspended, and the event set once that's done
+        self._pending: Dict[str, threading.Event] = {}
+        self.loads = 0
+        self.evictions = 0
+
+    def session_dir(self, session_id: str) -> Optional[str]:
+        return None if session_id == DEFAULT_SESSION else os.path.join(self.root, session_id)
+
+    def acquire(self, session_id: str = DEFAULT_SESSION):
+        """
+        :return: The session's Landmarks2ScreenCoords, created or reloaded if need be, which isn't evicted
+        until it's released with release(session_id)
+        """
+        while True:
+            with self._lock:
+                l2s = self._sessions.get(session_id)
+                if l2s is not None:
+                    self._leases[session_id] += 1
+                    self._sessions.move_to_end(session_id)
+                    break
+                pending = self._pending.get(session_id)
+                creating = pending is None
+                if creating:
+                    pending = self._pending[session_id] = threading.Event()
+            if not creating:
+                # Being created by another request, or suspended before it's reloaded
+                pending.wait()
+                continue
+            try:
+                l2s = self.factory(self.session_dir(session_id))
+            finally:
+                with self._lock:
+                    del self._pending[session_id]
+                    if l2s is not None:
+                        self._sessions[session_id] = l2s
+                        self._leases[session_id] += 1
+                        self.loads += 1
+                pending.set()
+            break
+
+        memory = l2s.memory_bytes()
+        with self._lock:
+            if session_id in self._sessions:
+                self._memory[session_id] = memory
+        self._evict(keep=session_id)
+        return l2s
+
+    def release(self, session_id: str = DEFAULT_SESSION):
+        with self._lock:
+            self._leases[session_id] -= 1
+            if self._leases[session_id] <= 0:
+                del self._leases[session_id]
+
+    @contextlib.contextmanager
+    def lease(self, session_id: str = DEFAULT_SESSION):
+        """
+        acquire() the session for the with block
+        """
+        l2s = self.acquire(session_id)
+        try:
+            yield l2s
+        finally:
+            self.release(session_id)
+
+    def get(self, session_id: str = DEFAULT_SESSION):
+        """
+        :return: The session's Landmarks2ScreenCoords, without a lease: only for the default session, which
+        is never evicted
+        """
+        l2s = self.acquire(session_id)
+        self.release(session_id)
+        return l2s
+
+    def items(self):
+        """
+        :return: (session id, Landmarks2ScreenCoords) pairs for the sessions currently loaded
+        """
+        with self._lock:
+            return list(self._sessions.items())
+
+    def memory_bytes(self):
+        return sum(self._memory.values())
+
+    def _evict(self, keep: str):
+        with self._lock:
+            memory_bytes = self.memory_bytes()
+            evicted = []
+            for session_id, l2s in self._sessions.items():
+                if memory_bytes <= self.memory_budget:
+                    break
+                if session_id in (keep, DEFAULT_SESSION) or self._leases.get(session_id) or self.is_busy(l2s):
+                    continue
+                evicted.append((session_id, l2s))
+                memory_bytes -= self._memory.get(session_id, 0)
+            for session_id, _ in evicted:
+                # Requests for it wait for the suspend() below before reloading it
+                del self._sessions[session_id]
+                self._memory.pop(session_id, None)
+                self._pending[session_id] = threading.Event()
+
+        for session_id, l2s in evicted:
+            try:
+                l2s.suspend()
+            except Exception as e:
+                if self.logger:
+                    self.logger.exception(f'Suspending session {session_id} failed: {e}')
+            finally:
+                with self._lock:
+                    self.evictions += 1
+                    self._pending.pop(session_id).set()
+            if self.logger:
+                self.logger.info(f'Evicted session {session_id}, {self.memory_bytes()} bytes in use')
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sessions': {session_id: {'memory_bytes': self._memory.get(session_id, 0),
+                                          'leases': self._leases.get(session_id, 0)}
+                             for session_id in self._sessions},
+                'memory_bytes': self.memory_bytes(),
+                'memory_budget': self.memory_budget,
+                'loads': self.loads,
+                'evictions': self.evictions,
+            }
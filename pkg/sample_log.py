@@ -0,0 +1,238 @@
+"""
+Write-ahead log of labelled samples.
+
+Samples added to a dataset only reach its file at the next checkpoint, so a crash would lose
+everything since.  A SampleLog appends each one to a log file once the dataset has taken it, and
+the request that labelled it waits for the record to be durable.  Each is a record of
+
+    length u32, crc32 u32 | seq u64, timestamp f64, session length u16, landmarks u16, coords u16,
+    target size u16 | session utf-8 | landmarks float32 | target float32
+
+all little-endian, where seq is the dataset's added count with the sample in it.  Records are made
+durable by group commit: one thread fsyncs whatever has been written since its last fsync, and
+append() returns once a fsync has covered its record, so concurrent appends share one fsync.
+
+On startup, records with a seq past the checkpoint's added count are added again (replay()), and
+once a checkpoint is saved, the records it covers are dropped (truncate()).  A torn or corrupt
+record ends the log: it and anything after it are cut off when the log is opened.
+"""
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Iterator, NamedTuple, Optional
+
+import numpy as np
+import torch
+
+from pkg import metrics
+
+_frame = struct.Struct('<II')
+_record = struct.Struct('<QdHHHH')
+
+
+class LoggedSample(NamedTuple):
+    seq: int
+    timestamp: float
+    session: str
+    landmarks: torch.Tensor
+    target: torch.Tensor
+
+
+def encode(seq: int, landmarks: torch.Tensor, target: torch.Tensor, session='', timestamp=None) -> bytes:
+    session_bytes = session.encode()
+    landmarks = landmarks.detach().to(torch.float32).cpu()
+    target = target.detach().to(torch.float32).cpu()
+    body = b''.join((
+        _record.pack(seq, time.time() if timestamp is None else timestamp, len(session_bytes),
+                     landmarks.shape[0], landmarks.shape[1], target.shape[0]),
+        session_bytes,
+        landmarks.numpy().tobytes(),
+        target.numpy().tobytes(),
+    ))
+    return _frame.pack(len(body), zlib.crc32(body)) + body
+
+
+def decode(body: bytes) -> LoggedSample:
+    seq, timestamp, session_length, n_landmarks, n_coords, target_size = _record.unpack_from(body)
+    offset = _record.size
+    session = body[offset:offset + session_length].decode()
+    offset += session_length
+    landmarks = np.frombuffer(body, dtype=np.float32, count=n_landmarks * n_coords, offset=offset)
+    offset += landmarks.nbytes
+    target = np.frombuffer(body, dtype=np.float32, count=target_size, offset=offset)
+    return LoggedSample(seq, timestamp, session, torch.from_numpy(landmarks.reshape(n_landmarks, n_coords).copy()),
+                        torch.from_numpy(target.copy()))
+
+
+def read_records(path: str) -> Iterator[tuple]:
+    """
+    :return: (end offset, body) of each intact record, up to the first torn or corrupt one
+    """
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return
+    with f:
+        offset = 0
+        while True:
+            frame = f.read(_frame.size)
+            if len(frame) < _frame.size:
+                return
+            length, crc = _frame.unpack(frame)
+            body = f.read(length)
+            if len(body) < length or zlib.crc32(body) != crc:
+                return
+            offset += _frame.size + length
+            yield offset, body
+
+
+class SampleLog:
+
+    def __init__(self, path: str, *, session='', commit_delay_ms=0., logger=None):
+        """
+        :param session: Recorded with every sample
+        :param commit_delay_ms: How long the fsync thread waits for more records before each fsync
+        """
+        self.path = path
+        self.session = session
+        self.commit_delay = commit_delay_ms / 1000.
+        self.logger = logger
+
+        # Cut off a torn tail, so new records follow the last intact one
+        end, self.last_seq = 0, 0
+        for end, body in read_records(path):
+            self.last_seq = _record.unpack_from(body)[0]
+        if os.path.exists(path) and os.path.getsize(path) > end:
+            if logger:
+                logger.warning(f'Dropping {os.path.getsize(path) - end} bytes of torn records from {path}')
+            os.truncate(path, end)
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'ab')
+        self._cond = threading.Condition()
+        # Held while using the file descriptor outside _cond, as truncate() replaces the file
+        self._io_lock = threading.Lock()
+        self._written = 0
+        self._synced = 0
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+        self.fsyncs = 0
+        self.records = 0
+
+    def append(self, seq: int, landmarks: torch.Tensor, target: torch.Tensor, wait=True) -> int:
+        """
+        Log a sample.
+        :param seq: The dataset's added count once the sample is in it
+        :param wait: Return only once the record is on disk, otherwise see wait()
+        :return: A ticket for wait()
+        """
+        record = encode(seq, landmarks, target, self.session)
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sample-log', daemon=True)
+                self._thread.start()
+            self._file.write(record)
+            self._written += 1
+            ticket = self._written
+            self.last_seq = seq
+            self._cond.notify_all()
+        if wait:
+            self.wait(ticket)
+        return ticket
+
+    def wait(self, ticket: int):
+        """
+        Wait until the record append() returned ticket for is on disk.
+        """
+        with self._cond:
+            while self._synced < ticket and not self._closed:
+                self._cond.wait()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._written == self._synced and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+            if self.commit_delay > 0:
+                time.sleep(self.commit_delay)
+
+            start = time.perf_counter()
+            with self._io_lock:
+                with self._cond:
+                    if self._closed:
+                        return
+                    target = self._written
+                    self._file.flush()
+                os.fsync(self._file.fileno())
+            metrics.sample_log_fsync_seconds.observe(time.perf_counter() - start)
+            with self._cond:
+                # None if truncate() has synced them meanwhile
+                committed = max(0, target - self._synced)
+                metrics.sample_log_commit_records.observe(committed)
+                self.fsyncs += 1
+                self.records += committed
+                self._synced = max(self._synced, target)
+                self._cond.notify_all()
+
+    def replay(self, after_seq: int) -> Iterator[LoggedSample]:
+        """
+        :return: The samples logged with a seq after after_seq, in order
+        """
+        with self._cond:
+            self._file.flush()
+        for _, body in read_records(self.path):
+            if _record.unpack_from(body)[0] > after_seq:
+                yield decode(body)
+
+    def truncate(self, through_seq: int):
+        """
+        Drop the records up to and including through_seq, e.g. once a checkpoint holds them.
+        """
+        with self._io_lock, self._cond:
+            if self._closed:
+                return
+            self._file.flush()
+            if self.last_seq <= through_seq:
+                self._file.truncate(0)
+                os.fsync(self._file.fileno())
+            else:
+                # Samples were logged while the checkpoint was saved: keep those
+                tmp = self.path + '.tmp'
+                with open(tmp, 'wb') as f:
+                    for _, body in read_records(self.path):
+                        if _record.unpack_from(body)[0] > through_seq:
+                            f.write(_frame.pack(len(body), zlib.crc32(body)) + body)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._file.close()
+                os.replace(tmp, self.path)
+                self._file = open(self.path, 'ab')
+            # Whatever was written is on disk now
+            self._synced = self._written
+            self._cond.notify_all()
+
+    def close(self):
+        with self._io_lock, self._cond:
+            if self._closed:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._synced = self._written
+            self._closed = True
+            self._file.close()
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'enabled': True,
+                'path': self.path,
+                'last_seq': self.last_seq,
+                'fsyncs': self.fsyncs,
+                'records_per_fsync': self.records / self.fsyncs if self.fsyncs else 0.,
+            }
@@ -0,0 +1,92 @@
+"""
+The parts of the server that don't depend on the web framework, shared by app.py (Flask) and
+asgi_app.py (Quart): config, inference workers, training jobs, the session registry, and
+the handlers' framework-independent halves.  Importing it sets them up.
+"""
+import logging
+
+import torch
+
+from pkg import metrics, timing
+from pkg.config import Config
+from pkg.jobs import TrainingJobManager, TrainingQueueFull
+from pkg.l2s import Landmarks2ScreenCoords
+from pkg.registry import SessionRegistry
+from pkg.workers import WorkerPool
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger('app')
+
+device = 'cpu' if torch.cuda.device_count() == 0 else 'cuda'
+
+
+app_config = Config()
+
+# Inference worker processes.  They're forked, so this comes before anything starts a thread, see pkg/workers.py
+worker_pool = None
+if getattr(app_config, 'inference_workers', 0) > 0:
+    worker_pool = WorkerPool(app_config.inference_workers,
+                             threads_per_worker=getattr(app_config, 'inference_worker_threads', 1), logger=logger)
+
+training_jobs = TrainingJobManager(queue_size=getattr(app_config, 'training_queue_size', 1), logger=logger)
+
+# One model, optimizer and pair of datasets per user, see pkg/registry.py
+sessions = SessionRegistry(
+    lambda session_dir: Landmarks2ScreenCoords(logger, session_dir=session_dir, worker_pool=worker_pool),
+    root=getattr(app_config, 'sessions_path', 'cache/sessions'),
+    memory_budget=getattr(app_config, 'session_memory_budget_mb', 1024) * 2 ** 20,
+    is_busy=training_jobs.has_active,
+    logger=logger)
+
+# The default session, for requests that don't name one
+l2coord = sessions.get()
+
+metrics.registry.add_collector(metrics.dataset_collector(sessions))
+
+logger.info(f'Using device {device}')
+
+
+def start_training_job(l2s, epochs, calibration_mode, args):
+    """
+    :param args: The request's query arguments, which pick the samples to train on,
+    see Landmarks2ScreenCoords.sample_query()
+    :return: The response body and status
+    """
+    # Training runs on the job manager's worker thread; the client polls /api/gaze/jobs/<job_id>
+    if l2s.model is None:
+        return {'status': 'failed', 'error': 'No model loaded', 'losses': l2s.losses}, 503
+    try:
+        dataset = l2s.sample_query(args)
+    except ValueError as e:
+        return {'status': 'failed', 'error': str(e), 'losses': l2s.losses}, 400
+    try:
+        job = training_jobs.submit(l2s, epochs, calibration_mode, dataset)
+    except TrainingQueueFull as e:
+        return {'status': 'rejected', 'error': str(e), 'losses': l2s.losses}, 409
+    return job.as_dict(), 202
+
+
+def sample_count(l2s, args):
+    """
+    How many samples a training query (the same arguments) would get
+    :return: The response body and status
+    """
+    try:
+        dataset = l2s.sample_query(args)
+    except ValueError as e:
+        return {'status': 'failed', 'error': str(e)}, 400
+    return {'samples': len(dataset if dataset is not None else l2s.dataset)}, 200
+
+
+def timing_stats():
+    return {
+        'sample_rate': getattr(app_config, 'predict_timing_sample_rate', 0.),
+        'server_timing_header': getattr(app_config, 'server_timing_header', False),
+        **timing.stats.as_dict()
+    }
+
+
+def worker_stats():
+    if worker_pool is None:
+        return {'enabled': False}
+    return {'enabled': True, **worker_pool.stats()}
@@ -1,58 +1,130 @@
-from typing import Tuple, List
+import threading
+from typing import Callable, Tuple, List, Optional
+import torch
 import torch.utils.data.dataset
 
+from pkg import metrics
+from pkg.checkpoint_writer import save_atomic
+from pkg.dataset_loader import ProgressFile
+from pkg.landmark_storage import LandmarkStorage
+
 
 class SimpleDataset(torch.utils.data.Dataset):
 
-    def __init__(self, *, capacity=2048, logger=None):
+    def __init__(self, *, capacity=2048, logger=None, storage: Optional[LandmarkStorage] = None):
+        """
+        :param storage: How landmarks are kept, float32 if None, see pkg/landmark_storage.py
+        """
         self.logger = logger
         self.capacity = capacity
+        self.storage = storage or LandmarkStorage()
 
         self.idx = 0
 
         # Dataset items are a dict
         self._db: List[Tuple[any, any]] = [(None, None)] * capacity
         self.full = False
+        # Items ever added, kept across save() and load(), which numbers the records of a SampleLog
+        self.added = 0
+        # Keeps the slots and idx/full consistent for snapshot()
+        self._lock = threading.Lock()
 
     def __getitem__(self, idx: int) -> Tuple[int, Tuple[any, any]]:
-        item: Tuple = self._db[idx]
+        item, target = self._db[idx]
 
-        return (idx, *item)
+        return idx, self.storage.decode(item), target
 
     def __len__(self):
         return self.capacity if self.full else self.idx
 
     def add_item(self, item: any, target: any):
+        with self._lock:
+            self._db[self.idx] = (self.storage.encode(item), target)
+            self.added += 1
+            self.idx = self.idx + 1
+            if self.idx == self.capacity:
+                self.full = True
+                self.idx = 0
+
+    def snapshot(self) -> 'SimpleDataset':
+        """
+        :return: A copy of the dataset as it is now, to save while items are still being added.
+        Items are shared rather than copied, as they're replaced rather than changed.
+        """
+        copy = SimpleDataset(capacity=self.capacity, logger=self.logger, storage=self.storage)
+        with self._lock:
+            copy._db = list(self._db)
+            copy.idx, copy.full, copy.added = self.idx, self.full, self.added
+        return copy
 
-        self._db[self.idx] = (item, target)
-        self.idx = self.idx + 1
-        if self.idx == self.capacity:
-            self.full = True
-            self.idx = 0
+    def landmarks(self) -> torch.Tensor:
+        """
+        :return: [len, 478, 3] landmarks of the items held, in slot order
+        """
+        if len(self) == 0:
+            return torch.empty((0, 478, 3))
+        return self.storage.decode(torch.stack([item for item, _ in self._db[:len(self)]]))
+
+    def targets(self) -> torch.Tensor:
+        """
+        :return: [len, 2] targets of the items held, in slot order
+        """
+        if len(self) == 0:
+            return torch.empty((0, 2))
+        return torch.stack([target for _, target in self._db[:len(self)]])
+
+    def memory_bytes(self):
+        """
+        Estimated memory held by the items, assuming they're all the same size.
+        """
+        if len(self) == 0:
+            return 0
+        item, target = self._db[0]
+        return len(self) * (item.nelement() * item.element_size() + target.nelement() * target.element_size())
 
     def clear(self):
-        self.__init__()
+        self.__init__(capacity=self.capacity, logger=self.logger, storage=self.storage)
 
     def save(self, filename):
-        torch.save({
-            "_db": self._db,
-            "capacity": self.capacity,
-            "idx": self.idx,
-            "full": self.full,
-        }, filename)
-
-    def load(self, filename, expand_to_fit=True):
+        with metrics.dataset_save_seconds.time():
+            save_atomic({
+                "_db": self._db,
+                "capacity": self.capacity,
+                "idx": self.idx,
+                "full": self.full,
+                "added": self.added,
+                "landmark_storage": self.storage.state(),
+            }, filename)
+
+    def load(self, filename, expand_to_fit=True, progress: Optional[Callable[[int], None]] = None):
         """
         Load the dataset from a file.
         :param filename: The file to load the dataset from.
         :param expand_to_fit: If True, expand the dataset to fit the loaded data, otherwise fill up to the current capacity.
+        :param progress: Called with the bytes of the file read so far as it's read
         """
         try:
-            db = torch.load(filename)
+            if progress is None:
+                db = torch.load(filename)
+            else:
+                with ProgressFile(filename, progress) as f:
+                    db = torch.load(f)
             loaded_capacity = db["capacity"]
-            loaded_db = db["_db"]
+            loaded_storage = LandmarkStorage.from_state(db.get("landmark_storage"))
+            if "_db" in db:
+                loaded_db = db["_db"]
+                if loaded_storage != self.storage:
+                    loaded_db = [(None, None) if item is None else
+                                 (self.storage.encode(loaded_storage.decode(item)), target)
+                                 for item, target in loaded_db]
+            else:
+                # Saved by a TensorRingDataset
+                landmarks = self.storage.encode(loaded_storage.decode(db["landmarks"]))
+                loaded_db = list(zip(landmarks, db["targets"]))
+                loaded_db += [(None, None)] * (loaded_capacity - len(loaded_db))
 
             loaded_size = loaded_capacity if db["full"] else db["idx"]
+            self.added = db.get("added", 0)
             if self.capacity <= loaded_capacity:
                 # Set the capacity to that of the loaded dataset
                 if expand_to_fit:
@@ -68,10 +140,9 @@ class SimpleDataset(torch.utils.data.Dataset):
             else:
                 self._db[:loaded_capacity] = loaded_db
                 self.full = False
-                self.idx = loaded_capacity
+                self.idx = loaded_size
             print(f'Loaded database: Capacity {self.capacity}, full: {self.full}, idx : {self.idx}, len() = {len(self)}')
-        except RuntimeError as er:
-            self.logger.warning(er)
         except FileNotFoundError:
+            # A new dataset.  Anything else, e.g. a truncated file, raises, so the file isn't saved over
             self.logger.warning(f'{filename} not found')
 
@@ -0,0 +1,535 @@
+"""
+SQLite dataset backend.
+
+The other backends keep samples in a ring with nothing but their slot, so "this session's samples
+from the last hour" or "samples looking near the top-left corner" means going through all of them.
+SqliteDataset keeps one row per sample in a SQLite database next to the dataset path (.sqlite):
+
+    samples(id, session, timestamp, target_x, target_y, bin, landmarks)
+
+where id is the dataset's added count with the sample in it (as numbered in pkg/sample_log.py), bin
+the cell of a target_bins x target_bins grid over the screen the target falls in, and landmarks the
+raw little-endian [478, 3] array, in the landmark storage dtype (float32 unless configured, see
+pkg/landmark_storage.py).  session, timestamp and bin are indexed, so query() finds samples by them
+without reading the rest, and the SampleQuery it returns trains like any other dataset.
+
+Rather than a ring overwriting its oldest slot, a Retention policy says which samples go as new ones
+arrive: the oldest beyond the capacity, as a ring would, and optionally those older than an age, or
+the oldest of a session or target bin holding more than a limit.  Capping each bin keeps old samples
+of rarely labelled regions of the screen that a ring would lose to the ones labelled all the time.
+
+Every sample is committed as it's added, in WAL journal mode with synchronous=NORMAL: a save is a
+WAL checkpoint.  Datasets saved by the other backends are imported the first time they're loaded, or with
+
+    python -m pkg.sqlite_dataset cache/checkpoints/l2s_v200_db.pth [out.sqlite]
+"""
+import array
+import bisect
+import json
+import os
+import sqlite3
+import struct
+import sys
+import threading
+import time
+from typing import Callable, NamedTuple, Optional, Sequence
+
+import torch
+import torch.utils.data.dataset
+
+from pkg import metrics
+from pkg.landmark_storage import LandmarkStorage
+
+_schema = '''
+CREATE TABLE IF NOT EXISTS samples (
+    id INTEGER PRIMARY KEY,
+    session TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    target_x REAL NOT NULL,
+    target_y REAL NOT NULL,
+    bin INTEGER NOT NULL,
+    landmarks BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS samples_session ON samples(session, id);
+CREATE INDEX IF NOT EXISTS samples_timestamp ON samples(timestamp);
+CREATE INDEX IF NOT EXISTS samples_bin ON samples(bin, id);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+'''
+
+# Rows read per query when going through the whole table
+_CHUNK = 4096
+
+
+def sqlite_path(filename: str) -> str:
+    """
+    :return: The database used for a dataset path, e.g. l2s_v200_db.sqlite for l2s_v200_db.pth
+    """
+    return os.path.splitext(filename)[0] + '.sqlite'
+
+
+class Retention(NamedTuple):
+    """
+    Which samples a SqliteDataset drops as new ones arrive.  Beyond the dataset's capacity the oldest
+    always go; each of these is off if None.
+    """
+    # Drop samples older than this
+    max_age_seconds: Optional[float] = None
+    # Drop the oldest samples of a session once it has more than this
+    max_per_session: Optional[int] = None
+    # Drop the oldest samples of a target bin once it has more than this
+    max_per_bin: Optional[int] = None
+
+
+def retention(config) -> Retention:
+    policy = getattr(config, 'dataset_retention', None) or {}
+    max_age_hours = policy.get('max_age_hours')
+    return Retention(max_age_seconds=max_age_hours * 3600. if max_age_hours else None,
+                     max_per_session=policy.get('max_per_session') or None,
+                     max_per_bin=policy.get('max_per_bin') or None)
+
+
+def target_bin(x: float, y: float, bins: int) -> int:
+    """
+    :param x, y: Target screen coordinates, -1..1
+    :return: The cell of a bins x bins grid over the screen, row by row from the top left, that (x, y) is in
+    """
+    col = min(max(int((x + 1) / 2 * bins), 0), bins - 1)
+    row = min(max(int((y + 1) / 2 * bins), 0), bins - 1)
+    return row * bins + col
+
+
+def _blob(storage: LandmarkStorage, landmarks: torch.Tensor) -> bytes:
+    stored = storage.encode(landmarks.detach().cpu()).contiguous()
+    # numpy has no bfloat16
+    return (stored.view(torch.int16) if stored.dtype == torch.bfloat16 else stored).numpy().tobytes()
+
+
+class SqliteDataset(torch.utils.data.Dataset):
+    """
+    A dataset of rows in a SQLite database (see module docstring), bound by load().  Until then the
+    database is in memory.  Items are indexed oldest first, one at a time or with a slice, list or tensor
+    of indices to get whole batches with one query.
+    """
+    # batch_loader() can index it with a tensor of indices
+    gathers_batches = True
+
+    def __init__(self, *, capacity=2048, logger=None, storage: Optional[LandmarkStorage] = None,
+                 retention: Optional[Retention] = None, target_bins=8, item_shape: Sequence[int] = (478, 3)):
+        """
+        :param storage: How landmarks are kept, float32 if None
+        :param retention: Which samples to drop beyond the capacity, see Retention
+        :param target_bins: Rows and columns of the grid of target bins
+        """
+        self.logger = logger
+        self.capacity = capacity
+        self.storage = storage or LandmarkStorage()
+        self.retention = retention or Retention()
+        self.target_bins = target_bins
+        self.item_shape = tuple(item_shape)
+        # Recorded with each sample added
+        self.session = ''
+
+        self.path = None
+        # Items ever added, the id of the last, kept across save() and load()
+        self.added = 0
+        # Ids of the rows held, ascending, so items can be indexed by position
+        self._ids = array.array('q')
+        self._age_checked = 0.
+        self._lock = threading.RLock()
+        self._connect(':memory:')
+
+    def _connect(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_schema)
+
+    def _meta(self, key: str, default=None):
+        row = self._conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_meta(self, key: str, value):
+        self._conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+
+    def __len__(self):
+        return len(self._ids)
+
+    @property
+    def full(self):
+        return len(self) >= self.capacity
+
+    @property
+    def idx(self):
+        """
+        Where a ring of the same capacity would write next, for what counts samples by it (checkpoint intervals)
+        """
+        return self.added % self.capacity
+
+    def add_item(self, item: torch.Tensor, target: torch.Tensor, timestamp: Optional[float] = None):
+        x, y = float(target[0]), float(target[1])
+        with self._lock:
+            self.added += 1
+            timestamp = time.time() if timestamp is None else timestamp
+            self._conn.execute(
+                'INSERT INTO samples (id, session, timestamp, target_x, target_y, bin, landmarks) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (self.added, self.session, timestamp, x, y, target_bin(x, y, self.target_bins),
+                 _blob(self.storage, item)))
+            self._ids.append(self.added)
+            self._retain(self.session, target_bin(x, y, self.target_bins), timestamp)
+
+    def _retain(self, session: Optional[str] = None, bin_: Optional[int] = None, now: Optional[float] = None):
+        """
+        Apply the retention policy, after adding a sample of session and bin_ (None to check every session and bin).
+        """
+        policy = self.retention
+        if policy.max_per_bin is not None:
+            self._drop_excess('bin', bin_, policy.max_per_bin)
+        if policy.max_per_session is not None:
+            self._drop_excess('session', session, policy.max_per_session)
+        now = time.time() if now is None else now
+        # Once a second is plenty for ages
+        if policy.max_age_seconds is not None and now - self._age_checked >= 1.:
+            self._age_checked = now
+            self._drop('SELECT id FROM samples WHERE timestamp < ?', (now - policy.max_age_seconds,))
+        if len(self) > self.capacity:
+            self._drop('SELECT id FROM samples ORDER BY id LIMIT ?', (len(self) - self.capacity,))
+
+    def _drop_excess(self, column: str, value, limit: int):
+        if value is None:
+            groups = [row[0] for row in self._conn.execute(
+                f'SELECT {column} FROM samples GROUP BY {column} HAVING COUNT(*) > ?', (limit,))]
+        else:
+            groups = [value]
+        for group in groups:
+            self._drop(f'SELECT id FROM samples WHERE {column} = ? ORDER BY id DESC LIMIT -1 OFFSET ?', (group, limit))
+
+    def _drop(self, select: str, params: tuple):
+        """
+        Delete the rows whose ids select selects.
+        """
+        dropped = sorted(row[0] for row in self._conn.execute(
+            f'DELETE FROM samples WHERE id IN ({select}) RETURNING id', params))
+        if not dropped:
+            return
+        if dropped == self._ids[:len(dropped)].tolist():
+            # The oldest, as usual
+            del self._ids[:len(dropped)]
+        else:
+            for id_ in dropped:
+                i = bisect.bisect_left(self._ids, id_)
+                if i < len(self._ids) and self._ids[i] == id_:
+                    del self._ids[i]
+
+    def _fetch(self, ids: Sequence[int]):
+        """
+        :return: The ids of those rows that (still) exist, in the order asked for, with their [n, 478, 3]
+        float32 landmarks and [n, 2] targets
+        """
+        rows = {}
+        with self._lock:
+            for start in range(0, len(ids), 512):
+                chunk = ids[start:start + 512]
+                rows.update((row[0], row[1:]) for row in self._conn.execute(
+                    f'SELECT id, target_x, target_y, landmarks FROM samples WHERE id IN ({",".join("?" * len(chunk))})',
+                    chunk))
+        found = [id_ for id_ in ids if id_ in rows]
+        if not found:
+            return found, torch.empty((0, *self.item_shape)), torch.empty((0, 2))
+        landmarks = torch.frombuffer(bytearray(b''.join(rows[id_][2] for id_ in found)), dtype=self.storage.dtype)
+        landmarks = self.storage.decode(landmarks.reshape(len(found), *self.item_shape))
+        targets = torch.tensor([rows[id_][:2] for id_ in found], dtype=torch.float32).reshape(len(found), 2)
+        return found, landmarks, targets
+
+    def __getitem__(self, idx):
+        """
+        :param idx: An index, or a slice, list or tensor of them
+        :return: (idx, landmarks, target), batched if idx is
+        """
+        with self._lock:
+            return _get_items(self, self._ids, idx)
+
+    def query(self, *, session: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None,
+              region: Optional[Sequence[float]] = None, limit: Optional[int] = None) -> 'SampleQuery':
+        """
+        :param session: Only samples labelled in this session
+        :param since, until: Only samples labelled at or after since and before until (time.time() seconds)
+        :param region: (x0, y0, x1, y1): only samples whose target is in this rectangle (screen coordinates, -1..1)
+        :param limit: Only the latest limit samples that match
+        :return: The samples that match, oldest first
+        """
+        where, params = [], []
+        if session is not None:
+            where.append('session = ?')
+            params.append(session)
+        if since is not None:
+            where.append('timestamp >= ?')
+            params.append(since)
+        if until is not None:
+            where.append('timestamp < ?')
+            params.append(until)
+        if region is not None:
+            x0, y0, x1, y1 = region
+            x0, x1 = min(x0, x1), max(x0, x1)
+            y0, y1 = min(y0, y1), max(y0, y1)
+            # The bins the rectangle covers, through their index, then the targets within it
+            first, last = target_bin(x0, y0, self.target_bins), target_bin(x1, y1, self.target_bins)
+            bins = [row * self.target_bins + col
+                    for row in range(first // self.target_bins, last // self.target_bins + 1)
+                    for col in range(first % self.target_bins, last % self.target_bins + 1)]
+            where.append(f'bin IN ({",".join("?" * len(bins))}) '
+                         f'AND target_x BETWEEN ? AND ? AND target_y BETWEEN ? AND ?')
+            params += [*bins, x0, x1, y0, y1]
+        sql = 'SELECT id FROM samples' + (' WHERE ' + ' AND '.join(where) if where else '') + ' ORDER BY id DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        with self._lock:
+            ids = array.array('q', reversed([row[0] for row in self._conn.execute(sql, params)]))
+        return SampleQuery(self, ids)
+
+    def landmarks(self) -> torch.Tensor:
+        """
+        :return: [len, 478, 3] float32 landmarks of the items held, oldest first
+        """
+        return torch.cat([self._fetch(self._ids[start:start + _CHUNK])[1] for start in range(0, len(self), _CHUNK)]) \
+            if len(self) else torch.empty((0, *self.item_shape))
+
+    def targets(self) -> torch.Tensor:
+        """
+        :return: [len, 2] targets of the items held, oldest first
+        """
+        with self._lock:
+            return torch.tensor(self._conn.execute('SELECT target_x, target_y FROM samples ORDER BY id').fetchall(),
+                                dtype=torch.float32).reshape(-1, 2)
+
+    def memory_bytes(self):
+        """
+        Memory held by the items: just their ids, as they're in the database.
+        """
+        return len(self._ids) * self._ids.itemsize
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM samples')
+            self._ids = array.array('q')
+
+    def snapshot(self) -> 'SqliteSnapshot':
+        """
+        Samples are committed as they're added, so the snapshot only has to say how many.
+        """
+        return SqliteSnapshot(self)
+
+    def save(self, filename):
+        """
+        If filename is this dataset's database (or the .pth path it was loaded with), checkpoint its WAL, so
+        the samples added so far are in the database file.  Otherwise write a copy of the database there.
+        """
+        path = filename if filename.endswith('.sqlite') else sqlite_path(filename)
+        with metrics.dataset_save_seconds.time(), self._lock:
+            self._set_meta('added', self.added)
+            if self.path is not None and os.path.abspath(path) == os.path.abspath(self.path):
+                self._conn.execute('PRAGMA wal_checkpoint(FULL)')
+                return
+            tmp = path + '.tmp'
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            copy = sqlite3.connect(tmp)
+            try:
+                self._conn.backup(copy)
+                copy.execute('PRAGMA journal_mode=DELETE')
+            finally:
+                copy.close()
+            os.replace(tmp, path)
+
+    def load(self, filename, expand_to_fit=True, progress: Optional[Callable[[int], None]] = None):
+        """
+        Open the database for filename (see sqlite_path()), importing a dataset file of another backend into
+        it first if it hasn't been imported yet: the MmapDataset file (see mmap_path()) if there is one, as
+        that backend keeps it rather than filename up to date, otherwise filename.
+        If the database can't be read, the dataset is left empty and in memory, not bound to it (so save()
+        with filename doesn't write over it), and the error is raised.
+        :param expand_to_fit: If True, raise the capacity to the samples in the database, otherwise drop the oldest beyond it.
+        :param progress: Called with the bytes of filename read so far, if it's imported
+        """
+        from pkg.mmap_dataset import mmap_path
+        path = filename if filename.endswith('.sqlite') else sqlite_path(filename)
+        try:
+            if not os.path.exists(path) and filename != path:
+                source = next((f for f in (mmap_path(filename), filename) if os.path.exists(f)), None)
+                if source is not None:
+                    convert(source, path, logger=self.logger, storage=self.storage, target_bins=self.target_bins,
+                            progress=progress)
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with self._lock:
+                self._conn.close()
+                self._connect(path)
+                self.path = path
+                self._adopt_meta()
+                self._ids = array.array('q')
+                for (id_,) in self._conn.execute('SELECT id FROM samples ORDER BY id'):
+                    self._ids.append(id_)
+                self.added = max(self._meta('added', 0), self._ids[-1] if self._ids else 0)
+                if expand_to_fit:
+                    self.capacity = max(self.capacity, len(self))
+                self._retain()
+            print(f'Loaded database: Capacity {self.capacity}, len() = {len(self)}, added: {self.added}')
+        except (sqlite3.DatabaseError, RuntimeError, ValueError, struct.error):
+            with self._lock:
+                self._conn.close()
+                self._connect(':memory:')
+                self.path = None
+                self._ids = array.array('q')
+                self.added = 0
+            raise
+
+    def _adopt_meta(self):
+        """
+        Record this dataset's landmark storage and target bins in a new database, or convert an existing
+        one's samples to them.
+        """
+        loaded_storage = self._meta('landmark_storage')
+        if loaded_storage is not None and LandmarkStorage.from_state(loaded_storage) != self.storage:
+            loaded_storage = LandmarkStorage.from_state(loaded_storage)
+            if self.logger:
+                self.logger.info(f'Converting {self.path} from {loaded_storage} to {self.storage}')
+            self._rewrite('landmarks', lambda row: _blob(self.storage, loaded_storage.decode(
+                torch.frombuffer(bytearray(row[3]), dtype=loaded_storage.dtype).reshape(self.item_shape))))
+        loaded_bins = self._meta('target_bins')
+        if loaded_bins is not None and loaded_bins != self.target_bins:
+            self._rewrite('bin', lambda row: target_bin(row[1], row[2], self.target_bins))
+        self._set_meta('landmark_storage', self.storage.state())
+        self._set_meta('target_bins', self.target_bins)
+
+    def _rewrite(self, column: str, value: Callable):
+        """
+        Set column of every row to value((id, target_x, target_y, landmarks)), in one transaction.
+        """
+        self._conn.execute('BEGIN')
+        last = 0
+        while True:
+            rows = self._conn.execute('SELECT id, target_x, target_y, landmarks FROM samples WHERE id > ? '
+                                      'ORDER BY id LIMIT ?', (last, _CHUNK)).fetchall()
+            if not rows:
+                break
+            self._conn.executemany(f'UPDATE samples SET {column} = ? WHERE id = ?', [(value(row), row[0]) for row in rows])
+            last = rows[-1][0]
+        self._conn.execute('COMMIT')
+
+
+def _get_items(dataset: SqliteDataset, ids: array.array, idx):
+    """
+    __getitem__ of a SqliteDataset or SampleQuery whose items are the rows of ids.
+    Rows dropped since (see Retention) are left out of batches.
+    """
+    if isinstance(idx, int):
+        found, landmarks, targets = dataset._fetch([ids[idx]])
+        if not found:
+            raise IndexError(f'Sample {ids[idx]} has been dropped')
+        return idx, landmarks[0], targets[0]
+    positions = torch.arange(len(ids))[idx]
+    wanted = [ids[p] for p in positions.tolist()]
+    found, landmarks, targets = dataset._fetch(wanted)
+    if len(found) < len(wanted):
+        found_ids = set(found)
+        positions = positions[[id_ in found_ids for id_ in wanted]]
+    return positions, landmarks, targets
+
+
+class SampleQuery(torch.utils.data.Dataset):
+    """
+    The samples a SqliteDataset.query() matched, oldest first, to train on: indexed like the dataset,
+    one at a time or a batch per query.
+    """
+    gathers_batches = True
+
+    def __init__(self, dataset: SqliteDataset, ids: array.array):
+        self.dataset = dataset
+        self.ids = ids
+        self.capacity = len(ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, idx):
+        return _get_items(self.dataset, self.ids, idx)
+
+    def landmarks(self) -> torch.Tensor:
+        return self[:][1]
+
+    def targets(self) -> torch.Tensor:
+        return self[:][2]
+
+    def memory_bytes(self):
+        return len(self.ids) * self.ids.itemsize
+
+
+class SqliteSnapshot:
+    """
+    The added count of a SqliteDataset at one point.  Saving it to the dataset's own database
+    checkpoints the WAL, which covers at least those samples.
+    """
+
+    def __init__(self, dataset: SqliteDataset):
+        self.dataset = dataset
+        with dataset._lock:
+            self.added = dataset.added
+
+    def save(self, filename):
+        self.dataset.save(filename)
+
+
+def convert(filename: str, path: str = None, logger=None, storage: Optional[LandmarkStorage] = None, target_bins=8,
+            progress: Optional[Callable[[int], None]] = None):
+    """
+    Import a dataset saved by SimpleDataset, TensorRingDataset or MmapDataset into a new database.
+    Its samples get the session '' and the file's modification time.
+    :param path: Defaults to sqlite_path(filename)
+    :param progress: See TensorRingDataset.load()
+    """
+    from pkg.tensor_dataset import TensorRingDataset
+    path = path or sqlite_path(filename)
+    if filename.endswith('.mmap'):
+        from pkg.mmap_dataset import MmapDataset, _read_header
+        # In the file's own landmark storage, which MmapDataset.load() would otherwise rewrite it to
+        dataset = MmapDataset(capacity=1, logger=logger, storage=_read_header(filename)[0])
+    else:
+        dataset = TensorRingDataset(capacity=1, logger=logger)
+    # Grows to the capacity of the file
+    dataset.load(filename, expand_to_fit=True, progress=progress)
+    timestamp = os.path.getmtime(filename)
+    # Oldest first, so ids follow the order they were added in
+    order = torch.arange(len(dataset))
+    if dataset.full:
+        order = (order + dataset.idx) % dataset.capacity
+    first_id = dataset.added - len(dataset) + 1 if dataset.added >= len(dataset) else 1
+
+    tmp = path + '.tmp'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    db = SqliteDataset(capacity=max(len(dataset), 1), logger=logger, storage=storage, target_bins=target_bins)
+    db._conn.close()
+    db._connect(tmp)
+    db.path = tmp
+    db._adopt_meta()
+    db._conn.execute('BEGIN')
+    for start in range(0, len(dataset), _CHUNK):
+        _, landmarks, targets = dataset[order[start:start + _CHUNK]]
+        db._conn.executemany(
+            'INSERT INTO samples (id, session, timestamp, target_x, target_y, bin, landmarks) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(first_id + start + i, '', timestamp, float(x), float(y), target_bin(float(x), float(y), target_bins),
+              _blob(db.storage, item)) for i, (item, (x, y)) in enumerate(zip(landmarks, targets.tolist()))])
+    db._set_meta('added', max(dataset.added, first_id + len(dataset) - 1))
+    db._conn.execute('COMMIT')
+    db._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    db._conn.close()
+    os.replace(tmp, path)
+    if logger:
+        logger.info(f'Imported {filename} ({len(dataset)} samples) into {path}')
+    return path
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (2, 3):
+        raise SystemExit(__doc__)
+    print(f'Wrote {convert(*sys.argv[1:])}')
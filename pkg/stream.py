@@ -0,0 +1,114 @@
+"""
+Per-connection state for the /api/gaze/stream websocket.
+
+Each client message is a little-endian uint32 sequence number followed by a landmarks
+frame in the pkg/wire.py format.  Each reply is a JSON text message: the usual
+/api/gaze/landmarks response plus the sequence number of the frame it was computed from,
+the number of frames that were dropped because newer ones had already arrived, and the number
+of messages that couldn't be decoded (with the last one's error, if any).  If none of the
+messages since the last reply could be, the reply is an error, without a sequence number.
+Keep in step with src/GazeStream.ts
+"""
+import struct
+from typing import List, Optional
+
+from pkg import wire
+
+_seq = struct.Struct('<I')
+SEQ_SIZE = _seq.size
+
+
+class StreamSession:
+    """
+    State for one streaming connection: the newest sequence number seen, and the last
+    (optionally exponentially smoothed) prediction.
+    """
+
+    def __init__(self, l2s, *, smoothing=0., logger=None):
+        """
+        :param l2s: The Landmarks2ScreenCoords that serves this connection.  Callers set it before each
+        handle(), as the session may have been evicted and reloaded since the last frames.
+        :param smoothing: Weight of the previous prediction in the exponential moving average
+        of the gaze, 0 (no smoothing) .. 1
+        """
+        self.l2s = l2s
+        self.smoothing = min(max(float(smoothing), 0.), .99)
+        self.logger = logger
+
+        self.last_seq = -1
+        self.last_gaze: Optional[List[float]] = None
+        self.frames_received = 0
+        self.frames_dropped = 0
+        self.frames_invalid = 0
+
+    @staticmethod
+    def decode(message):
+        """
+        :return: sequence number, [478, 3] landmarks tensor, [x, y] target or None
+        """
+        if not isinstance(message, (bytes, bytearray, memoryview)):
+            # e.g. a text message, which bytearray() would turn into a TypeError that closes the connection
+            raise ValueError(f'Stream frames are binary messages, not {type(message).__name__}')
+        frame = bytearray(message)
+        if len(frame) < SEQ_SIZE:
+            raise ValueError(f'Stream frame too short: {len(frame)} bytes')
+        seq, = _seq.unpack_from(frame)
+        landmarks, target = wire.decode_landmarks(memoryview(frame)[SEQ_SIZE:])
+        wire.check_sample(landmarks, target)
+        return seq, landmarks, target
+
+    def handle(self, messages) -> Optional[dict]:
+        """
+        Process the frames that have arrived since the last reply, oldest first.
+        Labelled frames are all added to the datasets, but only the newest frame is run
+        through the model: the older ones are already stale.  Messages that can't be decoded
+        are counted and skipped, so they don't cost the frames around them.
+        :return: The reply for the newest frame, an error reply if no message could be decoded,
+        or None if every frame was out of date.
+        """
+        newest = None
+        dropped = 0
+        invalid = 0
+        error = None
+        for message in messages:
+            try:
+                seq, landmarks, target = self.decode(message)
+            except ValueError as e:
+                invalid += 1
+                error = str(e)
+                continue
+            self.frames_received += 1
+            if target is not None:
+                self.l2s.add_sample(landmarks, target)
+            if seq <= self.last_seq:
+                # Arrived out of order, a newer frame has already been answered
+                dropped += 1
+                continue
+            if newest is not None:
+                dropped += 1
+            newest = seq, landmarks
+
+        self.frames_dropped += dropped
+        self.frames_invalid += invalid
+        if newest is None:
+            if invalid:
+                return {'status': 'failed', 'error': error, 'invalid': invalid}
+            return None
+
+        seq, landmarks = newest
+        self.last_seq = seq
+        gaze = [float(v) for v in self.l2s.infer(landmarks)]
+        if self.last_gaze is not None and self.smoothing > 0:
+            a = self.smoothing
+            gaze = [a * last + (1 - a) * g for last, g in zip(self.last_gaze, gaze)]
+        self.last_gaze = gaze
+
+        reply = {
+            'seq': seq,
+            'dropped': dropped,
+            'invalid': invalid,
+            **self.l2s.prediction_response(gaze)
+        }
+        if error is not None:
+            reply['error'] = error
+        return reply
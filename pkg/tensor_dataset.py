@@ -0,0 +1,399 @@
+import threading
+from typing import Callable, Optional
+
+import torch
+import torch.utils.data.dataset
+
+from pkg import metrics
+from pkg.checkpoint_writer import patch_saved, save_atomic
+from pkg.dataset_loader import ProgressFile
+from pkg.landmark_storage import LandmarkStorage, landmark_storage
+from pkg.simple_dataset import SimpleDataset
+
+
+def dataset_class(config):
+    """
+    :return: The dataset storage backend the config asks for: TensorRingDataset, MmapDataset, SqliteDataset,
+    or the list-based SimpleDataset
+    """
+    storage = getattr(config, 'dataset_storage', 'list')
+    if storage == 'mmap':
+        from pkg.mmap_dataset import MmapDataset
+        return MmapDataset
+    if storage == 'sqlite':
+        from pkg.sqlite_dataset import SqliteDataset
+        return SqliteDataset
+    return TensorRingDataset if storage == 'tensor' else SimpleDataset
+
+
+def new_dataset(config, capacity: int, logger=None):
+    """
+    :return: An empty dataset of dataset_class(config), storing landmarks as the config asks (landmark_storage())
+    """
+    if getattr(config, 'dataset_storage', 'list') == 'sqlite':
+        from pkg.sqlite_dataset import retention
+        return dataset_class(config)(capacity=capacity, logger=logger, storage=landmark_storage(config),
+                                     retention=retention(config), target_bins=getattr(config, 'dataset_target_bins', 8))
+    return dataset_class(config)(capacity=capacity, logger=logger, storage=landmark_storage(config))
+
+
+def batch_loader(dataset, batch_size: int, shuffle=True):
+    """
+    :return: An iterable of (idx, x, y) batches over dataset, which can be iterated once per epoch:
+    ShuffledBatches for a dataset that gathers batches itself (TensorRingDataset, SqliteDataset, or a view or
+    query of one), a DataLoader for anything else
+    """
+    if getattr(dataset, 'gathers_batches', False):
+        return ShuffledBatches(dataset, batch_size, shuffle=shuffle)
+    return torch.utils.data.DataLoader(dataset=dataset, batch_size=batch_size, shuffle=shuffle)
+
+
+class ShuffledBatches:
+    """
+    Batches of a TensorRingDataset (or another dataset that gathers_batches), each gathered from its
+    storage with one indexing op (or query), rather than a DataLoader's __getitem__ per sample and
+    torch.stack per batch.  Every iteration is a new
+    permutation of the samples held at the time; the last batch may be short, as with a DataLoader.
+    """
+
+    def __init__(self, dataset: 'TensorRingDataset', batch_size: int, shuffle=True):
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+
+    def __len__(self):
+        return (len(self.dataset) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        n = len(self.dataset)
+        order = torch.randperm(n) if self.shuffle else torch.arange(n)
+        for start in range(0, n, self.batch_size):
+            yield self.dataset[order[start:start + self.batch_size]]
+
+
+class TensorRingDataset(torch.utils.data.Dataset):
+    """
+    A drop-in replacement for SimpleDataset that keeps all the landmarks in one [capacity, 478, 3]
+    tensor and all the targets in one [capacity, 2] tensor, rather than a list of small tensors.
+    Adding an item copies it into the next slot of the ring; once full, the oldest are overwritten.
+
+    Items can be indexed one at a time as with SimpleDataset, or with a slice, list or tensor of indices
+    to get whole batches in one go.  The storage is allocated when the first item arrives (with its shape),
+    and pages of it that haven't been written to yet take no memory.  Landmarks are kept in the storage
+    dtype (see pkg/landmark_storage.py) and upcast to float32 as they're fetched.
+    """
+    # batch_loader() can index it with a tensor of indices
+    gathers_batches = True
+
+    def __init__(self, *, capacity=2048, logger=None, storage: Optional[LandmarkStorage] = None):
+        """
+        :param storage: How landmarks are kept, float32 if None
+        """
+        self.logger = logger
+        self.capacity = capacity
+        self.storage = storage or LandmarkStorage()
+
+        self.idx = 0
+        self.full = False
+        self._landmarks: Optional[torch.Tensor] = None
+        self._targets: Optional[torch.Tensor] = None
+        # Items ever added, kept across save() and load(); it numbers the records of a SampleLog
+        self.added = 0
+        # Snapshots being saved, which add_item() gives the old contents of the slots it overwrites
+        self._snapshots = []
+        self._lock = threading.Lock()
+
+    def _allocate(self, item: torch.Tensor, target: torch.Tensor):
+        self._landmarks = torch.empty((self.capacity, *item.shape), dtype=self.storage.dtype)
+        self._targets = torch.empty((self.capacity, *target.shape), dtype=target.dtype)
+
+    def __getitem__(self, idx):
+        """
+        :param idx: An index, or a slice, list or tensor of them
+        :return: (idx, landmarks, target), batched if idx is
+        """
+        return idx, self.storage.decode(self._landmarks[idx]), self._targets[idx]
+
+    def __len__(self):
+        return self.capacity if self.full else self.idx
+
+    def add_item(self, item: torch.Tensor, target: torch.Tensor):
+        with self._lock:
+            if self._landmarks is None:
+                self._allocate(item, target)
+            for snapshot in self._snapshots:
+                snapshot.preserve(self.idx)
+            self._landmarks[self.idx] = self.storage.encode(item)
+            self._targets[self.idx] = target
+            self.added += 1
+            self.idx = self.idx + 1
+            if self.idx == self.capacity:
+                self.full = True
+                self.idx = 0
+
+    def snapshot(self) -> 'RingSnapshot':
+        """
+        :return: The dataset as it is now, to save while items are still being added (see RingSnapshot)
+        """
+        return RingSnapshot(self)
+
+    def landmarks(self) -> torch.Tensor:
+        """
+        :return: [len, 478, 3] float32 landmarks of the items held, in slot order (a view, not a copy,
+        with float32 storage)
+        """
+        return self.storage.decode(self._stored_landmarks())
+
+    def _stored_landmarks(self) -> torch.Tensor:
+        if self._landmarks is None:
+            return torch.empty((0, 478, 3), dtype=self.storage.dtype)
+        return self._landmarks[:len(self)]
+
+    def targets(self) -> torch.Tensor:
+        """
+        :return: [len, 2] targets of the items held, in slot order (a view, not a copy)
+        """
+        if self._targets is None:
+            return torch.empty((0, 2))
+        return self._targets[:len(self)]
+
+    def memory_bytes(self):
+        """
+        Memory held by the items: just their payload.
+        """
+        if self._landmarks is None:
+            return 0
+        return len(self) * (self._landmarks[0].nelement() * self._landmarks.element_size()
+                            + self._targets[0].nelement() * self._targets.element_size())
+
+    def clear(self):
+        with self._lock:
+            self.idx = 0
+            self.full = False
+
+    def save(self, filename):
+        # Items may be added meanwhile
+        RingSnapshot(self).save(filename)
+
+    def load(self, filename, expand_to_fit=True, progress: Optional[Callable[[int], None]] = None):
+        """
+        Load the dataset from a file saved by a TensorRingDataset or a SimpleDataset.
+        :param filename: The file to load the dataset from.
+        :param expand_to_fit: If True, expand the dataset to fit the loaded data, otherwise fill up to the current capacity.
+        :param progress: Called with the bytes of the file read so far as it's read
+        """
+        try:
+            if progress is None:
+                db = torch.load(filename)
+            else:
+                with ProgressFile(filename, progress) as f:
+                    db = torch.load(f)
+            loaded_capacity = db["capacity"]
+            loaded_size = loaded_capacity if db["full"] else db["idx"]
+            loaded_storage = LandmarkStorage.from_state(db.get("landmark_storage"))
+            if "landmarks" in db:
+                landmarks = loaded_storage.decode(db["landmarks"])
+                targets = db["targets"]
+            elif loaded_size > 0:
+                # SimpleDataset's list of (landmarks, target) tuples
+                landmarks = loaded_storage.decode(torch.stack([item for item, _ in db["_db"][:loaded_size]]))
+                targets = torch.stack([target for _, target in db["_db"][:loaded_size]])
+            else:
+                landmarks = targets = None
+
+            self.load_tensors(landmarks, targets, loaded_capacity, db["idx"], db["full"], expand_to_fit=expand_to_fit)
+            self.added = db.get("added", 0)
+            print(f'Loaded database: Capacity {self.capacity}, full: {self.full}, idx : {self.idx}, len() = {len(self)}')
+        except FileNotFoundError:
+            # A new dataset.  Anything else, e.g. a truncated file, raises, so the file isn't saved over
+            self.logger.warning(f'{filename} not found')
+
+    def load_tensors(self, landmarks: Optional[torch.Tensor], targets: Optional[torch.Tensor], loaded_capacity: int,
+                     loaded_idx: int, loaded_full: bool, expand_to_fit=True):
+        """
+        Replace the contents with the samples of another dataset.
+        :param landmarks: [n, 478, 3] float landmarks of the samples it holds, in slot order, or None if it's empty
+        :param targets: [n, 2] targets
+        """
+        loaded_size = loaded_capacity if loaded_full else loaded_idx
+        if expand_to_fit and self.capacity <= loaded_capacity:
+            # Set the capacity to that of the loaded dataset
+            self.capacity = loaded_capacity
+            self.full = loaded_full
+            self.idx = loaded_idx
+        else:
+            # Keep the first slots that fit
+            n = min(loaded_size, self.capacity)
+            self.full = n == self.capacity
+            self.idx = loaded_idx % self.capacity if self.full else n
+            if landmarks is not None:
+                landmarks, targets = landmarks[:n], targets[:n]
+
+        self._landmarks = self._targets = None
+        if landmarks is not None and len(landmarks) > 0:
+            self._allocate(landmarks[0], targets[0])
+            self._landmarks[:len(landmarks)] = self.storage.encode(landmarks)
+            self._targets[:len(targets)] = targets
+
+
+def _first_slots(t: torch.Tensor, n: int) -> torch.Tensor:
+    """
+    :return: The first n slots of t, as a tensor on just that part of its storage, as torch.save writes a
+    view's whole storage
+    """
+    storage = t.untyped_storage()[:n * t[0].nbytes]
+    return torch.empty(0, dtype=t.dtype).set_(storage, 0, (n, *t.shape[1:]))
+
+
+def _slot_bytes(t: torch.Tensor) -> bytes:
+    # numpy has no bfloat16
+    return t.contiguous().view(torch.uint8).numpy().tobytes()
+
+
+class RingSnapshot:
+    """
+    idx, full and added of a TensorRingDataset at one point, and its slots as they were then, to save
+    while items are still being added.
+
+    Rather than copying the ring, save() serializes it from the dataset's storage.  Meanwhile add_item()
+    hands the snapshot the old contents of each slot it overwrites (preserve()), and those are patched
+    back into the file before it replaces the old one.  As a ring only writes at idx, that's a few slots.
+    """
+
+    def __init__(self, dataset: TensorRingDataset):
+        self.dataset = dataset
+        self.capacity = dataset.capacity
+        self.storage = dataset.storage
+        with dataset._lock:
+            self.idx, self.full, self.added = dataset.idx, dataset.full, dataset.added
+            self._landmarks, self._targets = dataset._landmarks, dataset._targets
+            self._n = len(dataset)
+            # slot -> (landmarks, target) it held when the snapshot was taken
+            self._preserved = {}
+            if self._landmarks is not None:
+                dataset._snapshots.append(self)
+
+    def preserve(self, slot: int):
+        """
+        Called by add_item(), under the dataset's lock, before it overwrites slot.
+        """
+        if slot < self._n and slot not in self._preserved and self._landmarks is self.dataset._landmarks:
+            self._preserved[slot] = (self._landmarks[slot].clone(), self._targets[slot].clone())
+
+    def save(self, filename):
+        if self._landmarks is None:
+            landmarks, targets = torch.empty((0, 478, 3), dtype=self.storage.dtype), torch.empty((0, 2))
+        else:
+            landmarks, targets = _first_slots(self._landmarks, self._n), _first_slots(self._targets, self._n)
+        try:
+            with metrics.dataset_save_seconds.time():
+                save_atomic({
+                    "landmarks": landmarks,
+                    "targets": targets,
+                    "capacity": self.capacity,
+                    "idx": self.idx,
+                    "full": self.full,
+                    "added": self.added,
+                    "landmark_storage": self.storage.state(),
+                }, filename, before_replace=self._restore_preserved)
+        finally:
+            self._release()
+
+    def _release(self):
+        with self.dataset._lock:
+            if self in self.dataset._snapshots:
+                self.dataset._snapshots.remove(self)
+            return self._preserved
+
+    def _restore_preserved(self, tmp: str):
+        # The file has been written, so slots overwritten from now on don't matter
+        preserved = self._release()
+        if not preserved:
+            return
+        landmark_bytes, target_bytes = self._landmarks[0].nbytes, self._targets[0].nbytes
+        # Storages are numbered in the order torch.save pickled them
+        patch_saved(tmp, {
+            'data/0': [(slot * landmark_bytes, _slot_bytes(landmarks)) for slot, (landmarks, _) in preserved.items()],
+            'data/1': [(slot * target_bytes, _slot_bytes(target)) for slot, (_, target) in preserved.items()],
+        })
+
+
+class RecentView(torch.utils.data.Dataset):
+    """
+    The most recent capacity items of another dataset (the store), read in place: a window that slides
+    along as items are added to the store, holding no samples of its own.  It reads like the store
+    itself, indexed from the oldest item in the window, but items are only added to the store.
+    """
+
+    def __init__(self, store, capacity: int):
+        """
+        :param store: A TensorRingDataset (MmapDataset), SimpleDataset or SqliteDataset
+        :param capacity: Items in the window, at most the store's capacity
+        """
+        self.store = store
+        self.capacity = capacity
+
+    def __len__(self):
+        return min(self.capacity, len(self.store))
+
+    @property
+    def full(self):
+        return len(self) == self.capacity
+
+    @property
+    def gathers_batches(self):
+        return getattr(self.store, 'gathers_batches', False)
+
+    def _slots(self, idx):
+        """
+        :param idx: An index into the window, or a slice, list or tensor of them
+        :return: The store's slots for idx, an int or a tensor as idx is
+        """
+        n = len(self)
+        if isinstance(self.store, (TensorRingDataset, SimpleDataset)):
+            # A ring writes its next item at idx, so the latest n are the slots before it
+            start, slots = self.store.idx - n, self.store.capacity
+        else:
+            # Other stores (SqliteDataset) index their items oldest first
+            start, slots = len(self.store) - n, None
+        if isinstance(idx, int):
+            if not -n <= idx < n:
+                raise IndexError(f'Index {idx} out of range for {n} items')
+            slot = start + idx % n
+        else:
+            slot = start + torch.arange(n)[idx]
+        return slot if slots is None else slot % slots
+
+    def __getitem__(self, idx):
+        """
+        :param idx: An index, or (if the store gathers_batches) a slice, list or tensor of them
+        :return: (idx, landmarks, target), batched if idx is
+        """
+        _, landmarks, target = self.store[self._slots(idx)]
+        return idx, landmarks, target
+
+    def landmarks(self) -> torch.Tensor:
+        """
+        :return: [len, 478, 3] float32 landmarks of the items in the window, oldest first
+        """
+        if len(self) == 0:
+            return torch.empty((0, 478, 3))
+        if self.gathers_batches:
+            return self[:][1]
+        return torch.stack([self[i][1] for i in range(len(self))])
+
+    def targets(self) -> torch.Tensor:
+        """
+        :return: [len, 2] targets of the items in the window, oldest first
+        """
+        if len(self) == 0:
+            return torch.empty((0, 2))
+        if self.gathers_batches:
+            return self[:][2]
+        return torch.stack([self[i][2] for i in range(len(self))])
+
+    def memory_bytes(self):
+        """
+        Memory held by the items: none, they're the store's.
+        """
+        return 0
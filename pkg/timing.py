@@ -0,0 +1,127 @@
+"""
+Per-stage timing of the predict path.
+
+A sampled fraction of /api/gaze/landmarks requests are timed stage by stage (parsing, tensor
+conversion, adding the sample, forward pass, ...).  The timings are aggregated over a sliding
+window, served by /api/gaze/timing, and can be returned to the client in a Server-Timing header.
+
+Code on the predict path marks its stages with
+
+    with timing.stage('forward'):
+        ...
+
+which does nothing unless the current request is being timed.  The current timer is held in a
+context variable, so it follows a request onto an executor thread if the context is copied along.
+"""
+import collections
+import contextlib
+import contextvars
+import random
+import threading
+import time
+from typing import Deque, Dict, List
+
+_current: contextvars.ContextVar = contextvars.ContextVar('stage_timer', default=None)
+_untimed = contextlib.nullcontext()
+
+
+class StageTimer:
+    """
+    The stage durations of one request, in the order the stages started.  A stage entered
+    more than once accumulates.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.) + time.perf_counter() - start
+
+    def server_timing(self) -> str:
+        """
+        :return: The stages as a Server-Timing header value, durations in milliseconds
+        """
+        return ', '.join(f'{name};dur={seconds * 1e3:.3f}' for name, seconds in self.stages.items())
+
+
+def stage(name: str):
+    timer = _current.get()
+    return _untimed if timer is None else timer.stage(name)
+
+
+class StageStats:
+    """
+    Per-stage durations of the timed requests, over a sliding window of recent requests.
+    """
+
+    def __init__(self, window=4096):
+        self.window = window
+        self._lock = threading.Lock()
+        self._durations_us: Dict[str, Deque[float]] = {}
+        self.requests = 0
+
+    def record(self, timer: StageTimer):
+        with self._lock:
+            self.requests += 1
+            for name, seconds in timer.stages.items():
+                durations = self._durations_us.get(name)
+                if durations is None:
+                    durations = self._durations_us[name] = collections.deque(maxlen=self.window)
+                durations.append(seconds * 1e6)
+
+    @staticmethod
+    def _summary(values: List[float]) -> Dict[str, float]:
+        values = sorted(values)
+        n = len(values)
+
+        def percentile(p):
+            return values[min(n - 1, int(p * n))]
+
+        return {
+            'count': n,
+            'mean': sum(values) / n,
+            'p50': percentile(.5),
+            'p95': percentile(.95),
+            'p99': percentile(.99),
+            'max': values[-1],
+        }
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            durations = {name: list(values) for name, values in self._durations_us.items()}
+            requests = self.requests
+        return {
+            'requests': requests,
+            'stages_us': {name: self._summary(values) for name, values in durations.items()},
+        }
+
+
+stats = StageStats()
+
+
+@contextlib.contextmanager
+def timed_request(sample_rate: float, always=False):
+    """
+    Time the stages of a request, if it's sampled, and add them to stats.
+    A 'total' stage covers the whole block.
+    :param sample_rate: Fraction of requests to time
+    :param always: Time this request regardless, e.g. to return a Server-Timing header
+    :return: The StageTimer, or None if the request isn't timed
+    """
+    if not always and (sample_rate <= 0 or random.random() >= sample_rate):
+        yield None
+        return
+    timer = StageTimer()
+    token = _current.set(timer)
+    start = time.perf_counter()
+    try:
+        yield timer
+    finally:
+        timer.stages['total'] = time.perf_counter() - start
+        _current.reset(token)
+        stats.record(timer)
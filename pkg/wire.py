@@ -0,0 +1,145 @@
+"""
+Binary wire format for landmark uploads (Content-Type: application/octet-stream).
+
+All values are little-endian.  A frame is a 16 byte header followed by the landmarks
+as packed float32 [x, y, z] triples:
+
+    offset  size  field
+    0       2     magic, b'LM'
+    2       1     format version (1)
+    3       1     flags (FLAG_HAS_TARGET: target_x and target_y are valid)
+    4       4     uint32 number of landmarks (478)
+    8       4     float32 target_x
+    12      4     float32 target_y
+    16      12*n  float32 landmarks
+
+The header is a multiple of 4 bytes, so the landmarks can be read in place with
+torch.frombuffer.  Keep in step with encodeLandmarks() in src/apiService.ts
+
+json_landmarks() reads the same from a JSON upload.
+"""
+import struct
+import sys
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import torch
+except ImportError:
+    # Serving-only deployments run without torch, and decode frames with decode_landmarks_array(), see onnx_app.py
+    torch = None
+
+MAGIC = b'LM'
+VERSION = 1
+FLAG_HAS_TARGET = 0x01
+
+CONTENT_TYPE = 'application/octet-stream'
+
+_header = struct.Struct('<2sBBIff')
+HEADER_SIZE = _header.size
+
+# The MediaPipe face mesh, which is what the models take and the datasets hold
+LANDMARKS_SHAPE = (478, 3)
+
+
+class InvalidSample(ValueError):
+    pass
+
+
+def check_sample(landmarks, target=None):
+    """
+    Check a frame's shapes before it goes anywhere near a model, dataset or sample log.
+    :param landmarks: Landmarks tensor or array
+    :param target: [x, y] target or None
+    :raises InvalidSample: if the landmarks aren't [478, 3] or the target isn't two numbers
+    """
+    if tuple(landmarks.shape) != LANDMARKS_SHAPE:
+        raise InvalidSample(f'Expected {list(LANDMARKS_SHAPE)} landmarks, got {list(landmarks.shape)}')
+    if target is not None and tuple(np.shape(target)) != (2,):
+        raise InvalidSample(f'Expected an [x, y] target, got {target!r}')
+
+
+def encode_landmarks(landmarks, target: Optional[List[float]] = None) -> bytes:
+    """
+    Pack landmarks ([n, 3] list, array or tensor) and an optional [x, y] target into a frame.
+    Used by clients written in python, e.g. load tests.
+    """
+    landmarks = np.asarray(landmarks, dtype='<f4').reshape(-1, 3)
+    flags = 0
+    target_x, target_y = 0., 0.
+    if target is not None:
+        flags |= FLAG_HAS_TARGET
+        target_x, target_y = target
+    return _header.pack(MAGIC, VERSION, flags, landmarks.shape[0], target_x, target_y) + landmarks.tobytes()
+
+
+def _unpack_header(buf) -> Tuple[int, Optional[List[float]]]:
+    """
+    :return: The number of landmarks in a frame, and the [x, y] target or None
+    """
+    if len(buf) < HEADER_SIZE:
+        raise ValueError(f'Landmarks frame too short: {len(buf)} bytes')
+    magic, version, flags, count, target_x, target_y = _header.unpack_from(buf)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f'Not a landmarks frame (magic {magic!r}, version {version})')
+    if len(buf) != HEADER_SIZE + count * 12:
+        raise ValueError(f'Landmarks frame has {len(buf)} bytes, expected {HEADER_SIZE + count * 12}')
+    return count, [target_x, target_y] if flags & FLAG_HAS_TARGET else None
+
+
+def decode_landmarks(buf) -> Tuple['torch.Tensor', Optional[List[float]]]:
+    """
+    Unpack a frame.
+    :param buf: The frame.  If it's a writable buffer (e.g. a bytearray) the returned
+    landmarks tensor shares its memory.
+    :return: [n, 3] float32 landmarks tensor, and the [x, y] target or None
+    """
+    count, target = _unpack_header(buf)
+    if sys.byteorder == 'little' and not isinstance(buf, bytes):
+        landmarks = torch.frombuffer(buf, dtype=torch.float32, count=count * 3, offset=HEADER_SIZE)
+    else:
+        landmarks = torch.from_numpy(
+            np.frombuffer(buf, dtype='<f4', count=count * 3, offset=HEADER_SIZE).astype(np.float32))
+    return landmarks.view(count, 3), target
+
+
+def decode_landmarks_array(buf) -> Tuple[np.ndarray, Optional[List[float]]]:
+    """
+    decode_landmarks() without torch.
+    :return: [n, 3] float32 landmarks array, read-only if it shares buf's memory, and the [x, y] target or None
+    """
+    count, target = _unpack_header(buf)
+    landmarks = np.frombuffer(buf, dtype='<f4', count=count * 3, offset=HEADER_SIZE)
+    return landmarks.astype(np.float32, copy=False).reshape(count, 3), target
+
+
+def json_landmarks(landmarks_and_target):
+    """
+    :param landmarks_and_target: The body of a JSON /api/gaze/landmarks request
+    :return: landmarks, and the [x, y] target or None
+    """
+    landmarks = landmarks_and_target["landmarks"]
+    target = landmarks_and_target["target"]
+
+    if target["target_x"] != "undefined":
+        target = [float(target["target_x"]), float(target["target_y"])]
+    else:
+        target = None
+    return landmarks, target
+
+
+def read_frame(stream, length: int) -> bytearray:
+    """
+    Read a request body of known length straight into a writable buffer, so that
+    decode_landmarks() can use it without copying.
+    """
+    buf = bytearray(length)
+    view = memoryview(buf)
+    n = 0
+    while n < length:
+        r = stream.readinto(view[n:])
+        if not r:
+            raise ValueError(f'Landmarks frame truncated at {n} of {length} bytes')
+        n += r
+    return buf
@@ -0,0 +1,172 @@
+"""
+Multi-process inference.
+
+A WorkerPool runs forward passes in worker processes, each with its own (small, pinned) number of
+intra-op threads, so that concurrent predictions run on separate cores instead of contending for
+one process's thread pool.
+
+Workers don't hold copies of the weights: publish() moves the serving snapshot's tensors into
+shared memory and broadcasts them, and each worker builds its model around those same pages.
+Messages to a worker are handled in order, so every prediction after a publish uses the new weights.
+
+Workers are forked, so the pool must be created before the server has started any threads or
+run any torch ops, i.e. at the top of app.py.  Only cpu models can be served this way.
+"""
+import itertools
+import threading
+from typing import Dict, List
+
+import torch
+import torch.multiprocessing as mp
+
+
+def _worker_main(num_threads: int, commands, results):
+    from pkg.l2s import model_class
+
+    torch.set_num_threads(num_threads)
+    models: Dict[int, torch.nn.Module] = {}
+    while True:
+        message = commands.get()
+        kind = message[0]
+        if kind == 'stop':
+            return
+        if kind == 'weights':
+            _, key, config, state = message
+            model = models.get(key)
+            if model is None:
+                model = model_class(config.version)(config)
+                model.eval()
+                models[key] = model
+            # assign=True makes the model use the shared tensors themselves rather than copying them
+            model.load_state_dict(state, assign=True)
+        elif kind == 'drop':
+            models.pop(message[1], None)
+        elif kind == 'forward':
+            _, request_id, key, x = message
+            try:
+                with torch.no_grad():
+                    pred = models[key](torch.from_numpy(x)).reshape(-1, 2)
+                results.put((request_id, pred.numpy(), None))
+            except Exception as err:
+                results.put((request_id, None, f'{type(err).__name__}: {err}'))
+
+
+class _Request:
+    __slots__ = ('worker', 'done', 'result', 'error')
+
+    def __init__(self, worker: int):
+        self.worker = worker
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class WorkerPool:
+
+    def __init__(self, num_workers: int, *, threads_per_worker=1, timeout=30., logger=None):
+        """
+        :param threads_per_worker: torch.set_num_threads() of each worker
+        :param timeout: Seconds to wait for a prediction before giving up on it
+        """
+        self.threads_per_worker = threads_per_worker
+        self.timeout = timeout
+        self.logger = logger
+
+        context = mp.get_context('fork')
+        self._results = context.Queue()
+        self._commands = [context.Queue() for _ in range(num_workers)]
+        self._processes = [context.Process(target=_worker_main, args=(threads_per_worker, commands, self._results),
+                                           name=f'inference-worker-{i}', daemon=True)
+                           for i, commands in enumerate(self._commands)]
+        for p in self._processes:
+            p.start()
+
+        self._lock = threading.Lock()
+        self._request_ids = itertools.count()
+        self._keys = itertools.count()
+        self._pending: Dict[int, _Request] = {}
+        self._in_flight: List[int] = [0] * num_workers
+        self._requests: List[int] = [0] * num_workers
+        self.weights_versions: Dict[int, int] = {}
+
+        self._reader = threading.Thread(target=self._read_results, name='inference-results', daemon=True)
+        self._reader.start()
+        if logger:
+            logger.info(f'Started {num_workers} inference workers with {threads_per_worker} threads each')
+
+    @property
+    def num_workers(self):
+        return len(self._processes)
+
+    def register(self) -> int:
+        """
+        :return: A key for a new model, e.g. one session's, to publish() and forward() with
+        """
+        return next(self._keys)
+
+    def publish(self, key: int, model: torch.nn.Module, config, version: int):
+        """
+        Serve model's current weights for key from all workers.
+        :param model: An eval-mode cpu model, which shouldn't be trained afterwards (e.g. a serving snapshot),
+        as its tensors are moved to shared memory
+        """
+        state = {name: t.detach().share_memory_() for name, t in model.state_dict().items()}
+        for commands in self._commands:
+            commands.put(('weights', key, config, state))
+        self.weights_versions[key] = version
+
+    def drop(self, key: int):
+        for commands in self._commands:
+            commands.put(('drop', key))
+        self.weights_versions.pop(key, None)
+
+    def forward(self, key: int, x: torch.Tensor) -> torch.Tensor:
+        """
+        Run the model published for key on a batch of landmarks, on the least busy worker.
+        :param x: [B, 478, 3] landmarks
+        :return: [B, 2] gaze coordinates
+        """
+        with self._lock:
+            # Least busy, and round-robin among the equally busy
+            request_id = next(self._request_ids)
+            order = [(request_id + i) % self.num_workers for i in range(self.num_workers)]
+            worker = min(order, key=self._in_flight.__getitem__)
+            request = self._pending[request_id] = _Request(worker)
+            self._in_flight[worker] += 1
+            self._requests[worker] += 1
+        self._commands[worker].put(('forward', request_id, key, x.detach().cpu().numpy()))
+        if not request.done.wait(self.timeout):
+            with self._lock:
+                if self._pending.pop(request_id, None) is not None:
+                    self._in_flight[worker] -= 1
+            raise RuntimeError(f'Inference worker {worker} did not answer within {self.timeout}s')
+        if request.error is not None:
+            raise RuntimeError(f'Inference worker {worker} failed: {request.error}')
+        return torch.from_numpy(request.result)
+
+    def _read_results(self):
+        while True:
+            request_id, result, error = self._results.get()
+            with self._lock:
+                request = self._pending.pop(request_id, None)
+                if request is None:
+                    continue  # Timed out
+                self._in_flight[request.worker] -= 1
+            request.result = result
+            request.error = error
+            request.done.set()
+
+    def stop(self):
+        for commands in self._commands:
+            commands.put(('stop',))
+        for p in self._processes:
+            p.join(timeout=5)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': [{'pid': p.pid, 'alive': p.is_alive(), 'requests': requests, 'in_flight': in_flight}
+                            for p, requests, in_flight in zip(self._processes, self._requests, self._in_flight)],
+                'threads_per_worker': self.threads_per_worker,
+                'models': len(self.weights_versions),
+            }
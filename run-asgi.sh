@@ -0,0 +1,3 @@
+export PYTHONHASHSEED=857
+export USE_TORCH=1
+python dist/asgi_app.py
\ No newline at end of file
@@ -5,6 +5,7 @@ import {LandMarkDetector} from "./LandMarkDetector";
 import {BoundingBox, Detection, FaceLandmarker} from "@mediapipe/tasks-vision";
 import {ContinuousTrainer} from "./ContinuousTrainer";
 import {GazeElement} from "./GazeElement";
+import {GazeStream} from "./GazeStream";
 
 export type Coord = { x: number; y: number; }
 export type PixelCoord = number[]
@@ -123,6 +124,8 @@ export class GazeDetector extends EventEmitter {
 
     public async term() {
         this.removeAllListeners();
+        this.gazeStream.removeAllListeners();
+        this.gazeStream.Close();
         this.isPlaying = false;
         const v = this.videoCaptureElement;
         v.srcObject = v.onloadedmetadata = v.onplaying = null;
@@ -224,6 +227,28 @@ export class GazeDetector extends EventEmitter {
         let time_at_last_frame_rate_measurement = window.performance.now();
 
 
+        const handleResult = (features: iGazeDetectorResult) => {
+            this_.training_loss = features.losses.loss;
+            features.gaze = GazeDetector.toScreenCoords(features.gaze)
+            this_.emit('GazeDetectionComplete', features);
+
+
+            // overlayCtx.drawImage(v, 0, 0, v.videoWidth, v.videoHeight, 0, 0, uploadWidth, uploadWidth * (v.videoHeight / v.videoWidth));
+
+            if (++frame_count >= num_frames_for_frame_rate_measurement) {
+                frame_count = 0;
+                const now = window.performance.now();
+                this_.frame_rate = (now - time_at_last_frame_rate_measurement) * num_frames_for_frame_rate_measurement / 1000.0;
+                time_at_last_frame_rate_measurement = now;
+            }
+        }
+
+        // Use the streaming endpoint if the server has one, otherwise fall back to a POST per frame
+        this.gazeStream.removeAllListeners('result');
+        this.gazeStream.on('result', handleResult);
+        if (!this.gazeStream.Connected)
+            await this.gazeStream.Open();
+
         const processFrame = async () => {
             if (this_.isPlaying) {
 
@@ -256,7 +281,12 @@ export class GazeDetector extends EventEmitter {
                         }
                     }
                     const landmarks_as_array = landmarks.map((p) => [p.x, p.y, p.z]);
-                    features = await post_landmarks(landmarks_as_array, GazeDetector.fromScreenCoords(this_.target_pos));
+                    const target = GazeDetector.fromScreenCoords(this_.target_pos);
+                    if (this_.gazeStream.Connected)
+                        // Don't wait for the reply, it arrives as a 'result' event
+                        this_.gazeStream.Send(landmarks_as_array, target);
+                    else
+                        features = await post_landmarks(landmarks_as_array, target);
 
                     // features = await post_landmark_features(landmarkFeatures, GazeDetector.fromScreenCoords(this_.target_pos));
                     // if (features) {
@@ -268,22 +298,8 @@ export class GazeDetector extends EventEmitter {
                 }
 
 
-                if (features !== undefined) {
-
-                    this_.training_loss = features.losses.loss;
-                    features.gaze = GazeDetector.toScreenCoords(features.gaze)
-                    this_.emit('GazeDetectionComplete', features);
-
-
-                    // overlayCtx.drawImage(v, 0, 0, v.videoWidth, v.videoHeight, 0, 0, uploadWidth, uploadWidth * (v.videoHeight / v.videoWidth));
-
-                    if (++frame_count >= num_frames_for_frame_rate_measurement) {
-                        frame_count = 0;
-                        const now = window.performance.now();
-                        this_.frame_rate = (now - time_at_last_frame_rate_measurement) * num_frames_for_frame_rate_measurement / 1000.0;
-                        time_at_last_frame_rate_measurement = now;
-                    }
-                }
+                if (features !== undefined)
+                    handleResult(features);
                 this.videoCaptureElement.requestVideoFrameCallback(processFrame);
             }
         }
@@ -294,6 +310,12 @@ export class GazeDetector extends EventEmitter {
 
     private landmarkDetector: LandMarkDetector;
 
+    private gazeStream: GazeStream = new GazeStream();
+
+    public get StreamConnected(): boolean {
+        return this.gazeStream.Connected;
+    }
+
     private displayLandmarkArray: { visible: boolean, color: string }[] = [];
 
     constructor(videoCaptureElement: HTMLVideoElement, landmarkSelectorElement: HTMLDivElement | undefined) {
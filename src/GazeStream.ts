@@ -0,0 +1,81 @@
+import EventEmitter from "eventemitter3";
+import {encodeLandmarks} from "./apiService";
+import {iGazeDetectorResult} from "./GazeDetector";
+
+export interface iGazeStreamResult extends iGazeDetectorResult {
+    seq: number;
+    dropped: number;
+    // Messages since the last reply that the server couldn't decode, and the last one's error
+    invalid: number;
+    error?: string;
+}
+
+// A persistent websocket to /api/gaze/stream (see pkg/stream.py).
+// Each frame sent is a little-endian uint32 sequence number followed by encodeLandmarks() output.
+// Emits 'result' with an iGazeStreamResult for each reply, and 'open' / 'close'.
+export class GazeStream extends EventEmitter {
+    private socket: WebSocket | undefined = undefined;
+    private seq: number = 0;
+    private lastResultSeq: number = -1;
+
+    public get Connected(): boolean {
+        return this.socket !== undefined && this.socket.readyState === WebSocket.OPEN;
+    }
+
+    // Number of frames sent that haven't been answered yet
+    public get InFlight(): number {
+        return this.seq - 1 - this.lastResultSeq;
+    }
+
+    public Open(): Promise<boolean> {
+        const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+        const socket = new WebSocket(`${protocol}//${window.location.host}/api/gaze/stream`);
+        socket.binaryType = 'arraybuffer';
+        this.socket = socket;
+
+        socket.onmessage = (evt: MessageEvent) => {
+            const result = JSON.parse(evt.data);
+            if (result.seq === undefined) {
+                console.warn("Gaze stream error:", result.error);
+                return;
+            }
+            if (result.invalid > 0) {
+                console.warn(`Gaze stream: ${result.invalid} frame(s) rejected:`, result.error);
+            }
+            // Replies for frames older than one already seen are of no use
+            if (result.seq > this.lastResultSeq) {
+                this.lastResultSeq = result.seq;
+                this.emit('result', result as iGazeStreamResult);
+            }
+        };
+        socket.onclose = () => {
+            this.socket = undefined;
+            this.emit('close');
+        };
+
+        return new Promise((resolve) => {
+            socket.onopen = () => {
+                this.emit('open');
+                resolve(true);
+            };
+            socket.onerror = () => resolve(false);
+        });
+    }
+
+    public Close() {
+        if (this.socket)
+            this.socket.close();
+    }
+
+    public Send(landmarks: number[][], target: { x: number, y: number } | undefined = undefined): number {
+        if (!this.socket)
+            throw new Error("Gaze stream is not open");
+        const seq = this.seq++;
+        const frame = encodeLandmarks(landmarks, target);
+        const message = new Uint8Array(4 + frame.byteLength);
+        new DataView(message.buffer).setUint32(0, seq, true);
+        message.set(new Uint8Array(frame), 4);
+        this.socket.send(message.buffer);
+        return seq;
+    }
+}
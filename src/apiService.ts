@@ -46,9 +46,28 @@ export async function save_gaze_model() : Promise<boolean> {
 }
 
 
-export async function train(epochs: number, action: "train" | "calibrate") : Promise<iGazeDetectorTrainResult> {
+export interface iTrainingJob {
+    job_id: string;
+    state: "queued" | "running" | "paused" | "completed" | "cancelled" | "failed";
+    epoch: number;
+    epochs: number;
+    losses: iGazeDetectorTrainResult | null;
+    samples_per_sec: number | null;
+    error: string | null;
+}
+
+export async function training_job(job_id: string) : Promise<iTrainingJob> {
+    const api_response = await fetch(`/api/gaze/jobs/${job_id}`, {
+        headers: {
+            'Accept': 'application/json',
+        }
+    });
+    return await api_response.json();
+}
 
+export async function train(epochs: number, action: "train" | "calibrate", poll_interval_ms = 500) : Promise<iGazeDetectorTrainResult> {
 
+    // Starts a training job on the server, then polls it until it finishes
     const api_response = await fetch(`/api/gaze/${action}/${epochs}`, {
 
         method: 'post',
@@ -58,12 +77,63 @@ export async function train(epochs: number, action: "train" | "calibrate") : Pro
         },
         body: JSON.stringify({ epochs: epochs } )
     });
-    const loss_json: iGazeDetectorTrainResult = await api_response.json();
+    let job = await api_response.json();
+    if (job.job_id === undefined) {
+        // Rejected, e.g. because another job is already running.  Report the current losses.
+        await new Promise((resolve) => setTimeout(resolve, poll_interval_ms));
+        return job.losses;
+    }
+    while (job.state === "queued" || job.state === "running" || job.state === "paused") {
+        await new Promise((resolve) => setTimeout(resolve, poll_interval_ms));
+        job = await training_job(job.job_id);
+    }
+    const loss_json: iGazeDetectorTrainResult = job.losses;
     console.log("loss_json:", loss_json)
     return loss_json;
 
 }
-export async function post_landmarks(landmarks: any[], target: {  x: number, y: number } | undefined = undefined) : Promise<iGazeDetectorResult | undefined> {
+// Binary landmarks upload format, read on the server by pkg/wire.py.
+// Little-endian: 'LM', version, flags, uint32 count, float32 target_x, float32 target_y, then count float32 [x, y, z]
+export const LANDMARKS_CONTENT_TYPE = 'application/octet-stream';
+const LANDMARKS_FORMAT_VERSION = 1;
+const LANDMARKS_HEADER_SIZE = 16;
+const LANDMARKS_FLAG_HAS_TARGET = 0x01;
+
+export function encodeLandmarks(landmarks: number[][], target: { x: number, y: number } | undefined = undefined): ArrayBuffer {
+    const buf = new ArrayBuffer(LANDMARKS_HEADER_SIZE + landmarks.length * 12);
+    const view = new DataView(buf);
+    view.setUint8(0, 0x4c);  // 'L'
+    view.setUint8(1, 0x4d);  // 'M'
+    view.setUint8(2, LANDMARKS_FORMAT_VERSION);
+    view.setUint8(3, target ? LANDMARKS_FLAG_HAS_TARGET : 0);
+    view.setUint32(4, landmarks.length, true);
+    view.setFloat32(8, target ? target.x : 0, true);
+    view.setFloat32(12, target ? target.y : 0, true);
+    let offset = LANDMARKS_HEADER_SIZE;
+    for (const landmark of landmarks) {
+        view.setFloat32(offset, landmark[0], true);
+        view.setFloat32(offset + 4, landmark[1], true);
+        view.setFloat32(offset + 8, landmark[2], true);
+        offset += 12;
+    }
+    return buf;
+}
+
+export async function post_landmarks(landmarks: any[], target: {  x: number, y: number } | undefined = undefined,
+                                     format: "json" | "binary" = "binary") : Promise<iGazeDetectorResult | undefined> {
+
+    if (format === "binary") {
+        const api_response = await fetch(`/api/gaze/landmarks`, {
+
+            method: 'post',
+            headers: {
+                'Content-Type': LANDMARKS_CONTENT_TYPE,
+                'Accept': 'application/json'
+            },
+            body: encodeLandmarks(landmarks, target)
+        });
+        return await api_response.json();
+    }
 
     let target_post = target ? { target_x: target.x.toString() , target_y: target.y.toString()} :  { target_x: "undefined", target_y: "undefined"}
 
@@ -30,7 +30,8 @@ class App {
         });
 
         this.pollHandle = window.setInterval(async () => {
-            const ready = await apiAvailable();
+            // An open gaze stream means the server is up, no need to poll it
+            const ready = this.appController?.gazeDetector?.StreamConnected || await apiAvailable();
             if (ready)
                 this.dom.indicatorApiAvailableEl.classList.add('active');
             else {
@@ -45,6 +46,11 @@ class App {
 }
 
 function init() {
+    // Open the page with ?session=<id> to get a model and datasets of your own on the server.
+    // The cookie goes with every api request and the gaze stream (see pkg/registry.py).
+    const session = new URLSearchParams(window.location.search).get('session');
+    if (session)
+        document.cookie = `l2s_session=${encodeURIComponent(session)}; path=/; SameSite=Strict`;
     new App();
 }
 
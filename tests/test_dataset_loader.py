@@ -0,0 +1,106 @@
+"""
+python -m unittest discover tests
+"""
+import logging
+import os
+import tempfile
+import unittest
+
+import torch
+
+from pkg.dataset_loader import DatasetLoader
+from pkg.mmap_dataset import MmapDataset, mmap_path
+from pkg.simple_dataset import SimpleDataset
+from pkg.sqlite_dataset import SqliteDataset, sqlite_path
+from pkg.tensor_dataset import TensorRingDataset
+
+
+class TruncatedFileTest(unittest.TestCase):
+
+    def _check_truncated(self, dataset_type):
+        with tempfile.TemporaryDirectory() as d:
+            filename = os.path.join(d, 'l2s_db.pth')
+            saved = dataset_type(capacity=16, logger=logging.getLogger('test'))
+            for _ in range(8):
+                saved.add_item(torch.rand(478, 3), torch.rand(2))
+            saved.save(filename)
+            with open(filename, 'rb') as f:
+                whole = f.read()
+
+            # Without its central directory torch.load raises a RuntimeError, cut mid-record some other error
+            for size in (1024, len(whole) // 2):
+                with self.subTest(size=size):
+                    with open(filename, 'wb') as f:
+                        f.write(whole[:size])
+                    loader = DatasetLoader(dataset_type(capacity=16, logger=logging.getLogger('test')), filename)
+                    loader.run()
+                    self.assertTrue(loader.failed)
+                    self.assertEqual(loader.stats()['state'], DatasetLoader.FAILED)
+                    with open(filename, 'rb') as f:
+                        self.assertEqual(f.read(), whole[:size])
+
+    def test_tensor_dataset(self):
+        self._check_truncated(TensorRingDataset)
+
+    def test_simple_dataset(self):
+        self._check_truncated(SimpleDataset)
+
+    def test_unreadable_mmap_file(self):
+        with tempfile.TemporaryDirectory() as d:
+            filename = os.path.join(d, 'l2s_db.pth')
+            saved = MmapDataset(capacity=16, logger=logging.getLogger('test'))
+            saved.load(filename)
+            for _ in range(8):
+                saved.add_item(torch.rand(478, 3), torch.rand(2))
+            saved.save(filename)
+            del saved
+            with open(mmap_path(filename), 'rb') as f:
+                whole = f.read()
+
+            # A file shorter than its header says, and one without a header
+            for contents in (whole[:len(whole) // 2], b'not a dataset' * 100):
+                with self.subTest(size=len(contents)):
+                    with open(mmap_path(filename), 'wb') as f:
+                        f.write(contents)
+                    dataset = MmapDataset(capacity=16, logger=logging.getLogger('test'))
+                    loader = DatasetLoader(dataset, filename)
+                    loader.run()
+                    self.assertTrue(loader.failed)
+                    self.assertIsNone(dataset.path)
+                    with open(mmap_path(filename), 'rb') as f:
+                        self.assertEqual(f.read(), contents)
+
+    def test_unreadable_pth_is_not_converted(self):
+        with tempfile.TemporaryDirectory() as d:
+            filename = os.path.join(d, 'l2s_db.pth')
+            with open(filename, 'wb') as f:
+                f.write(b'not a dataset' * 100)
+            loader = DatasetLoader(MmapDataset(capacity=16, logger=logging.getLogger('test')), filename)
+            loader.run()
+            self.assertTrue(loader.failed)
+            self.assertFalse(os.path.exists(mmap_path(filename)))
+
+    def test_unreadable_sqlite_database(self):
+        with tempfile.TemporaryDirectory() as d:
+            filename = os.path.join(d, 'l2s_db.pth')
+            with open(sqlite_path(filename), 'wb') as f:
+                f.write(b'not a database' * 100)
+            dataset = SqliteDataset(capacity=16, logger=logging.getLogger('test'))
+            loader = DatasetLoader(dataset, filename)
+            loader.run()
+            self.assertTrue(loader.failed)
+            self.assertIsNone(dataset.path)
+            with open(sqlite_path(filename), 'rb') as f:
+                self.assertEqual(f.read(), b'not a database' * 100)
+
+    def test_missing_file_starts_empty(self):
+        with tempfile.TemporaryDirectory() as d:
+            dataset = TensorRingDataset(capacity=16, logger=logging.getLogger('test'))
+            loader = DatasetLoader(dataset, os.path.join(d, 'l2s_db.pth'))
+            loader.run()
+            self.assertFalse(loader.failed)
+            self.assertEqual(len(dataset), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
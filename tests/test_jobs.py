@@ -0,0 +1,59 @@
+import threading
+import unittest
+
+from pkg.jobs import TrainingJob, TrainingJobManager, TrainingQueueFull
+
+
+class BlockingModel:
+    """
+    Stands in for a Landmarks2ScreenCoords whose training runs until it's released.
+    """
+
+    def __init__(self):
+        self.started = threading.Semaphore(0)
+        self.release = threading.Event()
+
+    def train(self, epochs, calibration_mode=False, job=None, dataset=None):
+        self.started.release()
+        self.release.wait(10)
+        return {}
+
+
+class QueueLimitTest(unittest.TestCase):
+
+    def test_limit_without_a_running_job(self):
+        blocker, model = BlockingModel(), BlockingModel()
+        jobs = TrainingJobManager(queue_size=1)
+        # Another model's job keeps the worker busy, so this model's jobs all wait
+        jobs.submit(blocker, 1, False)
+        self.assertTrue(blocker.started.acquire(timeout=10))
+        waiting = jobs.submit(model, 1, False)
+        self.assertEqual(waiting.state, TrainingJob.QUEUED)
+        with self.assertRaises(TrainingQueueFull):
+            jobs.submit(model, 1, False)
+        blocker.release.set()
+        model.release.set()
+
+    def test_limit_with_a_running_job(self):
+        model = BlockingModel()
+        jobs = TrainingJobManager(queue_size=2)
+        jobs.submit(model, 1, False)
+        self.assertTrue(model.started.acquire(timeout=10))
+        jobs.submit(model, 1, False)
+        jobs.submit(model, 1, False)
+        with self.assertRaises(TrainingQueueFull):
+            jobs.submit(model, 1, False)
+        model.release.set()
+
+    def test_no_queue(self):
+        model = BlockingModel()
+        jobs = TrainingJobManager(queue_size=0)
+        jobs.submit(model, 1, False)
+        self.assertTrue(model.started.acquire(timeout=10))
+        with self.assertRaises(TrainingQueueFull):
+            jobs.submit(model, 1, False)
+        model.release.set()
+
+
+if __name__ == '__main__':
+    unittest.main()
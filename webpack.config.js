@@ -44,7 +44,8 @@ module.exports = env => {
                         copy: [
                             { source: "static", destination: path.resolve(__dirname, 'dist/static') },
                             { source: "pkg", destination: path.resolve(__dirname, 'dist/pkg') },
-                            { source: "app.py", destination: path.resolve(__dirname, 'dist/app.py') }
+                            { source: "app.py", destination: path.resolve(__dirname, 'dist/app.py') },
+                            { source: "asgi_app.py", destination: path.resolve(__dirname, 'dist/asgi_app.py') }
                         ],
                     },
                 },